@@ -0,0 +1,137 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from orders.services import reserve_stock
+from products.models import Category, Product
+
+User = get_user_model()
+
+
+@override_settings(CATALOGUE_PAGE_SIZE=2)
+class ProductApiTest(TestCase):
+    def setUp(self):
+        self.oud = Category.objects.create(name="Oud")
+        now = timezone.now()
+        self.products = []
+        for i in range(5):
+            product = Product.objects.create(title=f"Scent {i}", description="Long notes " * 50,
+                                             price=Decimal("10.00") + i, inventory=3,
+                                             category=self.oud if i % 2 else None)
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(minutes=i))
+            self.products.append(product)
+        self.url = reverse('api:products')
+
+    def test_list_pages_newest_first_without_descriptions(self):
+        seen = []
+        url = self.url
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['slug'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [p.slug for p in self.products])
+        first = self.client.get(self.url).json()['results'][0]
+        self.assertEqual(first['price'], "10.00")
+        self.assertNotIn('description', first)
+
+    def test_sparse_fields_and_category_filter(self):
+        response = self.client.get(self.url, {'fields': 'slug,category', 'category': 'oud'})
+        self.assertEqual(response.json()['results'], [
+            {'slug': 'scent-1', 'category': 'oud'},
+            {'slug': 'scent-3', 'category': 'oud'},
+        ])
+
+    def test_bad_fields_and_cursors_are_rejected(self):
+        response = self.client.get(self.url, {'fields': 'slug,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()['error'])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nonsense'}).status_code, 400)
+
+    def test_revalidation_is_a_304_until_the_catalogue_changes(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Cached: a fresh request is answered without the database too.
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.products[0].title = "Renamed"
+        self.products[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], "Renamed")
+
+    def test_in_stock_lists_follow_holds(self):
+        url = self.url + '?in_stock=1&fields=slug'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock('other-shopper', [{'product_id': self.products[0].pk, 'quantity': 3}])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.products[0].slug, [row['slug'] for row in response.json()['results']])
+
+    def test_cache_is_keyed_on_parsed_parameters(self):
+        """Unknown or reordered parameters share the cached page and its links."""
+        first = self.client.get(self.url, {'category': 'oud', 'fields': 'slug', 'per_page': 1})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.url + '?per_page=1&utm_source=mail&fields=slug&category=oud&category=oud')
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json(), first.json())
+        self.assertNotIn('utm_source', response.json()['next'])
+        self.assertEqual([row['slug'] for row in self.client.get(response.json()['next']).json()['results']],
+                         ['scent-3'])
+
+    def test_detail(self):
+        product = self.products[1]
+        data = self.client.get(reverse('api:product', args=[product.slug])).json()
+        self.assertEqual(data['category'], 'oud')
+        self.assertEqual(data['description'], product.description)
+        data = self.client.get(reverse('api:product', args=[product.slug]), {'fields': 'id'}).json()
+        self.assertEqual(data, {'id': product.pk})
+        self.assertEqual(self.client.get(reverse('api:product', args=['missing'])).status_code, 404)
+
+
+@override_settings(ORDERS_PAGE_SIZE=2)
+class OrderApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='api', email='api@example.com', password='pw')
+        other = User.objects.create_user(username='other', password='pw')
+        self.product = Product.objects.create(title="Amber", price=Decimal("5.00"), inventory=50)
+        for user in (self.user, self.user, self.user, other):
+            order = Order.objects.create(user=user, email='api@example.com')
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal("5.00"))
+        self.url = reverse('api:orders')
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_lists_own_orders_with_items_in_fixed_queries(self):
+        self.client.login(username='api', password='pw')
+        # user, orders, items (the session is cached)
+        with self.assertNumQueries(3):
+            data = self.client.get(self.url).json()
+        self.assertEqual(len(data['results']), 2)
+        order = data['results'][0]
+        self.assertEqual(order['total'], "10.00")
+        self.assertEqual(order['items'], [
+            {'product_id': self.product.pk, 'product_slug': 'amber', 'quantity': 2, 'price': "5.00"}])
+        rest = self.client.get(data['next']).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next'])
+
+    def test_sparse_fields_skip_items_and_etag_revalidates(self):
+        self.client.login(username='api', password='pw')
+        response = self.client.get(self.url, {'fields': 'id,shipped'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'shipped'})
+        self.assertIn('private', response['Cache-Control'])
+        again = self.client.get(self.url, {'fields': 'id,shipped'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('products/', views.product_list, name='products'),
+    path('products/<slug:slug>/', views.product_detail, name='product'),
+    path('orders/', views.order_list, name='orders'),
+]
@@ -0,0 +1,235 @@
+"""Read-only JSON API (``/api/v1/``) for the catalogue and order history.
+
+Rows are read with ``values()`` and serialised straight from the dicts it
+returns, without building model instances. Every list is keyset-paginated
+(``?cursor=``, ``?per_page=``) and every endpoint takes ``?fields=a,b`` to
+return only some fields.
+
+Catalogue responses are cached under the catalogue version, keyed on the
+request's parsed and validated parameters rather than its URL, so extra or
+reordered query parameters cannot fill the cache. Their ETag is derived
+from the same key, so revalidating an unchanged page is a 304 that never
+touches the database. Lists filtered to products in stock depend on
+checkout holds and are keyed on the holds version too. Order responses are
+private to the signed-in customer; their ETag is a hash of the body.
+"""
+from django.conf import settings
+from django.http import JsonResponse, QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+from ipswich_retail.conditional import make_etag
+from ipswich_retail.pagination import (
+    InvalidCursor, cursor_query, decode_cursor, page_size_from_request, paginate_keyset)
+from orders.models import Order, OrderItem
+from orders.reservations import holds_version
+from products import cache as catalogue_cache
+from products.facets import Filters
+from products.models import Product
+
+# Public field name -> the lookup ``values()`` reads it from.
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'price': 'price',
+    'category': 'category__slug',
+    'image': 'image',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+# ``description`` can be large, so lists leave it out unless asked for.
+PRODUCT_LIST_FIELDS = ('id', 'slug', 'title', 'price', 'category', 'image', 'updated_at')
+ORDER_FIELDS = {
+    'id': 'id',
+    'created_at': 'created_at',
+    'email': 'email',
+    'shipped': 'shipped',
+    'total': 'total',
+    'item_count': 'item_count',
+    # Not a column: the order's lines, read in one query per page.
+    'items': None,
+}
+ORDERING = ('-created_at', '-id')
+KEY_FIELDS = ('created_at', 'id')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _fields(request, available, default):
+    """The fields named in ``?fields=``, in order, or ``default``."""
+    raw = request.GET.get('fields', '')
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    if not names:
+        return tuple(default)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. "
+                         f"Available: {', '.join(available)}.")
+    return tuple(dict.fromkeys(names))
+
+
+def _values(queryset, available, fields):
+    """``queryset.values()`` for ``fields`` plus the keyset ordering columns."""
+    lookups = {available[name] for name in fields if available[name]}
+    return queryset.values(*sorted(lookups | set(KEY_FIELDS)))
+
+
+def _pick(row, available, fields):
+    return {name: row[available[name]] for name in fields if available[name]}
+
+
+def _cursor(request, model):
+    """``?cursor=``, checked up front so a bad one is a 400 and never a cache entry."""
+    cursor = request.GET.get('cursor') or None
+    if cursor is not None:
+        try:
+            decode_cursor(cursor, model, ORDERING)
+        except InvalidCursor:
+            raise BadRequest("Invalid cursor.")
+    return cursor
+
+
+def _page(queryset, cursor, page_size):
+    try:
+        return paginate_keyset(queryset, cursor, page_size, ORDERING)
+    except InvalidCursor:
+        raise BadRequest("Invalid cursor.")
+
+
+def _link(request, cursor, query=None):
+    """Link to the page at ``cursor``, keeping ``query`` (default: the request's parameters)."""
+    if cursor is None:
+        return None
+    # Relative, since catalogue pages are cached across hosts.
+    if query is None:
+        return f"{request.path}?{cursor_query(request, cursor)}"
+    query = query.copy()
+    query['cursor'] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+def _list_query(filters, fields, page_size):
+    """The validated list parameters as a query string, for the cached page links."""
+    query = QueryDict(mutable=True)
+    query.setlist('category', filters.categories)
+    query.setlist('price', filters.prices)
+    if filters.in_stock:
+        query['in_stock'] = '1'
+    if fields != PRODUCT_LIST_FIELDS:
+        query['fields'] = ','.join(fields)
+    if page_size != settings.CATALOGUE_PAGE_SIZE:
+        query['per_page'] = page_size
+    return query
+
+
+def _catalogue_response(request, parts, loader, holds=False):
+    """Cached, conditional response for a catalogue endpoint.
+
+    ``loader`` returns ``(status, data)``; the pair is cached under the
+    current catalogue version, keyed on ``parts``, the endpoint's validated
+    parameters. Results that depend on stock ``holds`` are also keyed on
+    the holds version.
+    """
+    if holds:
+        parts += (holds_version(),)
+    version = catalogue_cache.catalogue_version()
+    etag = quote_etag(make_etag('api', version, *parts))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        status, data = catalogue_cache.get_or_load('api', parts, loader)
+        response = JsonResponse(data, status=status)
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+@require_GET
+def product_list(request):
+    """Products, newest first, narrowed by the storefront's facets
+    (``?category=``, ``?price=``, ``?in_stock=1``)."""
+    filters = Filters.from_query(request.GET)
+    page_size = page_size_from_request(request, settings.CATALOGUE_PAGE_SIZE, settings.CATALOGUE_MAX_PAGE_SIZE)
+    try:
+        fields = _fields(request, PRODUCT_FIELDS, PRODUCT_LIST_FIELDS)
+        cursor = _cursor(request, Product)
+    except BadRequest as exc:
+        return _error(str(exc), 400)
+    query = _list_query(filters, fields, page_size)
+
+    def load():
+        products = filters.apply(Product.objects.all())
+        page = _page(_values(products, PRODUCT_FIELDS, fields), cursor, page_size)
+        return 200, {
+            'results': [_pick(row, PRODUCT_FIELDS, fields) for row in page.items],
+            'next': _link(request, page.next_cursor, query),
+            'previous': _link(request, page.previous_cursor, query),
+        }
+    return _catalogue_response(
+        request, ('products', filters, cursor, page_size, fields), load, holds=filters.in_stock)
+
+
+@require_GET
+def product_detail(request, slug):
+    """One product, by slug."""
+    try:
+        fields = _fields(request, PRODUCT_FIELDS, PRODUCT_FIELDS)
+    except BadRequest as exc:
+        return _error(str(exc), 400)
+
+    def load():
+        row = _values(Product.objects.filter(slug=slug), PRODUCT_FIELDS, fields).first()
+        if row is None:
+            return 404, {'error': 'No product matches the given slug.'}
+        return 200, _pick(row, PRODUCT_FIELDS, fields)
+    return _catalogue_response(request, ('product', slug, fields), load)
+
+
+def _order_items(order_ids):
+    """``{order id: [line, ...]}`` for every order in ``order_ids``, in one query."""
+    lines = {order_id: [] for order_id in order_ids}
+    rows = (OrderItem.objects.filter(order__in=order_ids).order_by('order', 'id')
+            .values_list('order', 'product', 'product__slug', 'quantity', 'price'))
+    for order_id, product_id, slug, quantity, price in rows:
+        lines[order_id].append({'product_id': product_id, 'product_slug': slug,
+                                'quantity': quantity, 'price': price})
+    return lines
+
+
+@require_GET
+def order_list(request):
+    """The signed-in customer's orders, newest first."""
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    try:
+        fields = _fields(request, ORDER_FIELDS, ORDER_FIELDS)
+        orders = _values(Order.objects.filter(user=request.user), ORDER_FIELDS, fields)
+        page_size = page_size_from_request(request, settings.ORDERS_PAGE_SIZE, settings.CATALOGUE_MAX_PAGE_SIZE)
+        page = _page(orders, _cursor(request, Order), page_size)
+    except BadRequest as exc:
+        return _error(str(exc), 400)
+
+    results = [_pick(row, ORDER_FIELDS, fields) for row in page.items]
+    if 'items' in fields:
+        lines = _order_items([row['id'] for row in page.items])
+        for row, result in zip(page.items, results):
+            result['items'] = lines[row['id']]
+    response = JsonResponse({
+        'results': results,
+        'next': _link(request, page.next_cursor),
+        'previous': _link(request, page.previous_cursor),
+    })
+    # Orders change without a version to key on, so the ETag is the body's
+    # hash: a revalidation still runs the queries but sends no body.
+    etag = quote_etag(make_etag(response.content.decode()))
+    response = get_conditional_response(request, etag=etag, response=response)
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,121 @@
+"""EXPLAIN the storefront's canonical queries and flag full table scans.
+
+Each entry in :data:`CANONICAL_QUERIES` builds the queryset a hot code path
+actually runs (same filters, ordering and slicing), so a missing or unused
+index shows up here before it shows up in production latency.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from ipswich_retail.pagination import encode_cursor, keyset_queryset
+from orders.models import Order, OrderItem
+from orders.views import order_history
+from products.facets import count_cells
+from products.models import Product
+from products.views import LIST_FIELDS
+
+# SQLite: "SCAN products_product" is a full table scan, whereas
+# "SCAN products_product USING INDEX ..." walks an index in order.
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)\s*$', re.MULTILINE)
+SQLITE_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT_RE = re.compile(r'^\s*(?:->\s*)?Sort\b', re.MULTILINE)
+
+
+@dataclass
+class Sample:
+    """Representative parameter values; real ids when the database has rows."""
+    user_id: int = 1
+    category_slug: str = 'example'
+    product_slug: str = 'example'
+    product_ids: list = field(default_factory=lambda: [1, 2, 3])
+    order_ids: list = field(default_factory=lambda: [1, 2, 3])
+
+    @classmethod
+    def from_database(cls):
+        sample = cls()
+        product = Product.objects.select_related('category').order_by('-id').first()
+        if product is not None:
+            sample.product_slug = product.slug
+            sample.product_ids = [product.pk]
+            if product.category_id:
+                sample.category_slug = product.category.slug
+        order = Order.objects.exclude(user=None).order_by('-id').first()
+        if order is not None:
+            sample.user_id = order.user_id
+            sample.order_ids = [order.pk]
+        return sample
+
+
+def _second_page(queryset):
+    cursor = encode_cursor([datetime.now(timezone.utc), 1])
+    return keyset_queryset(queryset, cursor)[0]
+
+
+CANONICAL_QUERIES = [
+    ("product list",
+     lambda s: keyset_queryset(Product.objects.only(*LIST_FIELDS))[0][:settings.CATALOGUE_PAGE_SIZE + 1]),
+    ("product list, next page",
+     lambda s: _second_page(Product.objects.only(*LIST_FIELDS))[:settings.CATALOGUE_PAGE_SIZE + 1]),
+    ("product list by category",
+     lambda s: _second_page(Product.objects.only(*LIST_FIELDS).filter(
+         category__slug=s.category_slug))[:settings.CATALOGUE_PAGE_SIZE + 1]),
+    ("facet counts",
+     lambda s: count_cells(Product.objects.all())),
+    ("product detail",
+     lambda s: Product.objects.filter(slug=s.product_slug)[:1]),
+    ("cart lines",
+     lambda s: Product.objects.filter(pk__in=s.product_ids)),
+    ("order history",
+     lambda s: _second_page(order_history(s.user_id))[:settings.ORDERS_PAGE_SIZE + 1]),
+    ("order items",
+     lambda s: OrderItem.objects.filter(order__in=s.order_ids).select_related('product')),
+    ("unshipped orders",
+     lambda s: Order.objects.filter(shipped=False).order_by('created_at', 'id')[:50]),
+]
+
+
+@dataclass
+class Plan:
+    name: str
+    sql: str
+    plan: str
+    table_scans: list
+    sorts: bool
+
+    @property
+    def ok(self):
+        return not self.table_scans
+
+
+def analyse(plan, vendor=None):
+    """Return (tables scanned in full, whether an explicit sort is needed)."""
+    vendor = vendor or connection.vendor
+    if vendor == 'postgresql':
+        return POSTGRES_SCAN_RE.findall(plan), bool(POSTGRES_SORT_RE.search(plan))
+    return SQLITE_SCAN_RE.findall(plan), bool(SQLITE_SORT_RE.search(plan))
+
+
+def explain_all(sample=None, planner_defaults=False):
+    """EXPLAIN every canonical query and return a list of :class:`Plan`.
+
+    On Postgres, sequential scans are disabled for the duration unless
+    ``planner_defaults`` is set: a small development table is always
+    cheaper to scan, which would hide whether a usable index exists at all.
+    """
+    sample = sample or Sample.from_database()
+    plans = []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and not planner_defaults:
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, build in CANONICAL_QUERIES:
+            queryset = build(sample)
+            plan = queryset.explain()
+            scans, sorts = analyse(plan)
+            plans.append(Plan(name=name, sql=str(queryset.query), plan=plan,
+                              table_scans=scans, sorts=sorts))
+    return plans
@@ -0,0 +1,94 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmarks import runner, synthetic
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'baseline.json'
+
+
+@contextmanager
+def throwaway_database(verbosity):
+    """Run against a freshly migrated test database, like ``manage.py test`` does."""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic catalogue in a throwaway database, measure p50/p95/p99 latency "
+            "and query counts for the storefront endpoints, and compare against a baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, action='append', dest='scales',
+                            help="Number of products to seed; repeat for several runs "
+                                 "(default: 1000).")
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--orders-per-user', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--cold-cache', action='store_true',
+                            help="Clear all caches before every request.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Write this run's results as the new baseline instead of comparing.")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed p95 latency growth over baseline (0.5 = +50%%).")
+        parser.add_argument('--json', dest='json_output',
+                            help="Also write the raw results to this file.")
+
+    def handle(self, *args, **options):
+        scales = options['scales'] or [1000]
+        baseline_path = Path(options['baseline'])
+        baseline = {}
+        if baseline_path.exists() and not options['update_baseline']:
+            baseline = json.loads(baseline_path.read_text())
+
+        report = {}
+        problems = []
+        for scale in scales:
+            with throwaway_database(verbosity=max(0, options['verbosity'] - 1)):
+                data = synthetic.seed(products=scale, users=options['users'],
+                                      orders_per_user=options['orders_per_user'])
+                results = runner.run_scenarios(
+                    data, iterations=options['iterations'], cold_cache=options['cold_cache'])
+
+            key = f"{scale}-cold" if options['cold_cache'] else str(scale)
+            report[key] = {r.name: r.as_dict() for r in results}
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{scale} products, {data.orders} orders"))
+            self.stdout.write(f"  {'endpoint':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>9}")
+            for r in results:
+                self.stdout.write(
+                    f"  {r.name:<16}{r.p50_ms:>8.1f}ms{r.p95_ms:>8.1f}ms{r.p99_ms:>8.1f}ms{r.queries:>9}")
+            if key in baseline:
+                problems += [f"[{scale}] {p}" for p in
+                             runner.compare(results, baseline[key], options['tolerance'])]
+
+        if options['json_output']:
+            Path(options['json_output']).write_text(json.dumps(report, indent=2))
+
+        if options['update_baseline']:
+            merged = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            merged.update({
+                scale: {name: {'p95_ms': r['p95_ms'], 'queries': r['queries']}
+                        for name, r in results.items()}
+                for scale, results in report.items()
+            })
+            baseline_path.write_text(json.dumps(merged, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"✅ Baseline written to {baseline_path}"))
+            return
+
+        if problems:
+            for problem in problems:
+                self.stderr.write(self.style.ERROR(problem))
+            raise CommandError(f"{len(problems)} performance regression(s) against {baseline_path}")
+        if baseline:
+            self.stdout.write(self.style.SUCCESS("✅ No regressions against baseline"))
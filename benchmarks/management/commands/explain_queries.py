@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from benchmarks import explain
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the storefront's canonical queries against the current database "
+            "and flag any that scan a whole table (SQLite and Postgres)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail', action='store_true',
+                            help="Exit with an error when any query scans a whole table.")
+        parser.add_argument('--planner-defaults', action='store_true',
+                            help="On Postgres, leave sequential scans enabled. By default they are "
+                                 "disabled so small tables still reveal whether an index is usable.")
+
+    def handle(self, *args, **options):
+        plans = explain.explain_all(planner_defaults=options['planner_defaults'])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{len(plans)} canonical queries on {connection.vendor}"))
+        for plan in plans:
+            note = " (sorts)" if plan.sorts else ""
+            if plan.ok:
+                self.stdout.write(f"  ok    {plan.name}{note}")
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"  SCAN  {plan.name}{note}: {', '.join(plan.table_scans)}"))
+            if options['verbosity'] > 1:
+                self.stdout.write(f"        {plan.sql}")
+                for line in plan.plan.splitlines():
+                    self.stdout.write(f"        | {line}")
+
+        scanning = [plan.name for plan in plans if not plan.ok]
+        if scanning and options['fail']:
+            raise CommandError(f"{len(scanning)} query(ies) scan a whole table: {', '.join(scanning)}")
+        if not scanning:
+            self.stdout.write(self.style.SUCCESS("✅ Every canonical query uses an index"))
@@ -0,0 +1,92 @@
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmarks import replay
+
+
+@contextmanager
+def test_environment():
+    """Admit the test client's host and keep outgoing mail in memory, as ``benchmark`` does."""
+    try:
+        setup_test_environment()
+    except RuntimeError:
+        # Already set up, e.g. when called from the test suite.
+        yield
+        return
+    try:
+        yield
+    finally:
+        teardown_test_environment()
+
+
+class Command(BaseCommand):
+    help = ("Replay a JSONL traffic capture in-process or against a live server and report "
+            "throughput, p50/p95/p99 latency and error rate per route")
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help="JSONL capture file, or - for stdin.")
+        parser.add_argument('--url', help="Base URL of a running server (default: in-process "
+                                          "through the test client, against the configured database).")
+        parser.add_argument('--concurrency', type=int, default=1)
+        pace = parser.add_mutually_exclusive_group()
+        pace.add_argument('--rate', type=float, help="Requests started per second.")
+        pace.add_argument('--speed', type=float,
+                          help="Replay at the recorded pace times this factor (2 = twice as fast).")
+        parser.add_argument('--limit', type=int, help="Stop after this many requests.")
+        parser.add_argument('--include-writes', action='store_true',
+                            help="Also replay POST/PUT/PATCH/DELETE requests (these change data).")
+        parser.add_argument('--user', help="In-process: send signed-in requests as this username.")
+        parser.add_argument('--cookie', help="Live: Cookie header for signed-in requests.")
+        parser.add_argument('--json', dest='json_output', help="Also write the report to this file.")
+        parser.add_argument('--max-error-rate', type=float,
+                            help="Exit non-zero if the overall error rate exceeds this (0.01 = 1%%).")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        if options['url']:
+            target = replay.HttpTarget(options['url'], cookie=options['cookie'])
+            environment = nullcontext()
+        else:
+            target = replay.InProcessTarget(username=options['user'])
+            environment = test_environment()
+
+        methods = None if options['include_writes'] else replay.READ_METHODS
+        with environment:
+            if options['capture'] == '-':
+                report = self._replay(sys.stdin, methods, target, options)
+            else:
+                try:
+                    with open(options['capture'], encoding='utf-8') as fh:
+                        report = self._replay(fh, methods, target, options)
+                except FileNotFoundError:
+                    raise CommandError(f"No such capture: {options['capture']}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{report.requests} requests to {target.name} in {report.elapsed:.1f}s "
+            f"({report.throughput:.1f} req/s, concurrency {options['concurrency']})"))
+        self.stdout.write(f"  {'route':<28}{'requests':>9}{'p50':>10}{'p95':>10}{'p99':>10}"
+                          f"{'errors':>8}{'changed':>9}")
+        for view, route in sorted(report.routes.items()):
+            stats = route.as_dict()
+            self.stdout.write(
+                f"  {view:<28}{stats['requests']:>9}{stats['p50_ms']:>8.1f}ms{stats['p95_ms']:>8.1f}ms"
+                f"{stats['p99_ms']:>8.1f}ms{route.error_rate:>8.1%}{route.mismatches:>9}")
+
+        if options['json_output']:
+            Path(options['json_output']).write_text(json.dumps(report.as_dict(), indent=2))
+
+        limit = options['max_error_rate']
+        if limit is not None and report.error_rate > limit:
+            raise CommandError(f"Error rate {report.error_rate:.2%} exceeds {limit:.2%}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Replayed {report.requests} requests, error rate {report.error_rate:.2%}"))
+
+    def _replay(self, lines, methods, target, options):
+        return replay.replay(
+            replay.read_capture(lines, methods), target, concurrency=options['concurrency'],
+            rate=options['rate'], speed=options['speed'], limit=options['limit'])
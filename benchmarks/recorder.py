@@ -0,0 +1,114 @@
+"""Capture live traffic as JSONL for ``manage.py replay_traffic``.
+
+Enabled by setting ``TRAFFIC_CAPTURE_LOG`` to a file path; otherwise the
+middleware removes itself from the chain at startup. Each sampled request
+becomes one line in the same shape as the slow-request log written by
+``ipswich_retail.instrumentation`` (``ts``, ``method``, ``path``, ``view``,
+``status``, ``duration_ms``), plus whether the visitor was signed in and,
+with ``TRAFFIC_CAPTURE_BODIES``, form or JSON bodies with passwords and
+CSRF tokens removed. Cookies and headers are never recorded, and neither
+are requests sent by the replayer itself (marked with ``X-Replay``).
+"""
+import json
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from ipswich_retail.instrumentation import append_jsonl
+
+# Sent with replayed requests so a recording server does not capture them again.
+REPLAY_HEADER = 'X-Replay'
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+MULTIPART_CONTENT_TYPE = 'multipart/form-data'
+JSON_CONTENT_TYPE = 'application/json'
+REDACTED_FIELDS = ('csrfmiddlewaretoken',)
+
+
+def _redact(data):
+    return {key: value for key, value in data.items()
+            if 'password' not in key.lower() and key not in REDACTED_FIELDS}
+
+
+def _body(request):
+    """``(content type, body)`` in a replayable, redacted form, or None.
+
+    Multipart forms are kept as their plain fields (uploads are dropped) and
+    replayed URL-encoded.
+    """
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    if request.content_type in (FORM_CONTENT_TYPE, MULTIPART_CONTENT_TYPE):
+        return FORM_CONTENT_TYPE, _redact({key: request.POST.getlist(key) for key in request.POST})
+    if request.content_type == JSON_CONTENT_TYPE:
+        try:
+            data = json.loads(request.body or b'null')
+        except ValueError:
+            return None
+        return JSON_CONTENT_TYPE, _redact(data) if isinstance(data, dict) else data
+    return None
+
+
+def _authenticated(request):
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated)
+
+
+class TrafficRecorderMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRAFFIC_CAPTURE_LOG', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _wanted(self, request):
+        if REPLAY_HEADER in request.headers:
+            return False
+        if request.path.startswith(tuple(settings.TRAFFIC_CAPTURE_EXCLUDE)):
+            return False
+        return random.random() < settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._wanted(request):
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, _authenticated(request))
+        return response
+
+    async def __acall__(self, request):
+        if not self._wanted(request):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        duration = time.perf_counter() - started
+        # Resolving request.user may hit the session and user tables.
+        authenticated = await sync_to_async(_authenticated)(request)
+        self._record(request, response, duration, authenticated)
+        return response
+
+    def _record(self, request, response, duration, authenticated):
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'ts': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': (match.view_name if match else None) or '<unresolved>',
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'authenticated': authenticated,
+        }
+        if settings.TRAFFIC_CAPTURE_BODIES:
+            body = _body(request)
+            if body is not None:
+                record['content_type'], record['body'] = body
+        append_jsonl(settings.TRAFFIC_CAPTURE_LOG, record)
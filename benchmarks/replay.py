@@ -0,0 +1,265 @@
+"""Replay captured traffic and measure it per route.
+
+Captures are JSONL, one request per line, as written by
+:mod:`benchmarks.recorder` (the slow-request log has the same shape and
+can be replayed too). Requests are sent either in-process through Django's
+test client or to a running server over HTTP, optionally from several
+threads and at a fixed rate or at the pace they were recorded.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.test import Client
+
+from .recorder import REPLAY_HEADER
+from .runner import percentile
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+@dataclass
+class Entry:
+    method: str
+    path: str
+    view: str = '<unresolved>'
+    status: int = None
+    authenticated: bool = False
+    content_type: str = None
+    body: object = None
+    ts: float = None
+
+    @classmethod
+    def from_record(cls, record):
+        ts = record.get('ts')
+        return cls(
+            method=record.get('method', 'GET').upper(),
+            path=record['path'],
+            view=record.get('view') or '<unresolved>',
+            status=record.get('status'),
+            authenticated=bool(record.get('authenticated')),
+            content_type=record.get('content_type'),
+            body=record.get('body'),
+            ts=datetime.fromisoformat(ts).timestamp() if ts else None,
+        )
+
+
+def read_capture(lines, methods=READ_METHODS):
+    """Yield an :class:`Entry` per JSONL line whose method is in ``methods``.
+
+    Blank and malformed lines are skipped.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = Entry.from_record(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            continue
+        if methods is None or entry.method in methods:
+            yield entry
+
+
+def _encoded_body(entry):
+    if entry.body is None:
+        return None, None
+    if entry.content_type == 'application/x-www-form-urlencoded':
+        return urllib.parse.urlencode(entry.body, doseq=True), entry.content_type
+    return json.dumps(entry.body), 'application/json'
+
+
+class InProcessTarget:
+    """Sends requests through Django's test client, one client per thread.
+
+    Signed-in entries are sent as ``username`` when given, else anonymously.
+    """
+    name = 'in-process'
+
+    def __init__(self, username=None):
+        self.user = get_user_model().objects.get_by_natural_key(username) if username else None
+        self._local = threading.local()
+
+    def _client(self, authenticated):
+        key = 'user' if authenticated and self.user else 'anonymous'
+        client = getattr(self._local, key, None)
+        if client is None:
+            client = Client(raise_request_exception=False)
+            if key == 'user':
+                client.force_login(self.user)
+            setattr(self._local, key, client)
+        return client
+
+    def send(self, entry):
+        client = self._client(entry.authenticated)
+        data, content_type = _encoded_body(entry)
+        kwargs = {'content_type': content_type} if content_type else {}
+        response = client.generic(entry.method, entry.path, data or '',
+                                  headers={REPLAY_HEADER: '1'}, **kwargs)
+        return response.status_code
+
+
+class HttpTarget:
+    """Sends requests to a running server at ``base_url``.
+
+    ``cookie`` (e.g. ``"sessionid=..."``) is sent with signed-in entries.
+    Redirects are not followed, so statuses compare with the capture.
+    """
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url, cookie=None, timeout=30):
+        self.name = base_url
+        self.base_url = base_url.rstrip('/')
+        self.cookie = cookie
+        self.timeout = timeout
+        self._opener = urllib.request.build_opener(self._NoRedirect)
+
+    def send(self, entry):
+        data, content_type = _encoded_body(entry)
+        request = urllib.request.Request(
+            self.base_url + entry.path, method=entry.method,
+            data=data.encode() if data is not None else None, headers={REPLAY_HEADER: '1'})
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        if entry.authenticated and self.cookie:
+            request.add_header('Cookie', self.cookie)
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+
+@dataclass
+class RouteStats:
+    view: str
+    timings: list = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
+    mismatches: int = 0
+
+    @property
+    def requests(self):
+        return len(self.timings)
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'p50_ms': round(percentile(self.timings, 50), 3),
+            'p95_ms': round(percentile(self.timings, 95), 3),
+            'p99_ms': round(percentile(self.timings, 99), 3),
+            'error_rate': round(self.error_rate, 4),
+            'status_mismatches': self.mismatches,
+            'statuses': {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+        }
+
+
+@dataclass
+class Report:
+    routes: dict
+    elapsed: float
+
+    @property
+    def requests(self):
+        return sum(route.requests for route in self.routes.values())
+
+    @property
+    def errors(self):
+        return sum(route.errors for route in self.routes.values())
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'elapsed_s': round(self.elapsed, 3),
+            'throughput_rps': round(self.throughput, 2),
+            'error_rate': round(self.error_rate, 4),
+            'routes': {view: route.as_dict() for view, route in sorted(self.routes.items())},
+        }
+
+
+def replay(entries, target, concurrency=1, rate=None, speed=None, limit=None):
+    """Send ``entries`` to ``target`` and return a :class:`Report`.
+
+    ``rate`` fixes the requests started per second; otherwise ``speed``
+    replays at the recorded pace (2.0 = twice as fast); with neither,
+    requests go as fast as ``concurrency`` threads allow. A 5xx status or a
+    failure to get any response counts as an error.
+    """
+    routes = {}
+    lock = threading.Lock()
+
+    def send(entry):
+        started = time.perf_counter()
+        try:
+            status = target.send(entry)
+        except Exception:
+            status = None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            route = routes.setdefault(entry.view, RouteStats(entry.view))
+            route.timings.append(elapsed_ms)
+            route.statuses[status if status is not None else 'failed'] += 1
+            if status is None or status >= 500:
+                route.errors += 1
+            if entry.status is not None and status != entry.status:
+                route.mismatches += 1
+
+    def threaded_send(entry):
+        try:
+            send(entry)
+        finally:
+            slots.release()
+            close_old_connections()
+
+    started = time.perf_counter()
+    first_ts = None
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    try:
+        for index, entry in enumerate(entries):
+            if limit is not None and index >= limit:
+                break
+            if rate:
+                due = started + index / rate
+            elif speed and entry.ts is not None:
+                first_ts = entry.ts if first_ts is None else first_ts
+                due = started + (entry.ts - first_ts) / speed
+            else:
+                due = None
+            if due is not None:
+                time.sleep(max(0.0, due - time.perf_counter()))
+            if executor is None:
+                send(entry)
+            else:
+                # Bound the backlog so a long capture is not queued all at once.
+                slots.acquire()
+                executor.submit(threaded_send, entry)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return Report(routes=routes, elapsed=time.perf_counter() - started)
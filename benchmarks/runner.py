@@ -0,0 +1,116 @@
+"""Latency and query-count measurements for the storefront endpoints.
+
+Each scenario is replayed through Django's test client, so numbers cover
+the full middleware/view/template stack but not the network or WSGI server.
+"""
+import itertools
+import json
+import math
+import time
+from dataclasses import asdict, dataclass
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (which need not be sorted)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class Result:
+    name: str
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries: int
+    status: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def measure(name, request, iterations=50, warmup=3, cold_cache=False):
+    """Time ``request()`` (which returns a response) ``iterations`` times.
+
+    ``queries`` is the worst case seen, so a view that only sometimes
+    issues extra queries still shows up.
+    """
+    for _ in range(warmup):
+        request()
+    timings, queries, status = [], 0, None
+    for _ in range(iterations):
+        if cold_cache:
+            for cache in caches.all():
+                cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+        status = response.status_code
+    return Result(
+        name=name,
+        iterations=iterations,
+        p50_ms=round(percentile(timings, 50), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        p99_ms=round(percentile(timings, 99), 3),
+        queries=queries,
+        status=status,
+    )
+
+
+def run_scenarios(data, iterations=50, warmup=3, cold_cache=False):
+    """Measure every storefront scenario against seeded ``data``."""
+    anonymous = Client()
+    customer = Client()
+    customer.login(username=data.username, password=data.password)
+
+    slugs = itertools.cycle(data.product_slugs)
+    product_ids = itertools.cycle(data.product_ids)
+    checkout_url = reverse('orders:checkout_api')
+
+    def checkout():
+        payload = {'items': [{'product_id': next(product_ids), 'quantity': 1}]}
+        return customer.post(checkout_url, json.dumps(payload), content_type='application/json')
+
+    scenarios = [
+        ('product_list', lambda: anonymous.get(reverse('products:list'))),
+        ('product_detail', lambda: anonymous.get(reverse('products:detail', args=[next(slugs)]))),
+        ('order_list', lambda: customer.get(reverse('orders:list'))),
+        ('checkout', checkout),
+    ]
+    return [measure(name, request, iterations, warmup, cold_cache) for name, request in scenarios]
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of ``results`` against ``baseline``.
+
+    Query counts must not increase at all; p95 latency may grow by at most
+    ``tolerance`` (0.5 = 50%) since timings vary between machines.
+    """
+    problems = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if not expected:
+            continue
+        if result.status >= 400:
+            problems.append(f"{result.name}: HTTP {result.status}")
+        if result.queries > expected['queries']:
+            problems.append(
+                f"{result.name}: {result.queries} queries (baseline {expected['queries']})")
+        limit = expected['p95_ms'] * (1 + tolerance)
+        if result.p95_ms > limit:
+            problems.append(
+                f"{result.name}: p95 {result.p95_ms:.1f}ms exceeds "
+                f"{limit:.1f}ms (baseline {expected['p95_ms']:.1f}ms +{tolerance:.0%})")
+    return problems
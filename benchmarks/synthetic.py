@@ -0,0 +1,101 @@
+"""Synthetic catalogue and order data for benchmarks.
+
+Everything is written with ``bulk_create`` so seeding 100k products takes
+seconds, and a fixed random seed keeps runs comparable.
+"""
+import random
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.utils.text import slugify
+from orders.models import Order, OrderItem
+from products.cache import bump_catalogue_version
+from products.models import DEFAULT_IMAGE_URL, Category, Product
+
+BENCH_PASSWORD = 'bench-pass-123'
+
+WORDS = (
+    "rose amber oud cedar vanilla musk citrus bergamot jasmine neroli vetiver "
+    "sandalwood iris peony tonka leather smoke pepper fig lavender"
+).split()
+
+
+@dataclass
+class SeededData:
+    products: int
+    users: int
+    orders: int
+    product_slugs: list
+    product_ids: list
+    username: str
+    password: str = BENCH_PASSWORD
+
+
+def seed(products=1000, categories=12, users=10, orders_per_user=20,
+         items_per_order=3, inventory=1_000_000, random_seed=42, batch_size=2000,
+         label='bench'):
+    """Populate the current database and return a :class:`SeededData`.
+
+    ``label`` prefixes every name/slug so several datasets can coexist.
+    """
+    rng = random.Random(random_seed)
+
+    category_objs = Category.objects.bulk_create([
+        Category(name=f"{label.title()} Category {i}", slug=f"{label}-category-{i}")
+        for i in range(categories)
+    ])
+
+    def make_product(i):
+        title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}"
+        return Product(
+            title=title,
+            slug=slugify(f"{label} {title}"),
+            description=" ".join(rng.choice(WORDS) for _ in range(40)),
+            price=Decimal(rng.randrange(500, 20000)) / 100,
+            inventory=inventory,
+            category=rng.choice(category_objs),
+            image=DEFAULT_IMAGE_URL,
+        )
+
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create(
+            [make_product(i) for i in range(start, min(start + batch_size, products))])
+    product_rows = list(Product.objects.filter(slug__startswith=f"{label}-")
+                        .values_list('id', 'slug', 'price'))
+
+    User = get_user_model()
+    user_objs = [User(username=f"{label}-user-{i}") for i in range(users)]
+    for user in user_objs:
+        user.set_password(BENCH_PASSWORD)
+    user_objs = User.objects.bulk_create(user_objs)
+
+    # Lines are picked up front so each order's total and item_count can be
+    # stored as place_order would; bulk_create runs nothing to fill them in.
+    picks = [
+        (user, [(product_id, rng.randint(1, 3), price) for product_id, _slug, price
+                in rng.sample(product_rows, min(items_per_order, len(product_rows)))])
+        for user in user_objs for _ in range(orders_per_user)
+    ]
+    orders = Order.objects.bulk_create([
+        Order(user=user, email=f"{user.username}@example.com",
+              total=sum((price * quantity for _id, quantity, price in lines), Decimal('0.00')),
+              item_count=sum(quantity for _id, quantity, _price in lines))
+        for user, lines in picks
+    ], batch_size=batch_size)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=product_id, quantity=quantity, price=price)
+        for order, (_user, lines) in zip(orders, picks)
+        for product_id, quantity, price in lines
+    ], batch_size=batch_size)
+
+    bump_catalogue_version()
+    sample = rng.sample(product_rows, min(50, len(product_rows)))
+    return SeededData(
+        products=products,
+        users=users,
+        orders=len(orders),
+        product_slugs=[slug for _id, slug, _price in sample],
+        product_ids=[product_id for product_id, _slug, _price in sample],
+        username=user_objs[0].username if user_objs else '',
+    )
@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from benchmarks import explain, replay, runner, synthetic
+from benchmarks.management.commands.benchmark import DEFAULT_BASELINE
+from orders.models import Order
+from orders.services import recompute_order_totals
+
+
+class StorefrontQueryBudgetTest(TestCase):
+    def test_query_counts_do_not_grow_with_data(self):
+        """Every storefront endpoint issues the same number of queries at 20 and 80 products."""
+        small = synthetic.seed(products=20, users=2, orders_per_user=3)
+        before = {r.name: r.queries for r in runner.run_scenarios(small, iterations=2, warmup=1, cold_cache=True)}
+        large = synthetic.seed(products=60, categories=3, users=2, orders_per_user=12, random_seed=7,
+                               label='more')
+        after = runner.run_scenarios(large, iterations=2, warmup=1, cold_cache=True)
+        for result in after:
+            self.assertLess(result.status, 400, result.name)
+            self.assertEqual(result.queries, before[result.name], result.name)
+
+
+class BaselineTest(TestCase):
+    def test_stored_query_counts_match_a_run(self):
+        """benchmarks/baseline.json is re-recorded, not hand-edited: its query
+        counts are what the storefront issues now (they don't grow with data,
+        see above). Checkout is left out: its transaction is a savepoint here."""
+        with open(DEFAULT_BASELINE) as f:
+            baseline = json.load(f)
+        data = synthetic.seed(products=20, users=2, orders_per_user=3)
+        for key, cold_cache in (('1000', False), ('1000-cold', True)):
+            for result in runner.run_scenarios(data, iterations=2, warmup=1, cold_cache=cold_cache):
+                if result.name != 'checkout':
+                    self.assertEqual(result.queries, baseline[key][result.name]['queries'], (key, result.name))
+
+
+class SyntheticDataTest(TestCase):
+    def test_seeded_orders_have_their_totals(self):
+        synthetic.seed(products=10, users=2, orders_per_user=2)
+        self.assertFalse(Order.objects.filter(total=0).exists())
+        self.assertEqual(recompute_order_totals(), (4, 0))
+
+
+class CompareTest(TestCase):
+    def result(self, **kwargs):
+        values = dict(name='product_list', iterations=10, p50_ms=1.0, p95_ms=2.0,
+                      p99_ms=3.0, queries=2, status=200)
+        values.update(kwargs)
+        return runner.Result(**values)
+
+    def test_regressions_are_reported(self):
+        baseline = {'product_list': {'p95_ms': 2.0, 'queries': 2}}
+        self.assertEqual(runner.compare([self.result()], baseline, 0.5), [])
+        self.assertEqual(runner.compare([self.result(p95_ms=2.9)], baseline, 0.5), [])
+        problems = runner.compare([self.result(p95_ms=3.5, queries=3)], baseline, 0.5)
+        self.assertEqual(len(problems), 2)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(runner.percentile(samples, 50), 50)
+        self.assertEqual(runner.percentile(samples, 99), 99)
+        self.assertEqual(runner.percentile([5], 95), 5)
+
+
+class ExplainQueriesTest(TestCase):
+    def test_plan_analysis(self):
+        self.assertEqual(explain.analyse("2 0 0 SCAN products_product", 'sqlite'),
+                         (['products_product'], False))
+        self.assertEqual(explain.analyse(
+            "5 0 0 SCAN products_product USING INDEX product_created_idx", 'sqlite'), ([], False))
+        self.assertEqual(explain.analyse(
+            "Limit\n  ->  Sort\n        ->  Seq Scan on orders_order", 'postgresql'),
+            (['orders_order'], True))
+
+    def test_canonical_queries_use_indexes(self):
+        synthetic.seed(products=20, users=2, orders_per_user=3)
+        for plan in explain.explain_all():
+            self.assertEqual(plan.table_scans, [], f"{plan.name}:\n{plan.plan}")
+
+    def test_command_reports_and_can_fail(self):
+        out = io.StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn("product list by category", out.getvalue())
+        with mock.patch.object(explain, 'analyse', return_value=(['products_product'], False)):
+            with self.assertRaises(CommandError):
+                call_command('explain_queries', '--fail', stdout=io.StringIO())
+
+
+class TrafficReplayTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.capture = os.path.join(tmp.name, 'traffic.jsonl')
+        self.data = synthetic.seed(products=5, users=1, orders_per_user=1)
+
+    def record(self, **overrides):
+        values = dict(TRAFFIC_CAPTURE_LOG=self.capture, TRAFFIC_CAPTURE_BODIES=True)
+        values.update(overrides)
+        with override_settings(**values):
+            client = Client()
+            client.get(reverse('products:list'))
+            client.get(reverse('products:detail', args=[self.data.product_slugs[0]]) + '?ref=mail')
+            client.post(reverse('login'), {'username': self.data.username, 'password': self.data.password})
+            client.login(username=self.data.username, password=self.data.password)
+            client.get(reverse('orders:list'))
+            client.get('/metrics')
+        with open(self.capture) as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_recorder_writes_replayable_jsonl(self):
+        records = self.record()
+        self.assertEqual([r['view'] for r in records],
+                         ['products:list', 'products:detail', 'login', 'orders:list'])
+        self.assertEqual(records[1]['path'], f'/shop/{self.data.product_slugs[0]}/?ref=mail')
+        self.assertEqual([r['authenticated'] for r in records], [False, False, False, True])
+        self.assertEqual(records[2]['body'], {'username': [self.data.username]})
+
+    def test_recorder_is_off_by_default(self):
+        self.client.get(reverse('products:list'))
+        self.assertFalse(os.path.exists(self.capture))
+
+    def test_replay_reports_per_route(self):
+        self.record()
+        with open(self.capture) as fh:
+            entries = list(replay.read_capture(fh))
+        self.assertEqual(len(entries), 3)
+        with override_settings(TRAFFIC_CAPTURE_LOG=self.capture):
+            report = replay.replay(entries * 2, replay.InProcessTarget(username=self.data.username))
+        with open(self.capture) as fh:
+            self.assertEqual(len(fh.readlines()), 4, "replayed requests must not be recorded again")
+        self.assertEqual(report.requests, 6)
+        self.assertEqual(report.error_rate, 0)
+        self.assertEqual(report.routes['orders:list'].as_dict()['statuses'], {'200': 2})
+        self.assertEqual(report.routes['products:list'].mismatches, 0)
+
+    def test_command_reports_and_fails_on_errors(self):
+        with open(self.capture, 'w') as fh:
+            fh.write(json.dumps({'method': 'GET', 'path': '/shop/', 'view': 'products:list', 'status': 200}) + '\n')
+            fh.write('not json\n')
+            fh.write(json.dumps({'method': 'POST', 'path': '/orders/checkout/', 'view': 'orders:checkout_api'}) + '\n')
+        out = io.StringIO()
+        call_command('replay_traffic', self.capture, '--rate', '1000', stdout=out)
+        self.assertIn("1 requests to in-process", out.getvalue())
+        self.assertIn("products:list", out.getvalue())
+
+        with mock.patch.object(replay.InProcessTarget, 'send', side_effect=RuntimeError):
+            with self.assertRaises(CommandError):
+                call_command('replay_traffic', self.capture, '--max-error-rate', '0.5', stdout=io.StringIO())
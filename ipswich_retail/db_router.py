@@ -0,0 +1,99 @@
+"""Read-replica routing.
+
+Catalogue models (products and categories) are read from the replicas in
+``settings.DATABASE_REPLICAS``; everything else, and every write, goes to
+the primary. Reads fall back to the primary when replica lag could be
+visible to the caller:
+
+* inside a transaction on the primary (e.g. checkout reading prices before
+  decrementing stock),
+* during, and for a few seconds after, a request that is not GET/HEAD
+  (see :class:`PrimaryPinningMiddleware`),
+* anywhere inside ``with use_primary():``.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICATED_APPS = {'products'}
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or model._meta.app_label not in REPLICATED_APPS:
+            return DEFAULT_DB_ALIAS
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """Read from the primary for requests that write, and briefly after.
+
+    A non-GET/HEAD request is pinned for its whole duration, and sets a
+    short-lived cookie so the redirect that usually follows (and anything
+    else the visitor does in the next ``DATABASE_REPLICA_PIN_SECONDS``)
+    also reads from the primary and sees its own change.
+    """
+    cookie_name = 'db_primary'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _pins(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return False
+        return request.method not in ('GET', 'HEAD') or self.cookie_name in request.COOKIES
+
+    def _remember(self, request, response):
+        if request.method not in ('GET', 'HEAD'):
+            response.set_cookie(self.cookie_name, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._pins(request):
+            return self.get_response(request)
+        with use_primary():
+            response = self.get_response(request)
+        return self._remember(request, response)
+
+    async def __acall__(self, request):
+        if not self._pins(request):
+            return await self.get_response(request)
+        with use_primary():
+            response = await self.get_response(request)
+        return self._remember(request, response)
@@ -0,0 +1,181 @@
+"""Per-view database instrumentation.
+
+``QueryInstrumentationMiddleware`` wraps every database call made while a
+request is handled and exports, labelled by URL name:
+
+* ``ipswich_view_db_queries``: queries per request (histogram)
+* ``ipswich_view_db_seconds``: time spent in SQL per request (histogram)
+* ``ipswich_view_db_duplicate_queries_total``: queries whose fingerprint
+  was already seen in the same request, the signature of an N+1 loop
+
+Requests slower than ``SLOW_REQUEST_THRESHOLD_MS`` are optionally appended,
+sampled at ``SLOW_REQUEST_SAMPLE_RATE``, to the JSONL file named by
+``SLOW_REQUEST_LOG``, one object per line.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from prometheus_client import Counter, Histogram
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, float('inf'))
+SQL_TIME_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float('inf'))
+
+view_queries = Histogram(
+    'ipswich_view_db_queries', 'Database queries per request, by view.',
+    ['view'], buckets=QUERY_BUCKETS)
+view_sql_seconds = Histogram(
+    'ipswich_view_db_seconds', 'Time spent executing SQL per request, by view.',
+    ['view'], buckets=SQL_TIME_BUCKETS)
+view_duplicate_queries = Counter(
+    'ipswich_view_db_duplicate_queries', 'Repeated query fingerprints within one request, by view.',
+    ['view'])
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so queries differing only in values compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` callable that counts and times queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Tally()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.fingerprints.values() if n > 1)
+
+    def top_duplicates(self, limit=5):
+        return [{'sql': sql, 'count': n}
+                for sql, n in self.fingerprints.most_common(limit) if n > 1]
+
+
+# The recorder of the request being handled. Context variables follow the
+# request into sync_to_async threads, where the async ORM runs its queries.
+_active_recorder = ContextVar('query_recorder', default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_dispatch():
+    """Route this thread's connections through the active request's recorder.
+
+    Connections are per thread, so this has to run in the thread that
+    executes the queries. Idempotent.
+    """
+    for connection in connections.all():
+        if _dispatch not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_dispatch)
+
+
+@contextmanager
+def _recording(recorder):
+    token = _active_recorder.set(recorder)
+    try:
+        yield
+    finally:
+        _active_recorder.reset(token)
+
+
+_log_lock = threading.Lock()
+
+
+def append_jsonl(path, record):
+    """Append ``record`` to the JSONL file at ``path`` (thread-safe)."""
+    line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+    with _log_lock, open(path, 'a', encoding='utf-8') as fh:
+        fh.write(line)
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        install_dispatch()
+        with _recording(recorder):
+            response = self.get_response(request)
+        self._report(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        # The async ORM queries through connections of the request's
+        # thread-sensitive worker thread, not this one's, so the dispatcher
+        # is installed there.
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        await sync_to_async(install_dispatch)()
+        with _recording(recorder):
+            response = await self.get_response(request)
+        self._report(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def _report(self, request, response, recorder, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or '<unresolved>'
+        view_queries.labels(view=view).observe(recorder.count)
+        view_sql_seconds.labels(view=view).observe(recorder.seconds)
+        if recorder.duplicates:
+            view_duplicate_queries.labels(view=view).inc(recorder.duplicates)
+
+        log_path = getattr(settings, 'SLOW_REQUEST_LOG', None)
+        if (log_path
+                and duration * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS
+                and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE):
+            append_jsonl(log_path, {
+                'ts': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': view,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'queries': recorder.count,
+                'sql_ms': round(recorder.seconds * 1000, 3),
+                'duplicate_queries': recorder.duplicates,
+                'top_duplicates': recorder.top_duplicates(),
+            })
@@ -0,0 +1,225 @@
+"""Keyset (cursor) pagination shared by the catalogue and order history.
+
+OFFSET pagination gets slower the deeper you page because the database has
+to walk and discard every skipped row. Keyset pagination instead remembers
+the sort key of the last row on the page and asks for rows "after" it, which
+an index on the ordering columns answers in constant time regardless of how
+far into the result set the visitor is.
+
+Cursors are opaque, URL-safe strings so page links stay stable even when new
+rows are inserted at the top of the listing.
+
+The admin keeps Django's numbered pages, but :class:`EstimatedCountPaginator`
+avoids its ``SELECT COUNT(*)`` over whole large tables.
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the given ordering."""
+
+
+@dataclass
+class CursorPage:
+    items: list
+    next_cursor: str = None
+    previous_cursor: str = None
+    page_size: int = 0
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _split_ordering(ordering):
+    """Turn ('-created_at', '-id') into [('created_at', True), ('id', True)]."""
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _item_value(item, name):
+    if isinstance(item, dict):
+        return item[name]
+    return getattr(item, name)
+
+
+def encode_cursor(values, reverse=False):
+    payload = {'v': values}
+    if reverse:
+        payload['r'] = 1
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Return (values, reverse) for ``cursor`` typed against ``model`` fields."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        raw_values = payload['v']
+        reverse = bool(payload.get('r'))
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    fields = _split_ordering(ordering)
+    if not isinstance(raw_values, list) or len(raw_values) != len(fields):
+        raise InvalidCursor(cursor)
+    try:
+        values = [model._meta.get_field(name).to_python(value)
+                  for (name, _desc), value in zip(fields, raw_values)]
+    except Exception:
+        raise InvalidCursor(cursor)
+    return values, reverse
+
+
+def _keyset_filter(fields, values, forward):
+    """Build the "rows after this key" condition for a (possibly mixed) ordering.
+
+    For ordering (a DESC, b DESC) and key (x, y) going forward this is
+    ``a < x OR (a = x AND b < y)``.
+    """
+    condition = Q()
+    equal_so_far = Q()
+    for (name, descending), value in zip(fields, values):
+        after = descending == forward
+        lookup = '%s__%s' % (name, 'lt' if after else 'gt')
+        condition |= equal_so_far & Q(**{lookup: value})
+        equal_so_far &= Q(**{name: value})
+    return condition
+
+
+def keyset_queryset(queryset, cursor=None, ordering=('-created_at', '-id')):
+    """Return ``(queryset, reverse)``: ``queryset`` filtered to the rows after
+    (or, for a backwards cursor, before) ``cursor`` and ordered to match.
+
+    This is the query a page is read with; it is exposed separately so it
+    can be inspected (e.g. EXPLAINed) without being evaluated.
+    """
+    fields = _split_ordering(ordering)
+    reverse = False
+    if cursor:
+        values, reverse = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(
+            _keyset_filter(fields, values, forward=not reverse))
+
+    if reverse:
+        flipped = [('' if name.startswith('-') else '-') + name.lstrip('-')
+                   for name in ordering]
+        return queryset.order_by(*flipped), True
+    return queryset.order_by(*ordering), False
+
+
+def paginate_keyset(queryset, cursor=None, page_size=24,
+                    ordering=('-created_at', '-id')):
+    """Return a :class:`CursorPage` of ``queryset`` after/before ``cursor``.
+
+    ``ordering`` must end in a unique column (normally ``id``) so the key is
+    total. One extra row is fetched to know whether another page follows;
+    no COUNT query is issued.
+    """
+    queryset, reverse = keyset_queryset(queryset, cursor, ordering)
+    rows = list(queryset[:page_size + 1])
+    return _build_page(rows, cursor, reverse, page_size, ordering)
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=24,
+                           ordering=('-created_at', '-id')):
+    """Async :func:`paginate_keyset`, for async views."""
+    queryset, reverse = keyset_queryset(queryset, cursor, ordering)
+    rows = [row async for row in queryset[:page_size + 1]]
+    return _build_page(rows, cursor, reverse, page_size, ordering)
+
+
+def _build_page(rows, cursor, reverse, page_size, ordering):
+    """Trim the extra look-ahead row and work out the neighbouring cursors."""
+    fields = _split_ordering(ordering)
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    def key_of(item):
+        return [_item_value(item, name) for name, _desc in fields]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        # Going forward, a previous page exists iff we arrived via a cursor;
+        # going backward, the page we came from is always "next".
+        if more or reverse:
+            next_cursor = encode_cursor(key_of(rows[-1]))
+        if (more and reverse) or (cursor and not reverse):
+            previous_cursor = encode_cursor(key_of(rows[0]), reverse=True)
+
+    return CursorPage(items=rows, next_cursor=next_cursor,
+                      previous_cursor=previous_cursor, page_size=page_size)
+
+
+def cursor_query(request, cursor):
+    """Current query string with ``cursor`` swapped in, for page links."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if cursor:
+        params['cursor'] = cursor
+    return params.urlencode()
+
+
+def page_size_from_request(request, default, maximum):
+    """Read ``?per_page=`` clamped to ``1..maximum``, falling back to ``default``."""
+    try:
+        size = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for an unfiltered ``queryset``, or None.
+
+    Only Postgres keeps one (``pg_class.reltuples``, refreshed by VACUUM and
+    ANALYZE); anything filtered, or a table never analysed, returns None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's estimate for large unfiltered tables.
+
+    Counting 100k+ rows exactly is a full scan on every admin page view.
+    Below ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows, or once the list is
+    filtered, the exact count is used as usual.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = None
+        if hasattr(self.object_list, 'query'):
+            estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
@@ -20,11 +20,18 @@ INSTALLED_APPS = [
     'django_prometheus',
     'products',
     'orders',
+    'jobs',
+    'reports',
+    'api',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'ipswich_retail.staticfiles.WhiteNoiseMiddleware',
+    'ipswich_retail.instrumentation.QueryInstrumentationMiddleware',
+    'benchmarks.recorder.TrafficRecorderMiddleware',
+    'ipswich_retail.db_router.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,26 +48,65 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process and reuse it. (The
+            # autoreloader still resets this cache in development.)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'orders.context_processors.cart',
             ],
         },
     },
 ]
 
+# Sessions carry the cart, so read them from cache and only fall back to the
+# database on a miss.
+SESSION_ENGINE = env('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
 WSGI_APPLICATION = 'ipswich_retail.wsgi.application'
 
+# Databases come from DATABASE_URL (Postgres in docker-compose and CI) and
+# fall back to SQLite for local development.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': env.db_url('DATABASE_URL', default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
 }
+# DATABASE_POOL=pgbouncer when DATABASE_URL points at PgBouncer in transaction
+# pooling mode: server-side cursors cannot survive between transactions there.
+DATABASE_POOL = env('DATABASE_POOL', default='')
+# Optional read replicas (comma-separated URLs), registered as replica_1, ...
+# Catalogue reads are spread across them by ipswich_retail.db_router.
+DATABASE_REPLICAS = []
+for number, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = env.db_url_config(url)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+for config in DATABASES.values():
+    if config['ENGINE'] == 'django.db.backends.postgresql':
+        # The app is served over ASGI, where every request gets its own
+        # connection context: a persistent connection is never reused by a
+        # later request, so they pile up until Postgres refuses more. Close
+        # them after each request and pool with PgBouncer
+        # (DATABASE_POOL=pgbouncer) instead; raise this only under WSGI. Kept
+        # connections are checked before reuse so a restart isn't a 500.
+        config['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0)
+        config['CONN_HEALTH_CHECKS'] = True
+        config.setdefault('OPTIONS', {}).setdefault(
+            'connect_timeout', env.int('DB_CONNECT_TIMEOUT', default=5))
+        if DATABASE_POOL == 'pgbouncer':
+            config['DISABLE_SERVER_SIDE_CURSORS'] = True
+DATABASE_ROUTERS = ['ipswich_retail.db_router.ReplicaRouter'] if DATABASE_REPLICAS else []
+# How long a visitor's reads stay on the primary after they write something.
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=5)
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -70,8 +116,120 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-# Use WhiteNoise to serve static files in production (Gunicorn) without a separate web server.
-# CompressedManifestStaticFilesStorage helps with caching and compression. If you run into
-# manifest errors during collectstatic, switch to 'whitenoise.storage.CompressedStaticFilesStorage'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic builds the bundles below, fingerprints every file and writes
+# .gz/.br variants; WhiteNoise serves those with immutable caching. See
+# ipswich_retail/staticfiles.py.
+STATICFILES_STORAGE = 'ipswich_retail.staticfiles.StaticFilesStorage'
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'ipswich_retail.staticfiles.BundleFinder',
+]
+STATIC_BUNDLES = {
+    'css/site.bundle.css': ['css/site.css', 'css/theme.css'],
+    'js/site.bundle.js': ['js/site.js'],
+}
+STATIC_BUNDLE_ROOT = BASE_DIR / 'build' / 'static'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Storefront pagination. Listings use keyset cursors, so page size only
+# bounds the rows fetched per request; visitors can pick a smaller/larger
+# page via ?per_page= up to the maximum.
+CATALOGUE_PAGE_SIZE = env.int('CATALOGUE_PAGE_SIZE', default=24)
+CATALOGUE_MAX_PAGE_SIZE = env.int('CATALOGUE_MAX_PAGE_SIZE', default=96)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', default=10)
+# Where the catalogue's price filter splits its bands, in pounds.
+CATALOGUE_PRICE_BANDS = (25, 50, 100)
+
+# Caching. The catalogue gets its own cache so it can be sized and pointed
+# at shared storage independently of sessions/other uses, e.g.
+#   CATALOGUE_CACHE_URL=locmemcache://catalogue      (per-process, default)
+#   CATALOGUE_CACHE_URL=filecache:///var/tmp/catalogue
+#   CATALOGUE_CACHE_URL=redis://redis:6379/1
+# Local-memory caches are per gunicorn worker, so invalidation only reaches
+# the worker that saved the change; use file or Redis when running several.
+# Local-memory evicts least-recently-used entries past MAX_ENTRIES; Redis
+# should run with maxmemory-policy allkeys-lru (see docker-compose.yml).
+CATALOGUE_CACHE_ALIAS = 'catalogue'
+CATALOGUE_CACHE_TTL = env.int('CATALOGUE_CACHE_TTL', default=600)
+CATALOGUE_CACHE_MAX_ENTRIES = env.int('CATALOGUE_CACHE_MAX_ENTRIES', default=5000)
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+    CATALOGUE_CACHE_ALIAS: env.cache_url(
+        'CATALOGUE_CACHE_URL', default='locmemcache://catalogue'),
+}
+CACHES[CATALOGUE_CACHE_ALIAS].setdefault('TIMEOUT', CATALOGUE_CACHE_TTL)
+if 'redis' not in CACHES[CATALOGUE_CACHE_ALIAS]['BACKEND']:
+    CACHES[CATALOGUE_CACHE_ALIAS].setdefault('OPTIONS', {}).setdefault(
+        'MAX_ENTRIES', CATALOGUE_CACHE_MAX_ENTRIES)
+
+# Product search: 'index' (in-process inverted index), 'postgres' (tsvector +
+# GIN) or 'auto' to use Postgres whenever the database is Postgres. The index
+# file is written by `manage.py build_search_index`.
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto')
+SEARCH_INDEX_PATH = env('SEARCH_INDEX_PATH', default=str(BASE_DIR / 'search_index.json'))
+SEARCH_RESULTS_LIMIT = env.int('SEARCH_RESULTS_LIMIT', default=48)
+# Saved products are applied to each process's in-process index as deltas;
+# more pending changes than this wait for a rebuilt snapshot instead.
+SEARCH_DELTA_LIMIT = env.int('SEARCH_DELTA_LIMIT', default=500)
+
+# Per-view query instrumentation (see ipswich_retail/instrumentation.py).
+# Set SLOW_REQUEST_LOG to a file path to capture slow requests as JSONL.
+SLOW_REQUEST_LOG = env('SLOW_REQUEST_LOG', default=None)
+SLOW_REQUEST_THRESHOLD_MS = env.float('SLOW_REQUEST_THRESHOLD_MS', default=500)
+SLOW_REQUEST_SAMPLE_RATE = env.float('SLOW_REQUEST_SAMPLE_RATE', default=1.0)
+# Traffic capture for `manage.py replay_traffic` (see benchmarks/recorder.py).
+# Off unless TRAFFIC_CAPTURE_LOG names a file; request bodies are only kept
+# with TRAFFIC_CAPTURE_BODIES, minus passwords and CSRF tokens.
+TRAFFIC_CAPTURE_LOG = env('TRAFFIC_CAPTURE_LOG', default=None)
+TRAFFIC_CAPTURE_SAMPLE_RATE = env.float('TRAFFIC_CAPTURE_SAMPLE_RATE', default=1.0)
+TRAFFIC_CAPTURE_BODIES = env.bool('TRAFFIC_CAPTURE_BODIES', default=False)
+TRAFFIC_CAPTURE_EXCLUDE = ['/static/', '/metrics', '/admin/']
+
+# Rendered-output caching. Product cards are cached as template fragments
+# keyed by the catalogue version. (Marketing pages are only revalidated
+# with an ETag; their header shows each visitor's own cart.)
+FRAGMENT_CACHE_TTL = env.int('FRAGMENT_CACHE_TTL', default=3600)
+# How long a CDN/reverse proxy may serve a product page without asking us.
+PRODUCT_DETAIL_S_MAXAGE = env.int('PRODUCT_DETAIL_S_MAXAGE', default=60)
+
+# Background jobs (see jobs.queue). 'jobs.backends.ImmediateBackend' runs
+# them in-process after commit instead, which is handy in development.
+JOBS_BACKEND = env('JOBS_BACKEND', default='jobs.backends.DatabaseBackend')
+JOBS_MAX_ATTEMPTS = env.int('JOBS_MAX_ATTEMPTS', default=3)
+JOBS_RETRY_BACKOFF = env.int('JOBS_RETRY_BACKOFF', default=30)
+JOBS_LOCK_TIMEOUT = env.int('JOBS_LOCK_TIMEOUT', default=600)
+
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='orders@ipswich-retail.example')
+# Products at or below this many units are reported after each order.
+LOW_STOCK_THRESHOLD = env.int('LOW_STOCK_THRESHOLD', default=5)
+
+# Entering checkout holds the cart's stock for this many seconds (see
+# orders.reservations); `release_expired_reservations` clears old holds.
+STOCK_RESERVATION_TTL = env.int('STOCK_RESERVATION_TTL', default=600)
+
+# Sales reporting (see reports.rollup). Orders younger than the lag are left
+# for the next `rollup_sales` run so in-flight checkouts are never skipped.
+REPORTS_ROLLUP_LAG = env.int('REPORTS_ROLLUP_LAG', default=300)
+REPORTS_DEFAULT_DAYS = 30
+REPORTS_MAX_DAYS = 366
+REPORTS_METRICS_TTL = env.int('REPORTS_METRICS_TTL', default=60)
+
+# Admin list views: tables larger than this show the planner's row estimate
+# rather than an exact COUNT(*), and product search returns at most
+# ADMIN_SEARCH_LIMIT matches from the search backend.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000)
+ADMIN_SEARCH_LIMIT = env.int('ADMIN_SEARCH_LIMIT', default=500)
+
+# Product images (see products.images): downloaded once by
+# `manage.py ingest_product_images` and resized to these widths.
+MEDIA_ROOT = env('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+PRODUCT_IMAGE_ROOT = env('PRODUCT_IMAGE_ROOT', default=os.path.join(MEDIA_ROOT, 'products'))
+PRODUCT_IMAGE_WIDTHS = (160, 320, 640, 960)
+# Width used for the plain src of browsers without srcset support.
+PRODUCT_IMAGE_DEFAULT_WIDTH = 640
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_IMAGE_MAX_BYTES = env.int('PRODUCT_IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+PRODUCT_IMAGE_FETCH_TIMEOUT = env.float('PRODUCT_IMAGE_FETCH_TIMEOUT', default=10)
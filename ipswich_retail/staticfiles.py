@@ -0,0 +1,186 @@
+"""Static asset build and serving.
+
+Build (``collectstatic``):
+
+* :class:`BundleFinder` concatenates the files listed in
+  ``settings.STATIC_BUNDLES`` into one file per bundle, minifying CSS, so a
+  page needs one stylesheet and one script of our own.
+* :class:`StaticFilesStorage` then fingerprints every file and writes gzip
+  and Brotli variants next to it (WhiteNoise's compressed manifest storage).
+  Missing files or references fail the build.
+
+Serving: :class:`WhiteNoiseMiddleware` answers hashed URLs with
+``Cache-Control: max-age=315360000, public, immutable`` and picks the
+``.br``/``.gz`` variant the client accepts. Under WSGI the open file is
+handed to the server's ``wsgi.file_wrapper`` (sendfile in gunicorn); under
+ASGI, which has no equivalent in uvicorn, it is streamed in large blocks
+read off the event loop.
+"""
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error
+from django.core.files.storage import FileSystemStorage
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+_CSS_STRING = re.compile(r'"(?:\\.|[^"\\])*"' + r"|'(?:\\.|[^'\\])*'")
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*|:\s+')
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace, leaving strings untouched."""
+    strings = []
+
+    def stash(match):
+        strings.append(match.group(0))
+        return f'"{len(strings) - 1}"'
+
+    css = _CSS_STRING.sub(stash, css)
+    css = _CSS_COMMENT.sub('', css)
+    css = ' '.join(css.split())
+    css = _CSS_PUNCTUATION.sub(lambda m: m.group(1) or ':', css).replace(';}', '}')
+    return re.sub(r'"(\d+)"', lambda m: strings[int(m.group(1))], css).strip()
+
+
+class BundleFinder(finders.BaseFinder):
+    """Serves and collects the bundles named in ``settings.STATIC_BUNDLES``.
+
+    Each bundle is built from its source files (found through the other
+    finders) into ``STATIC_BUNDLE_ROOT``, and rebuilt whenever a source is
+    newer than the last build.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bundles = settings.STATIC_BUNDLES
+        self.storage = FileSystemStorage(location=settings.STATIC_BUNDLE_ROOT)
+
+    def check(self, **kwargs):
+        errors = []
+        for bundle, sources in self.bundles.items():
+            for source in sources:
+                if not self._source_path(source):
+                    errors.append(Error(
+                        f"Static bundle {bundle!r} lists {source!r}, which no finder can find.",
+                        id='ipswich_retail.E001'))
+        return errors
+
+    def _source_path(self, source):
+        for finder in finders.get_finders():
+            if not isinstance(finder, BundleFinder):
+                path = finder.find(source)
+                if path:
+                    return path
+        return None
+
+    def build(self, bundle):
+        """Write ``bundle`` if it is missing or stale; return its path."""
+        target = self.storage.path(bundle)
+        sources = [self._source_path(source) for source in self.bundles[bundle]]
+        missing = [name for name, path in zip(self.bundles[bundle], sources) if not path]
+        if missing:
+            raise FileNotFoundError(f"Static bundle {bundle!r} is missing {', '.join(missing)}")
+        built = os.path.getmtime(target) if os.path.exists(target) else None
+        if built is not None and all(os.path.getmtime(path) <= built for path in sources):
+            return target
+
+        contents = []
+        for path in sources:
+            with open(path, encoding='utf-8') as fh:
+                contents.append(fh.read())
+        if bundle.endswith('.css'):
+            output = '\n'.join(minify_css(text) for text in contents) + '\n'
+        else:
+            # Scripts are concatenated only; ';' guards against a file
+            # ending without one.
+            output = ';\n'.join(text.rstrip().rstrip(';') for text in contents) + ';\n'
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f'{target}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(output)
+        os.replace(tmp, target)
+        return target
+
+    def find(self, path, all=False):
+        if path not in self.bundles:
+            return []
+        target = self.build(path)
+        return [target] if all else target
+
+    def list(self, ignore_patterns):
+        for bundle in self.bundles:
+            self.build(bundle)
+            yield bundle, self.storage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Hashed, precompressed files; plain names until ``collectstatic`` has run.
+
+    Without a manifest (development, tests) ``{% static %}`` returns the
+    unhashed URL instead of raising, and the finders serve the file. Once a
+    manifest exists every name must be in it.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise that can sit in an async middleware chain.
+
+    Stock WhiteNoise is sync-only, and one sync middleware makes Django run
+    the whole chain beneath it through a thread, so async views would still
+    hold a thread each. Here only actual static hits touch a thread.
+    """
+    sync_capable = True
+    async_capable = True
+    # Bytes read per thread hop when streaming a file under ASGI.
+    async_block_size = 256 * 1024
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            response = await sync_to_async(self.serve)(static_file, request)
+            stream_file_async(response, self.async_block_size)
+            return response
+        return await self.get_response(request)
+
+
+async def _read_async(file, block_size):
+    read = sync_to_async(file.read)
+    while True:
+        chunk = await read(block_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def stream_file_async(response, block_size=WhiteNoiseMiddleware.async_block_size):
+    """Make a ``FileResponse`` stream its file in blocks under ASGI.
+
+    Django would otherwise read a sync file iterator into memory in one go
+    before sending it. Responses without an open file are left alone.
+    """
+    if getattr(response, 'file_to_stream', None) is not None:
+        response.streaming_content = _read_async(response.file_to_stream, block_size)
+    return response
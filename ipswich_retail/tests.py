@@ -0,0 +1,301 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import ResolverMatch, reverse
+from products.models import Product
+
+from orders.models import Order
+
+from .db_router import PrimaryPinningMiddleware, ReplicaRouter, use_primary
+from .instrumentation import (
+    QueryInstrumentationMiddleware, fingerprint, view_duplicate_queries, view_queries)
+from .pagination import EstimatedCountPaginator, estimated_count
+from .staticfiles import BundleFinder, WhiteNoiseMiddleware, minify_css
+
+
+def sample_value(histogram, view, suffix):
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith(suffix) and sample.labels.get('view') == view:
+                return sample.value
+    return 0
+
+
+def sample_count(histogram, view):
+    return sample_value(histogram, view, '_count')
+
+
+class FingerprintTest(TestCase):
+    def test_values_and_in_lists_are_normalised(self):
+        a = fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21')
+        b = fingerprint('SELECT *  FROM t WHERE id IN (%s) AND name = \'it\'\'s\' LIMIT 5')
+        self.assertEqual(a, b)
+        self.assertEqual(a, 'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+
+
+class QueryInstrumentationMiddlewareTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(title="Rose Serenity", price=Decimal("75.00"))
+
+    def test_queries_are_recorded_per_url_name(self):
+        before = sample_count(view_queries, 'products:detail')
+        self.client.get(reverse('products:detail', args=['some-missing-slug']))
+        self.assertEqual(sample_count(view_queries, 'products:detail'), before + 1)
+
+    def test_slow_requests_are_logged_as_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'slow.jsonl')
+            with override_settings(SLOW_REQUEST_LOG=path, SLOW_REQUEST_THRESHOLD_MS=0,
+                                   SLOW_REQUEST_SAMPLE_RATE=1.0):
+                self.client.get(reverse('products:detail', args=['another-missing-slug']) + '?x=1')
+            with open(path) as fh:
+                records = [json.loads(line) for line in fh]
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record['view'], 'products:detail')
+        self.assertEqual(record['status'], 404)
+        self.assertEqual(record['path'], '/shop/another-missing-slug/?x=1')
+        self.assertGreaterEqual(record['queries'], 1)
+
+    def test_duplicate_queries_are_counted(self):
+        """A view that repeats the same query per row is flagged as N+1."""
+        def n_plus_one_view(request):
+            for _ in range(3):
+                Product.objects.filter(pk=self.product.pk).first()
+            return HttpResponse()
+
+        request = RequestFactory().get('/fake/')
+        request.resolver_match = ResolverMatch(n_plus_one_view, (), {}, url_name='fake')
+        counter = view_duplicate_queries.labels(view='fake')
+        before = counter._value.get()
+        QueryInstrumentationMiddleware(n_plus_one_view)(request)
+        self.assertEqual(counter._value.get() - before, 2)
+
+
+class ConditionalTemplatePageTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.product = Product.objects.create(
+            title="Amber Dusk", price=Decimal("40.00"), inventory=5)
+
+    def test_marketing_pages_send_validators_and_honour_them(self):
+        for name in ('home', 'our_story', 'contact'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertFalse(response.has_header('Last-Modified'))
+            repeat = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.content, b'')
+
+    def test_etag_changes_with_cart_contents(self):
+        """The header's cart badge is part of the page, so it is part of the ETag."""
+        before = self.client.get(reverse('home'))['ETag']
+        self.client.post(reverse('cart_add', args=[self.product.pk]))
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], before)
+
+    def test_page_shows_the_current_cart(self):
+        """A changed cart re-renders the page instead of serving a stored copy."""
+        self.client.get(reverse('home'))
+        self.client.post(reverse('cart_add', args=[self.product.pk]))
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cart_count'], 1)
+
+    def test_if_modified_since_alone_is_not_enough_for_a_304(self):
+        first = self.client.get(reverse('home'))
+        self.assertFalse(first.has_header('Last-Modified'))
+        response = self.client.get(reverse('home'), HTTP_IF_MODIFIED_SINCE='Sun, 01 Jan 2090 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_render_without_database_queries_once_warm(self):
+        self.client.get(reverse('our_story'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('our_story')).status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_catalogue_reads_go_to_replicas_and_the_rest_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica_1')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'products'))
+
+    def test_reads_can_be_pinned_to_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'replica_1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_writes_pin_the_request_and_the_next_few_seconds(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.get('/'))
+        response = middleware(factory.post('/'))
+        cookie = response.cookies[PrimaryPinningMiddleware.cookie_name]
+        middleware(factory.get('/', HTTP_COOKIE=f'{cookie.key}={cookie.value}'))
+        self.assertEqual(seen, ['replica_1', 'default', 'default'])
+        self.assertEqual(cookie['max-age'], 5)
+
+
+class AsgiStorefrontTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title="Vetiver Rain", price=Decimal("55.00"), inventory=4)
+        self.user = User.objects.create_user('asyncshopper', 'a@example.com', 'pw')
+        Order.objects.create(user=self.user, email='a@example.com')
+
+    def test_middleware_chain_is_fully_async(self):
+        """No middleware forces async views back onto a thread under ASGI."""
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_async_views_render_and_are_instrumented(self):
+        before = sample_count(view_queries, 'products:list')
+        queries_before = sample_value(view_queries, 'products:list', '_sum')
+        response = await self.async_client.get(reverse('products:list'))
+        self.assertContains(response, "Vetiver Rain")
+        self.assertEqual(sample_count(view_queries, 'products:list') - before, 1)
+        # A cold catalogue cache loads the categories, facet counts and page.
+        self.assertGreaterEqual(sample_value(view_queries, 'products:list', '_sum') - queries_before, 3)
+
+        response = await self.async_client.get(
+            reverse('products:detail', kwargs={'slug': self.product.slug}))
+        self.assertContains(response, "Vetiver Rain")
+        self.assertTrue(response.has_header('ETag'))
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('orders:list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['orders']), 1)
+
+
+@override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        for n in range(3):
+            Order.objects.create(email=f'count{n}@example.com')
+
+    def test_sqlite_has_no_estimate(self):
+        self.assertIsNone(estimated_count(Order.objects.all()))
+        self.assertEqual(EstimatedCountPaginator(Order.objects.order_by('id'), 2).count, 3)
+
+    @mock.patch('ipswich_retail.pagination.estimated_count', return_value=250000)
+    def test_large_tables_use_the_estimate(self, estimate):
+        paginator = EstimatedCountPaginator(Order.objects.order_by('-id'), 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 250000)
+        self.assertEqual(paginator.num_pages, 2500)
+
+    @mock.patch('ipswich_retail.pagination.estimated_count', return_value=500)
+    def test_small_tables_are_counted(self, estimate):
+        self.assertEqual(EstimatedCountPaginator(Order.objects.order_by('id'), 2).count, 3)
+
+
+class StaticAssetPipelineTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        overrides = override_settings(
+            STATIC_ROOT=os.path.join(self.tmp, 'collected'),
+            STATIC_BUNDLE_ROOT=os.path.join(self.tmp, 'bundles'),
+            # Leave out the admin's files to keep collectstatic quick.
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder',
+                                 'ipswich_retail.staticfiles.BundleFinder'])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_minify_css(self):
+        css = ("a :hover , b > c { content: 'x ,  y'; /* note */ margin : 0 auto ; }\n"
+               "@media (max-width: 9px) { a { b: c } }")
+        self.assertEqual(minify_css(css), "a :hover,b>c{content:'x ,  y';margin :0 auto}@media (max-width:9px){a{b:c}}")
+
+    def test_bundles_are_concatenated_and_rebuilt_when_sources_change(self):
+        source = os.path.join(self.tmp, 'src')
+        os.makedirs(os.path.join(source, 'css'))
+        for name, css in (('a.css', 'a { color: red; }'), ('b.css', 'b { color: blue; }')):
+            with open(os.path.join(source, 'css', name), 'w') as fh:
+                fh.write(css)
+        with override_settings(STATICFILES_DIRS=[source],
+                               STATIC_BUNDLES={'css/all.css': ['css/a.css', 'css/b.css']}):
+            finder = BundleFinder()
+            self.assertEqual(finder.check(), [])
+            with open(finder.find('css/all.css')) as fh:
+                self.assertEqual(fh.read(), 'a{color:red}\nb{color:blue}\n')
+
+            later = os.path.getmtime(finder.find('css/all.css')) + 10
+            with open(os.path.join(source, 'css', 'b.css'), 'w') as fh:
+                fh.write('b { color: green }')
+            os.utime(os.path.join(source, 'css', 'b.css'), (later, later))
+            with open(finder.find('css/all.css')) as fh:
+                self.assertIn('b{color:green}', fh.read())
+            self.assertEqual(finder.find('css/a.css'), [])
+
+        with override_settings(STATIC_BUNDLES={'css/all.css': ['css/missing.css']}):
+            self.assertEqual([e.id for e in BundleFinder().check()], ['ipswich_retail.E001'])
+
+    def test_uncollected_assets_use_plain_urls(self):
+        self.assertEqual(staticfiles_storage.url('css/site.bundle.css'), '/static/css/site.bundle.css')
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return staticfiles_storage.url('css/site.bundle.css')
+
+    def test_collected_bundles_are_hashed_precompressed_and_immutable(self):
+        url = self.collect()
+        self.assertRegex(url, r'^/static/css/site\.bundle\.[0-9a-f]{12}\.css$')
+        path = os.path.join(settings.STATIC_ROOT, url[len('/static/'):])
+        for suffix in ('.gz', '.br'):
+            self.assertTrue(os.path.exists(path + suffix), suffix)
+
+        middleware = WhiteNoiseMiddleware(lambda request: HttpResponse())
+        response = middleware(RequestFactory().get(url, HTTP_ACCEPT_ENCODING='gzip, br'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+        plain = middleware(RequestFactory().get('/static/css/site.bundle.css'))
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        plain.close()
+
+    async def test_async_serving_streams_the_file(self):
+        url = await sync_to_async(self.collect)()
+
+        async def view(request):
+            return HttpResponse()
+
+        middleware = WhiteNoiseMiddleware(view)
+        response = await middleware(RequestFactory().get(url))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response])
+        with open(os.path.join(settings.STATIC_ROOT, url[len('/static/'):]), 'rb') as fh:
+            self.assertEqual(body, fh.read())
+        response.close()
@@ -5,13 +5,20 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('cart/', views.cart, name='cart'),
+    path('cart/state/', views.cart_state, name='cart_state'),
+    path('cart/add/<int:product_id>/', views.cart_add, name='cart_add'),
+    path('cart/update/<int:product_id>/', views.cart_update, name='cart_update'),
+    path('cart/remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/complete/<int:order_id>/', views.checkout_complete, name='checkout_complete'),
     path('orders/', include('orders.urls', namespace='orders')),
     path('login/', views.login_view, name='login'),
     path('create-account/', views.create_account, name='create_account'),
     path('contact/', views.contact, name='contact'),
     path('shop/', include('products.urls', namespace='products')),
     path('our-story/', views.our_story, name='our_story'),
+    path('reports/', include('reports.urls', namespace='reports')),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('admin/', admin.site.urls),
     path('', include('django_prometheus.urls')),
 ]
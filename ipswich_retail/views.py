@@ -1,16 +1,121 @@
-from django.shortcuts import render
-
-
+from django.contrib import messages
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from orders.cart import Cart
+from orders.models import Order
+from orders.reservations import holder_for
+from orders.services import CheckoutError, place_order, reserve_stock
+from products.models import Product
+from .conditional import conditional_template_page
+
+
+@conditional_template_page('home.html')
 def home(request):
     return render(request, 'home.html')
 
 
+class BadQuantity(ValueError):
+    pass
+
+
+def _quantity(request, default=1):
+    """``quantity`` from the form; a missing one is ``default``, a malformed one an error."""
+    value = request.POST.get('quantity', '').strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadQuantity("Quantity must be a whole number.")
+
+
+def _redirect_back(request, fallback='cart'):
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(
+            next_url, allowed_hosts={request.get_host()},
+            require_https=request.is_secure()):
+        return redirect(next_url)
+    return redirect(fallback)
+
+
 def cart(request):
-    return render(request, 'cart.html')
+    return render(request, 'cart.html', {'cart': Cart(request)})
+
+
+@never_cache
+@require_GET
+def cart_state(request):
+    """The visitor's cart badge and CSRF token, for pages shared through caches."""
+    return JsonResponse({'count': len(Cart(request)), 'csrf_token': get_token(request)})
+
+
+@require_POST
+def cart_add(request, product_id):
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Http404("No such product.")
+    try:
+        quantity = _quantity(request)
+    except BadQuantity as exc:
+        return HttpResponseBadRequest(str(exc))
+    Cart(request).add(product_id, max(1, quantity))
+    return _redirect_back(request)
+
+
+@require_POST
+def cart_update(request, product_id):
+    try:
+        quantity = _quantity(request, default=None)
+    except BadQuantity as exc:
+        return HttpResponseBadRequest(str(exc))
+    if quantity is None:
+        return HttpResponseBadRequest("Quantity is required.")
+    Cart(request).set(product_id, quantity)
+    return _redirect_back(request)
+
+
+@require_POST
+def cart_remove(request, product_id):
+    Cart(request).remove(product_id)
+    return _redirect_back(request)
 
 
+@require_http_methods(["GET", "POST"])
 def checkout(request):
-    return render(request, 'checkout.html')
+    basket = Cart(request)
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return redirect('login')
+        if not basket:
+            return redirect('cart')
+        email = request.POST.get('email') or request.user.email
+        try:
+            order = place_order(request.user, email, basket.items(), holder=holder_for(request))
+        except CheckoutError as exc:
+            messages.error(request, str(exc))
+            return render(request, 'checkout.html', {'cart': basket}, status=409)
+        basket.clear()
+        # Redirect so refreshing the confirmation doesn't resubmit the order.
+        return redirect('checkout_complete', order_id=order.pk)
+
+    # Entering checkout holds the basket's stock while the shopper pays.
+    reserved_until = None
+    if basket:
+        try:
+            reserved_until = reserve_stock(holder_for(request), basket.items())
+        except CheckoutError as exc:
+            messages.error(request, str(exc))
+    return render(request, 'checkout.html', {'cart': basket, 'reserved_until': reserved_until})
+
+
+def checkout_complete(request, order_id):
+    if not request.user.is_authenticated:
+        return redirect('login')
+    order = get_object_or_404(Order, pk=order_id, user=request.user)
+    return render(request, 'orders/order_success.html', {'order': order})
 
 
 def orders(request):
@@ -25,9 +130,11 @@ def create_account(request):
     return render(request, 'create_account.html')
 
 
+@conditional_template_page('contact.html')
 def contact(request):
     return render(request, 'contact.html')
 
 
+@conditional_template_page('our_story.html')
 def our_story(request):
     return render(request, 'our_story.html')
@@ -0,0 +1,31 @@
+"""Where queued jobs go once their transaction commits (``JOBS_BACKEND``)."""
+import logging
+
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseBackend:
+    """Store jobs as :class:`~jobs.models.Job` rows for ``run_jobs`` workers."""
+
+    def enqueue(self, jobs):
+        now = timezone.now()
+        Job.objects.bulk_create([
+            Job(name=task.name, kwargs=kwargs, max_attempts=task.max_attempts, run_at=now)
+            for task, kwargs in jobs
+        ])
+
+
+class ImmediateBackend:
+    """Run jobs in-process straight after commit, with no retries.
+
+    A stand-in for tests and local development; exceptions propagate so
+    failures are visible.
+    """
+
+    def enqueue(self, jobs):
+        for task, kwargs in jobs:
+            logger.debug("Running %s immediately", task.name)
+            task(**kwargs)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from jobs import worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (order emails, stock checks, analytics) with retries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no jobs are due instead of polling forever.")
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit after running this many jobs.")
+
+    def handle(self, *args, **options):
+        succeeded, failed = worker.work(
+            batch_size=options['batch_size'], once=options['once'],
+            poll_interval=options['poll_interval'], max_jobs=options['max_jobs'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Ran {succeeded + failed} job(s): {failed} failed"))
@@ -0,0 +1,79 @@
+"""A small database-backed job queue.
+
+Work that doesn't have to happen before the response (emails, stock
+checks, analytics) is declared as a task and queued instead of run inline::
+
+    @task(max_attempts=5)
+    def send_order_confirmation(order_id):
+        ...
+
+    enqueue(send_order_confirmation, order_id=order.pk)
+
+Jobs are handed to the backend named by ``JOBS_BACKEND`` only once the
+surrounding transaction commits (``transaction.on_commit``), so a rolled
+back checkout never sends an email, and the request never waits on SMTP.
+``manage.py run_jobs`` executes queued jobs with retries and backoff.
+Task arguments must be JSON-serialisable keyword arguments.
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+_registry = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+class Task:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Register ``func`` as a task; usable bare or with arguments."""
+    def register(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        _registry[task_name] = Task(
+            func, task_name, max_attempts or settings.JOBS_MAX_ATTEMPTS)
+        return _registry[task_name]
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTask(name)
+
+
+def get_backend():
+    return import_string(settings.JOBS_BACKEND)()
+
+
+def enqueue(task_or_name, **kwargs):
+    """Queue one call of a task for after the current transaction commits."""
+    enqueue_many([(task_or_name, kwargs)])
+
+
+def enqueue_many(calls):
+    """Queue several ``(task, kwargs)`` calls at once (one INSERT for the database backend)."""
+    jobs = []
+    for task_or_name, kwargs in calls:
+        found = get_task(getattr(task_or_name, 'name', task_or_name))
+        # Fail in the caller, not later in the worker.
+        json.dumps(kwargs)
+        jobs.append((found, kwargs))
+    backend = get_backend()
+    transaction.on_commit(lambda: backend.enqueue(jobs))
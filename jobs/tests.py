@@ -0,0 +1,145 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from orders.services import place_order
+from orders.tasks import send_order_confirmation
+from products.models import Product
+
+from . import worker
+from .models import Job
+from .queue import UnknownTask, enqueue, task
+
+calls = []
+
+
+@task(name='jobs.tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+class QueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_are_queued_only_when_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, value=1)
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(list(Job.objects.values_list('name', 'kwargs')),
+                         [('jobs.tests.record', {'value': 1})])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    enqueue(record, value=2)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_bad_calls_fail_at_enqueue_time(self):
+        with self.assertRaises(UnknownTask):
+            enqueue('jobs.tests.missing')
+        with self.assertRaises(TypeError):
+            enqueue(record, value=object())
+
+    @override_settings(JOBS_BACKEND='jobs.backends.ImmediateBackend')
+    def test_immediate_backend_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, value='now')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+
+class WorkerTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def job(self, name, **kwargs):
+        return Job.objects.create(name=name, kwargs=kwargs, max_attempts=2, run_at=timezone.now())
+
+    def test_runs_due_jobs(self):
+        done = self.job('jobs.tests.record', value='a')
+        self.assertEqual(worker.work(once=True), (1, 0))
+        done.refresh_from_db()
+        self.assertEqual((done.status, done.attempts), (Job.DONE, 1))
+        self.assertEqual(calls, ['a'])
+
+    @override_settings(JOBS_RETRY_BACKOFF=60)
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = self.job('jobs.tests.explode')
+        self.assertEqual(worker.work(once=True), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn("boom", job.last_error)
+
+        # Not due yet, so nothing runs.
+        self.assertEqual(worker.work(once=True), (0, 0))
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        worker.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_unknown_tasks_fail_without_retry(self):
+        job = self.job('jobs.tests.gone')
+        worker.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+
+    def test_jobs_abandoned_by_a_dead_worker_are_reclaimed(self):
+        job = self.job('jobs.tests.record', value='again')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([j.pk for j in worker.claim(10)], [job.pk])
+
+    def test_command(self):
+        self.job('jobs.tests.record', value='cmd')
+        out = io.StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn("Ran 1 job(s): 0 failed", out.getvalue())
+
+
+class OrderJobsTest(TestCase):
+    def test_checkout_queues_confirmation_stock_check_and_analytics(self):
+        user = User.objects.create_user('jobsbuyer', 'buyer@example.com', 'pw')
+        product = Product.objects.create(title="Neroli", price=Decimal("30.00"), inventory=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(user, 'buyer@example.com', [{'product_id': product.pk, 'quantity': 2}])
+        self.assertEqual(sorted(Job.objects.values_list('name', flat=True)), [
+            'orders.tasks.check_stock_levels',
+            'orders.tasks.record_order_placed',
+            'orders.tasks.send_order_confirmation',
+        ])
+        self.assertEqual(mail.outbox, [])
+
+        with self.assertLogs('orders.tasks', 'WARNING') as stock, \
+                self.assertLogs('ipswich.analytics', 'INFO') as events:
+            self.assertEqual(worker.work(once=True), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+        self.assertIn("2 x Neroli", mail.outbox[0].body)
+        self.assertIn("Total: £60.00", mail.outbox[0].body)
+        self.assertIn("Neroli", stock.output[0])
+        self.assertIn(f'"order_id": {order.pk}', events.output[0])
+
+    def test_confirmation_email_is_not_html_escaped(self):
+        product = Product.objects.create(title="Rose & Oud", price=Decimal("30.00"), inventory=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(None, 'buyer@example.com', [{'product_id': product.pk, 'quantity': 1}])
+        send_order_confirmation(order_id=order.pk)
+        self.assertIn("1 x Rose & Oud", mail.outbox[0].body)
+        self.assertIn("We'll email you", mail.outbox[0].body)
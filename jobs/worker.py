@@ -0,0 +1,87 @@
+"""Claiming and running queued jobs; driven by ``manage.py run_jobs``."""
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from .queue import UnknownTask, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def claim(limit):
+    """Mark up to ``limit`` due jobs as running and return them.
+
+    Claims are conditional UPDATEs, so several workers can poll the same
+    table without running a job twice. Jobs left running longer than
+    ``JOBS_LOCK_TIMEOUT`` (their worker died) are put back in the queue.
+    """
+    now = timezone.now()
+    Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT),
+    ).update(status=Job.PENDING, locked_at=None)
+
+    due = (Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+           .order_by('run_at', 'id').values_list('pk', flat=True)[:limit])
+    claimed = [
+        pk for pk in due
+        if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: base, 2x base, 4x base, ..."""
+    return timedelta(seconds=settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True on success."""
+    try:
+        get_task(job.name)(**job.kwargs)
+    except Exception as exc:
+        job.last_error = traceback.format_exc()
+        if isinstance(exc, UnknownTask) or job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s #%s failed permanently after %d attempt(s)", job.name, job.pk, job.attempts)
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s #%s failed (attempt %d), retrying at %s",
+                           job.name, job.pk, job.attempts, job.run_at)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_at', 'locked_at', 'last_error', 'finished_at'])
+    return job.status == Job.DONE
+
+
+def work(batch_size=10, once=False, poll_interval=1.0, max_jobs=None):
+    """Run jobs until the queue is empty (``once``), ``max_jobs`` ran, or forever.
+
+    Returns ``(succeeded, failed)`` counts, where failed includes attempts
+    that will be retried.
+    """
+    succeeded = failed = 0
+    while True:
+        limit = batch_size if max_jobs is None else min(batch_size, max_jobs - succeeded - failed)
+        jobs = claim(limit) if limit > 0 else []
+        for job in jobs:
+            if run_job(job):
+                succeeded += 1
+            else:
+                failed += 1
+        if max_jobs is not None and succeeded + failed >= max_jobs:
+            return succeeded, failed
+        if not jobs:
+            if once:
+                return succeeded, failed
+            time.sleep(poll_interval)
@@ -0,0 +1,84 @@
+from django.contrib import admin
+from ipswich_retail.pagination import EstimatedCountPaginator
+from .models import Order, OrderItem, StockReservation
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    fields = ('product', 'quantity', 'price')
+    # Placed orders are a record of what was sold; read-only also spares
+    # rendering a <select> of every product for each line.
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ExactSearchMixin:
+    """Search by exact id or e-mail address rather than ``icontains``."""
+    search_id_field = 'pk'
+    search_email_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(**{self.search_id_field: int(search_term)}), False
+        if self.search_email_field:
+            return queryset.filter(**{self.search_email_field: search_term}), False
+        return queryset.none(), False
+
+
+@admin.register(Order)
+class OrderAdmin(ExactSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'email', 'user', 'created_at', 'item_count', 'total', 'shipped')
+    list_select_related = ('user',)
+    list_filter = ('shipped',)
+    search_fields = ('id', 'email')
+    search_help_text = "Order number or exact e-mail address."
+    search_email_field = 'email'
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'total', 'item_count')
+    inlines = [OrderItemInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['mark_shipped', 'mark_unshipped']
+
+    @admin.action(description="Mark selected orders as shipped")
+    def mark_shipped(self, request, queryset):
+        # A single UPDATE, however many orders are selected.
+        updated = queryset.filter(shipped=False).update(shipped=True)
+        self.message_user(request, f"Marked {updated} order(s) as shipped.")
+
+    @admin.action(description="Mark selected orders as not shipped")
+    def mark_unshipped(self, request, queryset):
+        updated = queryset.filter(shipped=True).update(shipped=False)
+        self.message_user(request, f"Marked {updated} order(s) as not shipped.")
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(ExactSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order', 'product')
+    search_fields = ('order__id',)
+    search_help_text = "Order number."
+    search_id_field = 'order_id'
+    raw_id_fields = ('order', 'product')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'quantity', 'holder', 'expires_at')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    readonly_fields = ('holder', 'created_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,105 @@
+"""Session-backed shopping cart.
+
+The session holds only ``{"<product id>": quantity}`` so it stays small
+whatever the product data looks like. Titles, prices and images are
+looked up for all lines at once, through the catalogue cache, and the
+result is memoised on the ``Cart`` for the rest of the request.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from products import cache as catalogue_cache
+from products.models import Product
+
+CART_SESSION_KEY = 'cart'
+MAX_LINE_QUANTITY = 99
+
+CART_PRODUCT_FIELDS = ('id', 'title', 'slug', 'price', 'image', 'image_digest', 'image_source', 'image_width')
+
+
+@dataclass
+class CartLine:
+    product: Product
+    quantity: int
+
+    @property
+    def total(self):
+        return self.product.price * self.quantity
+
+
+def _load_products(product_ids):
+    return Product.objects.only(*CART_PRODUCT_FIELDS).in_bulk(product_ids)
+
+
+class Cart:
+    def __init__(self, request):
+        self.session = request.session
+        self._lines = None
+        self._subtotal = None
+
+    @property
+    def _data(self):
+        return self.session.get(CART_SESSION_KEY, {})
+
+    def _save(self, data):
+        self.session[CART_SESSION_KEY] = data
+        self._lines = self._subtotal = None
+
+    def __len__(self):
+        """Total number of units; answered from the session alone."""
+        return sum(self._data.values())
+
+    def __bool__(self):
+        return bool(self._data)
+
+    def quantity(self, product_id):
+        return self._data.get(str(product_id), 0)
+
+    def add(self, product_id, quantity=1):
+        self.set(product_id, self.quantity(product_id) + quantity)
+
+    def set(self, product_id, quantity):
+        """Set a line's quantity; zero or less removes it."""
+        data = dict(self._data)
+        quantity = min(int(quantity), MAX_LINE_QUANTITY)
+        if quantity > 0:
+            data[str(product_id)] = quantity
+        else:
+            data.pop(str(product_id), None)
+        self._save(data)
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.session.pop(CART_SESSION_KEY, None)
+        self._lines = self._subtotal = None
+
+    def lines(self):
+        """Cart lines with their products, fetched in a single lookup."""
+        if self._lines is None:
+            data = self._data
+            ids = tuple(sorted(int(pk) for pk in data))
+            products = {}
+            if ids:
+                products = catalogue_cache.get_or_load(
+                    'cart', ids, lambda: _load_products(ids))
+            # Products deleted since they were added simply drop out.
+            self._lines = [
+                CartLine(products[pk], data[str(pk)]) for pk in ids if pk in products
+            ]
+        return self._lines
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    @property
+    def subtotal(self):
+        if self._subtotal is None:
+            self._subtotal = sum((line.total for line in self.lines()), Decimal('0.00'))
+        return self._subtotal
+
+    def items(self):
+        """The cart in the shape :func:`orders.services.place_order` expects."""
+        return [{'product_id': line.product.pk, 'quantity': line.quantity}
+                for line in self.lines()]
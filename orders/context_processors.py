@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import Cart
+
+
+def cart(request):
+    """Expose the cart's unit count for the header badge (no database access).
+
+    Lazy, so pages that leave the badge to ``cart_state`` never read the
+    session and are not marked ``Vary: Cookie``.
+    """
+    return {'cart_count': SimpleLazyObject(lambda: len(Cart(request)))}
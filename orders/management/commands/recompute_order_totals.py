@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders.services import recompute_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored Order.total and item_count from order items, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        def progress(checked, fixed):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {checked} checked, {fixed} fixed")
+
+        checked, fixed = recompute_order_totals(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Checked {checked} orders, corrected {fixed}"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired checkout stock holds, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help="Keep running, sweeping every SECONDS.")
+
+    def handle(self, *args, **options):
+        def progress(count):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {count} released")
+
+        while True:
+            count = release_expired(options['batch_size'], progress)
+            self.stdout.write(self.style.SUCCESS(f"✅ Released {count} expired reservation(s)"))
+            if options['every'] is None:
+                break
+            time.sleep(options['every'])
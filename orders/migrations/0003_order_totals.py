@@ -0,0 +1,52 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:47
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    # Same as orders.services.recompute_order_totals, against the
+    # historical models.
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    last_pk = 0
+    while True:
+        orders = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').only('id')[:1000])
+        if not orders:
+            break
+        sums = {
+            row['order']: row
+            for row in OrderItem.objects
+            .filter(order__gt=last_pk, order__lte=orders[-1].pk)
+            .values('order')
+            .annotate(total=Sum(F('quantity') * F('price'), output_field=money),
+                      count=Sum('quantity'))
+        }
+        for order in orders:
+            row = sums.get(order.pk)
+            if row:
+                order.total, order.item_count = row['total'], row['count']
+        Order.objects.bulk_update([o for o in orders if o.pk in sums], ['total', 'item_count'])
+        last_pk = orders[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
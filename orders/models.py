@@ -6,14 +6,32 @@ User = get_user_model()
 
 
 class Order(models.Model):
+    # Not indexed on its own: order_user_created_idx leads with user.
     user = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         null=True,
-        blank=True)
+        blank=True,
+        db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     email = models.EmailField()
     shipped = models.BooleanField(default=False)
+    # Kept in step with the order's items by orders.signals (and set directly
+    # by place_order, whose bulk insert sends no signals). Recompute with
+    # ``manage.py recompute_order_totals`` after bulk edits.
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Order history: WHERE user_id = ? ORDER BY created_at DESC, id DESC.
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Fulfilment queue; only the (few) unshipped rows are indexed.
+            models.Index(fields=['created_at', 'id'], name='order_unshipped_idx',
+                         condition=models.Q(shipped=False)),
+            # Looking an order up by customer e-mail in the admin.
+            models.Index(fields=['email'], name='order_email_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.pk} - {self.email}"
@@ -57,3 +75,34 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.product}"
+
+
+class StockReservation(models.Model):
+    """Units of a product held for a shopper while they check out.
+
+    ``holder`` identifies the shopper (a token kept in their session). A
+    hold counts against availability until ``expires_at``; expired rows are
+    ignored by every query and deleted in batches by
+    ``release_expired_reservations``.
+    """
+    holder = models.CharField(max_length=40)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations',
+                                db_index=False)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One hold per shopper and product; re-entering checkout replaces it.
+            models.UniqueConstraint(fields=['holder', 'product'], name='reservation_holder_product_uniq'),
+        ]
+        indexes = [
+            # Availability: WHERE product_id IN (..) AND expires_at > now.
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+            # Sweeper: WHERE expires_at <= now ORDER BY expires_at.
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.holder}"
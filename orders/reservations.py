@@ -0,0 +1,157 @@
+"""Time-limited stock holds (see :class:`orders.models.StockReservation`).
+
+A shopper entering checkout gets a hold on each line of their cart for
+``STOCK_RESERVATION_TTL`` seconds, so a unit they are paying for cannot be
+sold to someone else in the meantime. What may still be sold is::
+
+    available = inventory - active holds of other shoppers
+
+Expired holds simply stop counting; nothing has to run for stock to come
+back. ``manage.py release_expired_reservations`` deletes them in batches
+to keep the table small. Holds are placed and consumed by
+:func:`orders.services.reserve_stock` and :func:`orders.services.place_order`.
+
+What depends on holds is cached under :func:`holds_version`, which changes
+whenever a hold is placed or released, an order is placed, and when the
+earliest active hold expires.
+"""
+import math
+import secrets
+import time
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from products.cache import get_cache
+from products.models import Product
+from .models import StockReservation
+
+HOLDER_SESSION_KEY = 'reservation_holder'
+HOLDS_VERSION_KEY = 'holds:version'
+
+
+def holder_for(request):
+    """The reservation holder for ``request``, a random token kept in its session.
+
+    Not the session key itself, which changes when the shopper logs in
+    between entering checkout and paying.
+    """
+    holder = request.session.get(HOLDER_SESSION_KEY)
+    if holder is None:
+        holder = request.session[HOLDER_SESSION_KEY] = secrets.token_hex(16)
+    return holder
+
+
+def active(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, holder=None, now=None):
+    """Units held on ``product_ids`` by active reservations, in one grouped query.
+
+    Returns ``({product id: units held by others}, {product id: units held
+    by holder})``, so a shopper's own hold never stands in the way of their
+    checkout.
+    """
+    rows = (active(now).filter(product__in=list(product_ids)).values('product')
+            .annotate(others=Sum('quantity', filter=~Q(holder=holder or '')),
+                      own=Sum('quantity', filter=Q(holder=holder or ''))))
+    others, own = {}, {}
+    for row in rows:
+        others[row['product']] = row['others'] or 0
+        own[row['product']] = row['own'] or 0
+    return others, own
+
+
+def available_units(holder=None, now=None):
+    """Expression for a product's units that can still be sold.
+
+    For ``annotate()``/``alias()`` on a Product queryset, e.g. to filter on
+    availability; the active holds are summed in a correlated subquery.
+    """
+    holds = active(now).filter(product=OuterRef('pk'))
+    if holder:
+        holds = holds.exclude(holder=holder)
+    held = holds.values('product').annotate(units=Sum('quantity')).values('units')
+    return Greatest(F('inventory') - Coalesce(Subquery(held), 0), 0, output_field=IntegerField())
+
+
+def available_stock(product_ids, holder=None):
+    """``{product id: units that can still be sold}`` for ``product_ids``."""
+    return dict(Product.objects.filter(pk__in=list(product_ids))
+                .annotate(available=available_units(holder)).values_list('id', 'available'))
+
+
+def _version_timeout(first_expiry, now):
+    # The version must lapse when the earliest hold does, since expiry
+    # itself writes nothing.
+    if first_expiry is None:
+        return None
+    return max(1, math.ceil((first_expiry - now).total_seconds()))
+
+
+def holds_version():
+    """Version of the active holds, initialising it if needed.
+
+    The key times out when the earliest active hold expires, so the next
+    call starts a new version; costs one query only then.
+    """
+    cache = get_cache()
+    version = cache.get(HOLDS_VERSION_KEY)
+    if version is None:
+        now = timezone.now()
+        first = active(now).aggregate(first=Min('expires_at'))['first']
+        version = time.time_ns() // 1000
+        cache.add(HOLDS_VERSION_KEY, version, timeout=_version_timeout(first, now))
+        version = cache.get(HOLDS_VERSION_KEY, version)
+    return version
+
+
+async def aholds_version():
+    """Async :func:`holds_version`."""
+    cache = get_cache()
+    version = await cache.aget(HOLDS_VERSION_KEY)
+    if version is None:
+        now = timezone.now()
+        first = (await active(now).aaggregate(first=Min('expires_at')))['first']
+        version = time.time_ns() // 1000
+        await cache.aadd(HOLDS_VERSION_KEY, version, timeout=_version_timeout(first, now))
+        version = await cache.aget(HOLDS_VERSION_KEY, version)
+    return version
+
+
+def bump_holds_version():
+    """Retire everything cached under the current :func:`holds_version` once
+    the surrounding transaction commits."""
+    transaction.on_commit(lambda: get_cache().delete(HOLDS_VERSION_KEY))
+
+
+def release(holder):
+    """Drop every hold belonging to ``holder``; returns how many were removed."""
+    released = StockReservation.objects.filter(holder=holder).delete()[0]
+    if released:
+        bump_holds_version()
+    return released
+
+
+def release_expired(batch_size=1000, progress=None):
+    """Delete expired holds ``batch_size`` at a time; returns the number deleted.
+
+    Each batch is its own short transaction touching only the rows it
+    deletes, so sweeping never blocks checkouts.
+    """
+    now = timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(StockReservation.objects.filter(expires_at__lte=now)
+                       .order_by('expires_at').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Re-checked: a hold renewed since it was read is kept.
+            released += StockReservation.objects.filter(pk__in=ids, expires_at__lte=now).delete()[0]
+            bump_holds_version()
+        if progress:
+            progress(released)
+    return released
@@ -0,0 +1,216 @@
+"""Order placement.
+
+Checkout has to be correct under concurrent load (two customers buying the
+last unit must not both succeed) without serialising every request. Stock
+is therefore reserved with one conditional UPDATE per SKU::
+
+    UPDATE products_product SET inventory = inventory - %(qty)s
+    WHERE id = %(id)s AND inventory >= %(qty)s
+
+which the database applies atomically, so there is no read-modify-write
+window. If any SKU comes back with zero rows updated the surrounding
+transaction rolls back every decrement already made. SKUs are updated in
+primary-key order so concurrent checkouts always take row locks in the same
+order and cannot deadlock.
+
+Checkout also honours other shoppers' holds (see :mod:`orders.reservations`):
+the SKUs' rows are locked first, again in primary-key order, and each UPDATE
+then requires ``inventory >= qty + units held by others``. Holds are placed
+by :func:`reserve_stock` under the same row locks, so the two cannot
+interleave; only the SKUs in the cart are ever locked.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+from jobs.queue import enqueue_many
+from products.cache import bump_catalogue_version
+from products.models import Product
+from .models import Order, OrderItem, StockReservation
+from .reservations import bump_holds_version, held_quantities, release
+from .tasks import check_stock_levels, record_order_placed, send_order_confirmation
+
+
+class CheckoutError(Exception):
+    """Base class for reasons a cart cannot be turned into an order."""
+
+
+class InvalidCart(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(str(p) for p in products)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+def normalise_cart(items):
+    """Collapse ``[{'product_id': .., 'quantity': ..}, ...]`` into ``{product_id: qty}``.
+
+    Repeated SKUs are merged so each product is decremented exactly once.
+    """
+    lines = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidCart("Each item needs an integer product_id and quantity.")
+        if quantity < 1:
+            raise InvalidCart("Quantities must be at least 1.")
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines
+
+
+def _lock_products(lines):
+    """Load and row-lock the cart's products in primary-key order."""
+    products = {
+        product.pk: product
+        for product in Product.objects.select_for_update()
+        .only('id', 'title', 'price', 'inventory').filter(pk__in=list(lines)).order_by('pk')
+    }
+    unknown = sorted(set(lines) - set(products))
+    if unknown:
+        raise InvalidCart(f"Unknown product ids: {unknown}")
+    return products
+
+
+def reserve_stock(holder, items, ttl=None):
+    """Hold ``items`` for ``holder`` for ``ttl`` seconds and return the expiry.
+
+    Replaces any holds ``holder`` already had, so calling it again after
+    the cart changes (or to extend the hold) is safe. All-or-nothing: raises
+    :class:`InvalidCart` or :class:`OutOfStock` without holding anything if
+    a line cannot be held in full.
+    """
+    lines = normalise_cart(items)
+    if ttl is None:
+        ttl = settings.STOCK_RESERVATION_TTL
+    with transaction.atomic():
+        products = _lock_products(lines)
+        others, _own = held_quantities(lines, holder)
+        short = [products[pid] for pid in sorted(lines)
+                 if products[pid].inventory - others.get(pid, 0) < lines[pid]]
+        if short:
+            raise OutOfStock(short)
+
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.filter(holder=holder).exclude(product__in=list(lines)).delete()
+        StockReservation.objects.bulk_create(
+            [StockReservation(holder=holder, product_id=pid, quantity=qty, expires_at=expires_at)
+             for pid, qty in sorted(lines.items())],
+            update_conflicts=True,
+            unique_fields=['holder', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+        bump_holds_version()
+    return expires_at
+
+
+def place_order(user, email, items, holder=None):
+    """Create an order for ``items``, decrementing stock atomically.
+
+    ``items`` is an iterable of ``{'product_id', 'quantity'}`` mappings. The
+    whole checkout is a fixed handful of queries however large the cart:
+    one to lock and load prices, one for other shoppers' holds, one UPDATE
+    per distinct SKU, one INSERT for the order and one bulk INSERT for its
+    items. Raises :class:`InvalidCart` or :class:`OutOfStock`, in which case
+    nothing is written.
+
+    Units held for ``holder`` (see :func:`reserve_stock`) are available to
+    this order, and its holds are released once the order is placed.
+
+    The confirmation email, stock check and analytics event are queued as
+    background jobs once the order commits.
+    """
+    lines = normalise_cart(items)
+    with transaction.atomic():
+        products = _lock_products(lines)
+        others, own = held_quantities(lines, holder)
+
+        short, sold_out = [], False
+        for product_id in sorted(lines):
+            quantity = lines[product_id]
+            updated = Product.objects.filter(
+                pk=product_id, inventory__gte=quantity + others.get(product_id, 0),
+            ).update(inventory=F('inventory') - quantity)
+            if not updated:
+                short.append(products[product_id])
+            elif products[product_id].inventory == quantity:
+                sold_out = True
+        if short:
+            raise OutOfStock(short)
+        if sold_out:
+            # The cached "in stock" facet counts only change when a SKU sells
+            # out, and the UPDATE above sends no post_save.
+            transaction.on_commit(bump_catalogue_version)
+        # Every sale changes what is available (see holds_version).
+        bump_holds_version()
+
+        # bulk_create sends no signals, so the totals are set up front.
+        order = Order.objects.create(
+            user=user, email=email,
+            total=sum((products[pid].price * qty for pid, qty in lines.items()), Decimal('0.00')),
+            item_count=sum(lines.values()),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[product_id],
+                      quantity=quantity, price=products[product_id].price)
+            for product_id, quantity in lines.items()
+        ])
+        if any(own.values()):
+            release(holder)
+        enqueue_many([
+            (send_order_confirmation, {'order_id': order.pk}),
+            (check_stock_levels, {'product_ids': sorted(lines)}),
+            (record_order_placed, {'order_id': order.pk}),
+        ])
+    return order
+
+
+def recompute_order_totals(batch_size=1000, progress=None):
+    """Recompute every ``Order.total``/``item_count`` from its items.
+
+    Walks orders in primary-key batches, aggregating one batch's items per
+    query and writing back only the orders whose stored values are wrong.
+    Each batch's orders are locked while it is fixed so concurrent item
+    changes aren't lost. Returns ``(checked, fixed)``; ``progress`` is
+    called with both after each batch.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    checked = fixed = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update().filter(pk__gt=last_pk)
+                .order_by('pk').only('id', 'total', 'item_count')[:batch_size])
+            if not orders:
+                break
+            sums = {
+                row['order']: (row['total'], row['count'])
+                for row in OrderItem.objects
+                .filter(order__gt=last_pk, order__lte=orders[-1].pk)
+                .values('order')
+                .annotate(total=Sum(F('quantity') * F('price'), output_field=money),
+                          count=Sum('quantity'))
+            }
+            stale = []
+            for order in orders:
+                total, count = sums.get(order.pk, (Decimal('0.00'), 0))
+                if order.total != total or order.item_count != count:
+                    order.total, order.item_count = total, count
+                    stale.append(order)
+            if stale:
+                Order.objects.bulk_update(stale, ['total', 'item_count'])
+        checked += len(orders)
+        fixed += len(stale)
+        last_pk = orders[-1].pk
+        if progress:
+            progress(checked, fixed)
+    return checked, fixed
@@ -0,0 +1,46 @@
+"""Keep ``Order.total`` and ``Order.item_count`` in step with their items.
+
+Each change is applied as a delta with an F() expression in one UPDATE, so
+concurrent edits to the same order never overwrite each other and no
+aggregate over the items is ever needed. QuerySet.update()/bulk_create()
+on OrderItem send no signals; callers using them must set the totals
+themselves (see ``place_order``) or run ``recompute_order_totals``.
+"""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Order, OrderItem
+
+
+def _apply(order_id, quantity, price, sign=1):
+    if order_id is None:
+        return
+    Order.objects.filter(pk=order_id).update(
+        total=F('total') + sign * quantity * price,
+        item_count=F('item_count') + sign * quantity,
+    )
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_previous_line(sender, instance, raw=False, **kwargs):
+    # Only an update needs the old row, so loading items stays free.
+    instance._previous_line = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._previous_line = (
+            OrderItem.objects.filter(pk=instance.pk)
+            .values_list('order_id', 'quantity', 'price').first())
+
+
+@receiver(post_save, sender=OrderItem)
+def add_line_to_order(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_line', None)
+    if previous is not None:
+        _apply(*previous, sign=-1)
+    _apply(instance.order_id, instance.quantity, instance.price)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_line_from_order(sender, instance, **kwargs):
+    _apply(instance.order_id, instance.quantity, instance.price, sign=-1)
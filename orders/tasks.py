@@ -0,0 +1,57 @@
+"""Background work triggered by new orders (queued by ``place_order``)."""
+import json
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from jobs.queue import task
+from products.models import Product
+from .models import Order
+
+logger = logging.getLogger(__name__)
+analytics = logging.getLogger('ipswich.analytics')
+
+
+def _order_with_items(order_id):
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return None, []
+    return order, list(order.items.select_related('product'))
+
+
+@task(max_attempts=5)
+def send_order_confirmation(order_id):
+    order, items = _order_with_items(order_id)
+    if order is None or not order.email:
+        return
+    body = render_to_string('orders/email/confirmation.txt',
+                            {'order': order, 'items': items})
+    send_mail(f"Your Ipswich Retail order #{order.pk}", body,
+              settings.DEFAULT_FROM_EMAIL, [order.email])
+
+
+@task
+def check_stock_levels(product_ids):
+    """Report products an order has taken down to the low-stock threshold."""
+    low = (Product.objects.filter(pk__in=product_ids,
+                                  inventory__lte=settings.LOW_STOCK_THRESHOLD)
+           .values_list('id', 'title', 'inventory'))
+    for product_id, title, inventory in low:
+        logger.warning("Low stock: %s (id %s) has %s left", title, product_id, inventory)
+
+
+@task
+def record_order_placed(order_id):
+    """Emit an ``order_placed`` analytics event as one JSON log line."""
+    order, items = _order_with_items(order_id)
+    if order is None:
+        return
+    analytics.info(json.dumps({
+        'event': 'order_placed',
+        'order_id': order.pk,
+        'user_id': order.user_id,
+        'ts': order.created_at.isoformat(),
+        'items': [{'product_id': i.product_id, 'quantity': i.quantity, 'price': str(i.price)}
+                  for i in items],
+    }))
@@ -1,8 +1,19 @@
+import io
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from decimal import Decimal
-from .models import Order, OrderItem
+from .models import Order, OrderItem, StockReservation
+from .reservations import HOLDER_SESSION_KEY, available_stock, release_expired
+from .services import OutOfStock, place_order, reserve_stock
 from products.models import Category, Product
 
 User = get_user_model()
@@ -112,3 +123,373 @@ class OrderViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Test Product")
         self.assertContains(response, "99.99")
+
+
+class OrderHistoryQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='regular', password='testpass123')
+        self.products = [
+            Product.objects.create(title=f"Scent {i}", price=Decimal("10.00") + i, inventory=50)
+            for i in range(3)
+        ]
+        for _ in range(6):
+            order = Order.objects.create(user=self.user, email='regular@example.com')
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+        self.client.login(username='regular', password='testpass123')
+
+    def test_query_count_is_constant(self):
+        """Order history costs the same number of queries however many orders and items it shows."""
+        url = reverse('orders:list')
+        # user + orders + prefetched items/products (the session is cached)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'per_page': 2})
+        self.assertEqual(len(response.context['orders']), 2)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'per_page': 6})
+        self.assertEqual(len(response.context['orders']), 6)
+
+    def test_totals_are_stored_on_the_order(self):
+        """Per-order totals and item counts are read from the order row, not aggregated."""
+        response = self.client.get(reverse('orders:list'))
+        order = response.context['orders'][0]
+        self.assertEqual(order.total, Decimal("66.00"))
+        self.assertEqual(order.item_count, 6)
+        self.assertContains(response, "£66.00")
+
+    def test_pagination_is_newest_first(self):
+        url = reverse('orders:list')
+        first = self.client.get(url, {'per_page': 4})
+        second = self.client.get(url + '?' + first.context['next_query'])
+        pks = [o.pk for o in first.context['orders']] + [o.pk for o in second.context['orders']]
+        self.assertEqual(pks, sorted(Order.objects.values_list('pk', flat=True), reverse=True))
+        self.assertFalse(second.context['page'].has_next)
+
+
+class OrderTotalsTest(TestCase):
+    def setUp(self):
+        self.rose = Product.objects.create(title="Rose", price=Decimal("10.00"), inventory=20)
+        self.musk = Product.objects.create(title="Musk", price=Decimal("4.50"), inventory=20)
+        self.order = Order.objects.create(email='totals@example.com')
+
+    def assertTotals(self, order, total, count):
+        order.refresh_from_db()
+        self.assertEqual((order.total, order.item_count), (Decimal(total), count))
+
+    def test_items_created_updated_and_deleted(self):
+        item = OrderItem.objects.create(order=self.order, product=self.rose, quantity=2, price=self.rose.price)
+        self.order.products.add(self.musk, quantity=3)
+        self.assertTotals(self.order, "33.50", 5)
+
+        item.quantity = 1
+        item.price = Decimal("12.00")
+        item.save()
+        self.assertTotals(self.order, "25.50", 4)
+
+        other = Order.objects.create(email='other@example.com')
+        item.order = other
+        item.save()
+        self.assertTotals(self.order, "13.50", 3)
+        self.assertTotals(other, "12.00", 1)
+
+        item.delete()
+        OrderItem.objects.filter(order=self.order).delete()
+        self.assertTotals(self.order, "0.00", 0)
+        self.assertTotals(other, "0.00", 0)
+
+    def test_place_order_sets_totals_without_extra_queries(self):
+        order = place_order(None, 'totals@example.com', [
+            {'product_id': self.rose.pk, 'quantity': 2},
+            {'product_id': self.musk.pk, 'quantity': 1},
+        ])
+        self.assertTotals(order, "24.50", 3)
+
+    def test_recompute_command_repairs_drift_in_batches(self):
+        self.order.products.add(self.rose, quantity=2)
+        untouched = Order.objects.create(email='fine@example.com')
+        untouched.products.add(self.musk)
+        empty = Order.objects.create(email='empty@example.com')
+        # Bulk edits bypass the signals.
+        OrderItem.objects.filter(order=self.order).update(quantity=5)
+        Order.objects.filter(pk=empty.pk).update(total=Decimal("9.99"), item_count=1)
+
+        out = io.StringIO()
+        call_command('recompute_order_totals', '--batch-size', '2', stdout=out)
+        self.assertIn("Checked 3 orders, corrected 2", out.getvalue())
+        self.assertTotals(self.order, "50.00", 5)
+        self.assertTotals(untouched, "4.50", 1)
+        self.assertTotals(empty, "0.00", 0)
+
+
+class CheckoutApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='testpass123')
+        self.product = Product.objects.create(title="Rose Serenity", price=Decimal("75.00"), inventory=2)
+        self.url = reverse('orders:checkout_api')
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_requires_login(self):
+        self.assertEqual(self.post({'items': []}).status_code, 401)
+
+    def test_checkout_creates_order(self):
+        self.client.login(username='buyer', password='testpass123')
+        response = self.post({'items': [{'product_id': self.product.pk, 'quantity': 2}]})
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['total'], "150.00")
+        self.assertEqual(body['email'], 'buyer@example.com')
+        self.assertTrue(Order.objects.filter(pk=body['order_id'], user=self.user).exists())
+
+    def test_out_of_stock_is_a_conflict(self):
+        self.client.login(username='buyer', password='testpass123')
+        response = self.post({'items': [{'product_id': self.product.pk, 'quantity': 3}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['out_of_stock'], [self.product.pk])
+        self.assertFalse(Order.objects.exists())
+
+    def test_malformed_cart_is_rejected(self):
+        self.client.login(username='buyer', password='testpass123')
+        self.assertEqual(self.post({'items': []}).status_code, 400)
+        self.assertEqual(self.post({'items': [{'product_id': 'x'}]}).status_code, 400)
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_form_accepts_cart_fields(self):
+        self.client.login(username='buyer', password='testpass123')
+        response = self.client.post(reverse('orders:create'), {
+            'email': 'buyer@example.com', 'product_id': [self.product.pk], 'quantity': [1]})
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 1)
+
+
+class CartViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', email='shopper@example.com', password='testpass123')
+        self.products = [
+            Product.objects.create(title=f"Scent {i}", price=Decimal("10.00") + i, inventory=5)
+            for i in range(4)
+        ]
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse('cart_add', args=[product.pk]), {'quantity': quantity})
+
+    def test_add_update_remove(self):
+        first, second = self.products[:2]
+        self.assertRedirects(self.add(first, 2), reverse('cart'))
+        self.add(first)
+        self.add(second)
+        self.assertEqual(self.client.session['cart'], {str(first.pk): 3, str(second.pk): 1})
+
+        self.client.post(reverse('cart_update', args=[first.pk]), {'quantity': 1})
+        self.client.post(reverse('cart_remove', args=[second.pk]))
+        self.assertEqual(self.client.session['cart'], {str(first.pk): 1})
+
+        self.client.post(reverse('cart_update', args=[first.pk]), {'quantity': 0})
+        self.assertEqual(self.client.session['cart'], {})
+
+    def test_cart_page_batches_product_lookups(self):
+        """The cart renders in a constant number of queries however many lines it has."""
+        for product in self.products:
+            self.add(product, 2)
+        response = self.client.get(reverse('cart'))
+        self.assertContains(response, "Scent 3")
+        self.assertEqual(response.context['cart'].subtotal, Decimal("92.00"))
+        self.assertEqual(response.context['cart_count'], 8)
+        # Warm: session and product data both come from cache.
+        with self.assertNumQueries(0):
+            self.client.get(reverse('cart'))
+
+    def test_deleted_products_drop_out(self):
+        self.add(self.products[0])
+        self.products[0].delete()
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(list(response.context['cart']), [])
+
+    def test_checkout_places_order_and_empties_cart(self):
+        self.client.login(username='shopper', password='testpass123')
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        response = self.client.post(reverse('checkout'), {'email': 'shopper@example.com'})
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('checkout_complete', args=[order.pk]))
+        self.assertEqual(order.items.count(), 2)
+        self.assertNotIn('cart', self.client.session)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].inventory, 3)
+
+    def test_confirmation_is_only_shown_to_the_customer(self):
+        self.client.login(username='shopper', password='testpass123')
+        self.add(self.products[0])
+        response = self.client.post(reverse('checkout'), {'email': 'shopper@example.com'}, follow=True)
+        self.assertContains(response, "Order received")
+        order = Order.objects.get(user=self.user)
+        User.objects.create_user(username='nosy', password='pw')
+        self.client.login(username='nosy', password='pw')
+        self.assertEqual(self.client.get(reverse('checkout_complete', args=[order.pk])).status_code, 404)
+
+    def test_unknown_products_and_bad_quantities_are_rejected(self):
+        self.assertEqual(self.client.post(reverse('cart_add', args=[999999])).status_code, 404)
+        self.assertEqual(self.add(self.products[0], 'lots').status_code, 400)
+        self.add(self.products[0], 2)
+        response = self.client.post(reverse('cart_update', args=[self.products[0].pk]), {'quantity': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.session['cart'], {str(self.products[0].pk): 2})
+        self.assertEqual(self.client.get(reverse('cart')).context['cart_count'], 2)
+
+    def test_checkout_requires_login_and_stock(self):
+        self.add(self.products[0], 6)
+        self.assertRedirects(self.client.post(reverse('checkout')), reverse('login'))
+        self.client.login(username='shopper', password='testpass123')
+        response = self.client.post(reverse('checkout'), {'email': 'shopper@example.com'})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', email='shopper@example.com', password='testpass123')
+        self.last = Product.objects.create(title="Last Bottle", price=Decimal("40.00"), inventory=1)
+        self.plenty = Product.objects.create(title="Tea Light", price=Decimal("2.00"), inventory=10)
+
+    def test_hold_keeps_stock_for_its_holder_only(self):
+        reserve_stock('alice', [{'product_id': self.last.pk, 'quantity': 1}])
+        self.assertEqual(available_stock([self.last.pk]), {self.last.pk: 0})
+        self.assertEqual(available_stock([self.last.pk], holder='alice'), {self.last.pk: 1})
+        with self.assertRaises(OutOfStock):
+            reserve_stock('bob', [{'product_id': self.last.pk, 'quantity': 1}])
+        with self.assertRaises(OutOfStock):
+            place_order(None, "bob@example.com", [{'product_id': self.last.pk, 'quantity': 1}], holder='bob')
+
+        place_order(None, "alice@example.com", [{'product_id': self.last.pk, 'quantity': 1}], holder='alice')
+        self.last.refresh_from_db()
+        self.assertEqual(self.last.inventory, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_reserving_again_replaces_the_holders_holds(self):
+        reserve_stock('alice', [{'product_id': self.last.pk, 'quantity': 1},
+                                {'product_id': self.plenty.pk, 'quantity': 2}])
+        reserve_stock('alice', [{'product_id': self.plenty.pk, 'quantity': 5}])
+        self.assertEqual(list(StockReservation.objects.values_list('product', 'quantity')),
+                         [(self.plenty.pk, 5)])
+
+    def test_a_short_line_holds_nothing(self):
+        with self.assertRaises(OutOfStock):
+            reserve_stock('alice', [{'product_id': self.plenty.pk, 'quantity': 1},
+                                    {'product_id': self.last.pk, 'quantity': 2}])
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_stop_counting_and_are_swept(self):
+        reserve_stock('alice', [{'product_id': self.last.pk, 'quantity': 1}], ttl=60)
+        reserve_stock('bob', [{'product_id': self.plenty.pk, 'quantity': 1}], ttl=60)
+        StockReservation.objects.filter(holder='alice').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(available_stock([self.last.pk]), {self.last.pk: 1})
+
+        self.assertEqual(release_expired(batch_size=1), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('holder', flat=True)), ['bob'])
+        out = io.StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn("Released 0", out.getvalue())
+
+    def test_held_stock_shows_as_unavailable_to_other_shoppers(self):
+        url = reverse('products:detail', kwargs={'slug': self.last.slug})
+        self.assertNotContains(self.client.get(url), "Out of stock")
+
+        in_stock = self.client.get(reverse('products:list') + '?in_stock=1')
+        self.assertContains(in_stock, "Last Bottle")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock('alice', [{'product_id': self.last.pk, 'quantity': 1}], ttl=60)
+        self.assertContains(self.client.get(url), "Out of stock")
+        in_stock = self.client.get(reverse('products:list') + '?in_stock=1')
+        self.assertNotContains(in_stock, "Last Bottle")
+        self.assertEqual(in_stock.context['facets'].in_stock.count, 1)
+
+        # Expiry writes nothing; the holds version lapses with the hold.
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertNotContains(self.client.get(url), "Out of stock")
+            in_stock = self.client.get(reverse('products:list') + '?in_stock=1')
+            self.assertContains(in_stock, "Last Bottle")
+            self.assertEqual(in_stock.context['facets'].in_stock.count, 2)
+
+            # The page is shared by every visitor, so it counts the holder's own holds too.
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_stock('alice', [{'product_id': self.last.pk, 'quantity': 1}])
+            session = self.client.session
+            session[HOLDER_SESSION_KEY] = 'alice'
+            session.save()
+            self.assertContains(self.client.get(url), "Out of stock")
+
+    def test_sales_refresh_cached_availability(self):
+        url = reverse('products:detail', kwargs={'slug': self.plenty.slug})
+        self.assertNotContains(self.client.get(url), "Only")
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(None, "bob@example.com", [{'product_id': self.plenty.pk, 'quantity': 6}])
+        self.assertContains(self.client.get(url), "Only 4 left")
+
+    def test_entering_checkout_holds_the_basket(self):
+        self.client.post(reverse('cart_add', args=[self.last.pk]))
+        response = self.client.get(reverse('checkout'))
+        self.assertContains(response, "reserved until")
+        self.assertEqual(StockReservation.objects.get().product, self.last)
+
+        # The hold survives logging in, which rotates the session key.
+        self.client.login(username='shopper', password='testpass123')
+        response = self.client.post(reverse('checkout'), {'email': 'shopper@example.com'}, follow=True)
+        self.assertTemplateUsed(response, 'orders/order_success.html')
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_refuses_stock_held_by_another_shopper(self):
+        reserve_stock('someone-else', [{'product_id': self.last.pk, 'quantity': 1}])
+        self.client.login(username='shopper', password='testpass123')
+        self.client.post(reverse('cart_add', args=[self.last.pk]))
+        response = self.client.get(reverse('checkout'))
+        self.assertContains(response, "Not enough stock for: Last Bottle")
+        response = self.client.post(reverse('checkout'), {'email': 'shopper@example.com'})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderAdminTest(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.rose = Product.objects.create(title="Rose", price=Decimal("10.00"), inventory=20)
+        self.orders = [Order.objects.create(email=f'customer{n}@example.com') for n in range(3)]
+        for order in self.orders:
+            order.products.add(self.rose, quantity=2)
+        self.url = reverse('admin:orders_order_changelist')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for n in range(10):
+            Order.objects.create(email=f'more{n}@example.com')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'more9@example.com')
+        self.assertEqual(len(many), len(few))
+
+    def test_search_by_id_and_exact_email(self):
+        target = self.orders[1]
+        response = self.client.get(self.url, {'q': str(target.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [target])
+        response = self.client.get(self.url, {'q': 'customer2@example.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.orders[2]])
+        response = self.client.get(self.url, {'q': 'customer'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_mark_shipped_is_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'action': 'mark_shipped',
+                                        '_selected_action': [o.pk for o in self.orders[:2]]})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "orders_order"')]), 1)
+        self.assertEqual(list(Order.objects.filter(shipped=True).order_by('pk')), self.orders[:2])
+
+    def test_change_view_lists_items_read_only(self):
+        response = self.client.get(reverse('admin:orders_order_change', args=[self.orders[0].pk]))
+        self.assertContains(response, "Rose")
+        self.assertNotContains(response, 'name="items-0-quantity"')
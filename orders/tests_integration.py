@@ -1,6 +1,7 @@
 from django.test import TestCase
 from products.models import Product
-from orders.models import Order
+from orders.models import Order, OrderItem
+from orders.services import InvalidCart, OutOfStock, place_order
 
 
 class OrderIntegrationTest(TestCase):
@@ -22,3 +23,54 @@ class OrderIntegrationTest(TestCase):
 
         self.product.refresh_from_db()
         self.assertEqual(self.product.stock, 9)
+
+
+class PlaceOrderTest(TestCase):
+    def setUp(self):
+        self.scissors = Product.objects.create(title="Surgical Scissors", price=15.0, inventory=10)
+        self.forceps = Product.objects.create(title="Forceps", price=8.5, inventory=1)
+
+    def test_place_order_decrements_stock_and_bulk_creates_items(self):
+        """A cart becomes one order with all its items and stock is reduced per SKU."""
+        # locked prices, holds, 2 conditional UPDATEs, order INSERT, bulk item INSERT
+        # (+ savepoint pair)
+        with self.assertNumQueries(8):
+            order = place_order(None, "buyer@example.com", [
+                {'product_id': self.scissors.pk, 'quantity': 2},
+                {'product_id': self.forceps.pk, 'quantity': 1},
+                {'product_id': self.scissors.pk, 'quantity': 1},
+            ])
+        items = {item.product_id: item for item in order.items.all()}
+        self.assertEqual(items[self.scissors.pk].quantity, 3)
+        self.assertEqual(items[self.forceps.pk].price, self.forceps.price)
+        self.scissors.refresh_from_db()
+        self.forceps.refresh_from_db()
+        self.assertEqual(self.scissors.inventory, 7)
+        self.assertEqual(self.forceps.inventory, 0)
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        """If one SKU is short, no stock is taken and no order is written."""
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(None, "buyer@example.com", [
+                {'product_id': self.scissors.pk, 'quantity': 2},
+                {'product_id': self.forceps.pk, 'quantity': 2},
+            ])
+        self.assertEqual(ctx.exception.products, [self.forceps])
+        self.scissors.refresh_from_db()
+        self.assertEqual(self.scissors.inventory, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_last_unit_cannot_be_sold_twice(self):
+        place_order(None, "first@example.com", [{'product_id': self.forceps.pk, 'quantity': 1}])
+        with self.assertRaises(OutOfStock):
+            place_order(None, "second@example.com", [{'product_id': self.forceps.pk, 'quantity': 1}])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_invalid_carts_are_rejected(self):
+        for items in ([{'product_id': 999999, 'quantity': 1}],
+                      [{'product_id': self.scissors.pk, 'quantity': 0}],
+                      [{'quantity': 1}]):
+            with self.assertRaises(InvalidCart):
+                place_order(None, "buyer@example.com", items)
+        self.assertFalse(Order.objects.exists())
@@ -5,5 +5,6 @@ app_name = 'orders'
 
 urlpatterns = [
     path('', views.order_create, name='create'),
+    path('checkout/', views.checkout_api, name='checkout_api'),
     path('list/', views.order_list, name='list'),
 ]
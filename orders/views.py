@@ -1,6 +1,26 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from .models import Order
-from django.views.decorators.http import require_http_methods
+from ipswich_retail.pagination import (
+    InvalidCursor, apaginate_keyset, cursor_query, page_size_from_request)
+from .models import Order, OrderItem
+from .reservations import holder_for
+from .services import CheckoutError, InvalidCart, OutOfStock, place_order
+from django.views.decorators.http import require_http_methods, require_POST
+
+
+def _form_items(post):
+    """Pair up repeated ``product_id``/``quantity`` form fields into cart items."""
+    product_ids = post.getlist('product_id')
+    quantities = post.getlist('quantity')
+    return [
+        {'product_id': product_id, 'quantity': quantities[i] if i < len(quantities) else 1}
+        for i, product_id in enumerate(product_ids)
+    ]
 
 
 @require_http_methods(["GET", "POST"])
@@ -10,19 +30,98 @@ def order_create(request):
 
     if request.method == "POST":
         email = request.POST.get('email')
-        # The order object isn't used, so prefix with underscore to indicate it's intentional
-        _ = Order.objects.create(
-            email=email,
-            user=request.user
-        )
+        try:
+            place_order(request.user, email, _form_items(request.POST), holder=holder_for(request))
+        except CheckoutError as exc:
+            status = 409 if isinstance(exc, OutOfStock) else 400
+            return render(request, 'orders/order_form.html',
+                          {'error': str(exc)}, status=status)
         return redirect('orders:list')
 
     return render(request, 'orders/order_form.html')
 
 
-def order_list(request):
+@require_POST
+def checkout_api(request):
+    """JSON checkout: ``{"email": .., "items": [{"product_id": .., "quantity": ..}]}``.
+
+    Responds 201 with the created order, 400 for a malformed cart and 409
+    when any SKU lacks stock (in which case nothing was written).
+    """
     if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        payload = json.loads(request.body or b'{}')
+        email = payload.get('email') or request.user.email
+        items = payload['items']
+        if not isinstance(items, list) or not items:
+            raise InvalidCart("The cart is empty.")
+    except (ValueError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Expected a JSON object with an items list.'}, status=400)
+    except InvalidCart as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    try:
+        order = place_order(request.user, email, items, holder=holder_for(request))
+    except OutOfStock as exc:
+        return JsonResponse({
+            'error': str(exc),
+            'out_of_stock': [p.pk for p in exc.products],
+        }, status=409)
+    except InvalidCart as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    lines = [
+        {'product_id': item.product_id, 'quantity': item.quantity, 'price': str(item.price)}
+        for item in order.items.all()
+    ]
+    return JsonResponse({
+        'order_id': order.pk,
+        'email': order.email,
+        'items': lines,
+        'total': str(order.total),
+    }, status=201)
+
+
+def order_history(user):
+    """Orders for ``user`` with their line items prefetched.
+
+    Rendering a page costs a fixed number of queries: one for the orders
+    (whose totals are stored on the row) and one for all of their line
+    items joined to products.
+    """
+    items = OrderItem.objects.select_related('product').only(
+        'order', 'quantity', 'price', 'product__title', 'product__slug')
+    return (
+        Order.objects.filter(user=user)
+        .prefetch_related(Prefetch('items', queryset=items))
+    )
+
+
+def _authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+async def order_list(request):
+    """The customer's order history, a keyset page at a time (async)."""
+    # Resolving request.user reads the session and user tables, which Django
+    # 4.2 only offers synchronously.
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
         return redirect('login')
 
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'orders/order_list.html', {'orders': orders})
+    orders = order_history(user)
+    page_size = page_size_from_request(
+        request, settings.ORDERS_PAGE_SIZE, settings.CATALOGUE_MAX_PAGE_SIZE)
+    try:
+        page = await apaginate_keyset(orders, request.GET.get('cursor'), page_size)
+    except InvalidCursor:
+        page = await apaginate_keyset(orders, None, page_size)
+
+    return await sync_to_async(render)(request, 'orders/order_list.html', {
+        'orders': page.items,
+        'page': page,
+        'next_query': cursor_query(request, page.next_cursor),
+        'previous_query': cursor_query(request, page.previous_cursor),
+    })
@@ -1,5 +1,14 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from ipswich_retail.pagination import EstimatedCountPaginator
+from .cache import bump_catalogue_version
 from .models import Category, Product
+from .search import search_products
 
 
 @admin.register(Category)
@@ -8,9 +17,45 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
 
 
+class InventoryActionForm(ActionForm):
+    amount = forms.IntegerField(required=False, help_text="Units to add (negative to remove).")
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('title', 'price', 'inventory', 'category')
+    list_select_related = ('category',)
     prepopulated_fields = {"slug": ("title",)}
     list_filter = ('category',)
     search_fields = ('title', 'description')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = InventoryActionForm
+    actions = ['adjust_inventory']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search through the storefront search backend instead of ``icontains``.
+
+        A leading-wildcard LIKE over title and description scans the whole
+        table; the search index (or Postgres full-text GIN index) does not.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matches = search_products(Product.objects.only('id'), search_term,
+                                  limit=settings.ADMIN_SEARCH_LIMIT)
+        return queryset.filter(pk__in=[product.pk for product in matches]), False
+
+    @admin.action(description="Adjust inventory of selected products by the amount given")
+    def adjust_inventory(self, request, queryset):
+        try:
+            amount = int(request.POST.get('amount') or '')
+        except ValueError:
+            self.message_user(request, "Enter a whole number of units to adjust by.", messages.ERROR)
+            return
+        # One UPDATE for the whole selection; stock never goes below zero.
+        updated = queryset.update(inventory=Greatest(F('inventory') + amount, Value(0)),
+                                  updated_at=timezone.now())
+        # update() sends no post_save, so invalidate cached pages here.
+        bump_catalogue_version()
+        self.message_user(request, f"Adjusted inventory of {updated} product(s) by {amount}.")
@@ -0,0 +1,128 @@
+"""Versioned read-through cache for catalogue pages.
+
+Every cached entry is stored under the current *catalogue version*, a
+counter kept in the cache itself. Saving or deleting any Product or
+Category bumps the version (see ``products.signals``), which makes all
+previously cached entries unreachable at once; they then age out via TTL
+or LRU eviction rather than having to be found and deleted individually.
+
+With read replicas configured, a miss shortly after a bump is loaded from
+the primary: a lagging replica would otherwise put pre-change data into
+the cache under the new version, where it would stay until the TTL.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from ipswich_retail.db_router import use_primary
+from prometheus_client import Counter
+
+VERSION_KEY = 'catalogue:version'
+CHANGED_KEY = 'catalogue:changed_at'
+
+_MISSING = object()
+
+cache_requests = Counter(
+    'ipswich_catalogue_cache_requests_total',
+    'Catalogue cache lookups, labelled by the kind of data and hit/miss.',
+    ['kind', 'result'],
+)
+
+
+def get_cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def _fresh_version():
+    # Seed from the clock so a version key lost to eviction or a cache
+    # restart never comes back at a number that already has entries.
+    return time.time_ns() // 1000
+
+
+def catalogue_version():
+    """Return the current catalogue version, initialising it if needed."""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalogue_version():
+    """Async :func:`catalogue_version`."""
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, _fresh_version(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Invalidate every cached catalogue entry."""
+    cache = get_cache()
+    if settings.DATABASE_REPLICAS:
+        cache.set(CHANGED_KEY, time.time(), settings.DATABASE_REPLICA_PIN_SECONDS)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(VERSION_KEY, version, timeout=None)
+        return version
+
+
+def make_key(kind, *parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return 'catalogue:%s:%s' % (kind, digest)
+
+
+def get_or_load(kind, parts, loader, timeout=None):
+    """Return the cached value for ``(kind, parts)``, calling ``loader`` on a miss.
+
+    ``None`` is a legitimate value (e.g. "no such product") and is cached
+    like any other so repeat 404s don't reach the database either.
+    """
+    cache = get_cache()
+    version = catalogue_version()
+    key = make_key(kind, *parts)
+    value = cache.get(key, _MISSING, version=version)
+    if value is not _MISSING:
+        cache_requests.labels(kind=kind, result='hit').inc()
+        return value
+
+    cache_requests.labels(kind=kind, result='miss').inc()
+    if settings.DATABASE_REPLICAS and cache.get(CHANGED_KEY) is not None:
+        with use_primary():
+            value = loader()
+    else:
+        value = loader()
+    if timeout is None:
+        cache.set(key, value, version=version)
+    else:
+        cache.set(key, value, timeout, version=version)
+    return value
+
+
+async def aget_or_load(kind, parts, loader, timeout=None):
+    """Async :func:`get_or_load`; ``loader`` is a coroutine function."""
+    cache = get_cache()
+    version = await acatalogue_version()
+    key = make_key(kind, *parts)
+    value = await cache.aget(key, _MISSING, version=version)
+    if value is not _MISSING:
+        cache_requests.labels(kind=kind, result='hit').inc()
+        return value
+
+    cache_requests.labels(kind=kind, result='miss').inc()
+    if settings.DATABASE_REPLICAS and await cache.aget(CHANGED_KEY) is not None:
+        with use_primary():
+            value = await loader()
+    else:
+        value = await loader()
+    if timeout is None:
+        await cache.aset(key, value, version=version)
+    else:
+        await cache.aset(key, value, timeout, version=version)
+    return value
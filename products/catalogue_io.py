@@ -0,0 +1,304 @@
+"""Streaming catalogue import/export shared by the management commands.
+
+Both directions work on iterators so memory use is bounded by the batch
+size, not the size of the feed. Imports upsert on ``slug`` with
+``bulk_create(update_conflicts=True)``, so a batch costs one INSERT .. ON
+CONFLICT DO UPDATE regardless of how many rows are new or existing.
+
+Every row is checked against the model's limits before it reaches the
+database, and a row that cannot be imported (bad JSON, wrong types,
+out-of-range values) is skipped and reported rather than aborting a feed
+whose earlier batches have already been committed.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import ROUND_DOWN, Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from . import search
+from .cache import bump_catalogue_version
+from .models import DEFAULT_IMAGE_URL, Category, Product
+
+FIELDS = ('title', 'slug', 'description', 'price', 'inventory', 'category', 'image')
+# updated_at is listed so upserted rows get a fresh timestamp (auto_now).
+UPDATE_FIELDS = ['title', 'description', 'price', 'inventory', 'category', 'image', 'updated_at']
+FORMATS = ('csv', 'jsonl')
+# Only this many invalid rows are kept for the report; the rest are counted.
+MAX_REPORTED_ERRORS = 100
+# PositiveIntegerField's upper bound on every supported database.
+MAX_INVENTORY = 2147483647
+
+
+class RowError(ValueError):
+    pass
+
+
+def _field(model, name):
+    return model._meta.get_field(name)
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    written: int = 0
+    skipped: int = 0
+    categories_created: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    def skip(self, number, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def guess_format(path, default='csv'):
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        return 'jsonl'
+    if path.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(fh, fmt):
+    """Yield one dict per record of a CSV (with header) or JSONL stream.
+
+    A JSONL line that is not a JSON object is yielded as a
+    :class:`RowError` so the caller can skip it and carry on.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+    elif fmt == 'jsonl':
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield RowError(f"Invalid JSON: {exc}")
+                continue
+            yield row if isinstance(row, dict) else RowError("Expected a JSON object")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _text(row, *names):
+    """The first non-empty of ``names`` in ``row`` as a stripped string."""
+    for name in names:
+        value = row.get(name)
+        if value is None or isinstance(value, str):
+            value = (value or '').strip()
+        elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            value = str(value)
+        else:
+            raise RowError(f"Invalid {name} {value!r}")
+        if value:
+            return value
+    return ''
+
+
+def _check_length(model, name, value):
+    limit = _field(model, name).max_length
+    if len(value) > limit:
+        raise RowError(f"{name} is longer than {limit} characters")
+    return value
+
+
+class CategoryMap:
+    """Category name -> id, loaded once and extended as new names appear.
+
+    Names are matched exactly, then by slug, so "woody" in a feed joins an
+    existing "Woody" rather than colliding with its slug.
+    """
+
+    def __init__(self, create=True):
+        self.ids = {}
+        self.slugs = {}
+        for pk, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            self.ids[name] = self.slugs[slug] = pk
+        self.create = create
+        self.created = 0
+
+    def resolve(self, name):
+        if not name:
+            return None
+        if name not in self.ids:
+            slug = slugify(name)
+            if slug in self.slugs:
+                self.ids[name] = self.slugs[slug]
+                return self.ids[name]
+            if not self.create:
+                raise RowError(f"Unknown category {name!r}")
+            _check_length(Category, 'name', name)
+            _check_length(Category, 'slug', slug)
+            if not slug:
+                raise RowError(f"Invalid category {name!r}")
+            try:
+                with transaction.atomic():
+                    category = Category.objects.create(name=name, slug=slug)
+            except IntegrityError:
+                raise RowError(f"Category {name!r} clashes with an existing category")
+            self.ids[name] = self.slugs[slug] = category.pk
+            self.created += 1
+        return self.ids[name]
+
+
+def build_product(row, categories):
+    """Validate one raw row and turn it into an unsaved Product."""
+    if isinstance(row, RowError):
+        raise row
+    title = _check_length(Product, 'title', _text(row, 'title', 'name'))
+    if not title:
+        raise RowError("Missing title")
+
+    price_field = _field(Product, 'price')
+    raw_price = _text(row, 'price')
+    try:
+        price = Decimal(raw_price)
+    except InvalidOperation:
+        raise RowError(f"Invalid price {raw_price!r}")
+    if not price.is_finite():
+        raise RowError(f"Invalid price {raw_price!r}")
+    if price < 0:
+        raise RowError("Price cannot be negative")
+    cents = Decimal(1).scaleb(-price_field.decimal_places)
+    if price != price.quantize(cents, rounding=ROUND_DOWN):
+        raise RowError(f"Price {raw_price} has more than {price_field.decimal_places} decimal places")
+    if price >= Decimal(10) ** (price_field.max_digits - price_field.decimal_places):
+        raise RowError(f"Price {raw_price} is too large")
+
+    raw_inventory = _text(row, 'inventory', 'stock') or '0'
+    try:
+        inventory = int(raw_inventory)
+    except ValueError:
+        raise RowError(f"Invalid inventory {raw_inventory!r}")
+    if inventory < 0:
+        raise RowError("Inventory cannot be negative")
+    if inventory > MAX_INVENTORY:
+        raise RowError("Inventory is too large")
+
+    slug_limit = _field(Product, 'slug').max_length
+    slug = _text(row, 'slug')
+    if slug:
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise RowError(f"Invalid slug {slug!r}")
+        _check_length(Product, 'slug', slug)
+    else:
+        # A slug derived from a long title is truncated to fit the column.
+        slug = slugify(title)[:slug_limit].rstrip('-')
+    if not slug:
+        raise RowError(f"Cannot derive a slug from {title!r}")
+
+    return Product(
+        title=title,
+        slug=slug,
+        description=_text(row, 'description'),
+        price=price,
+        inventory=inventory,
+        category_id=categories.resolve(_text(row, 'category')),
+        image=_check_length(Product, 'image', _text(row, 'image')) or DEFAULT_IMAGE_URL,
+    )
+
+
+def _write_batch(batch):
+    # Postgres refuses to upsert the same key twice in one statement, so the
+    # last occurrence of a slug within a batch wins.
+    products = list({product.slug: product for product in batch}.values())
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['slug'],
+            update_fields=UPDATE_FIELDS,
+        )
+    return len(products)
+
+
+def import_rows(rows, batch_size=1000, create_categories=True, progress=None):
+    """Upsert ``rows`` in batches and return :class:`ImportStats`.
+
+    Invalid rows are skipped and counted in ``stats.skipped``; the first
+    :data:`MAX_REPORTED_ERRORS` are kept in ``stats.errors`` as
+    ``(row number, message)``. ``progress`` is called with the stats after
+    each batch.
+    """
+    stats = ImportStats()
+    categories = CategoryMap(create=create_categories)
+    batch = []
+    for number, row in enumerate(rows, start=1):
+        stats.rows += 1
+        try:
+            batch.append(build_product(row, categories))
+        except RowError as exc:
+            stats.skip(number, str(exc))
+            continue
+        if len(batch) >= batch_size:
+            stats.written += _write_batch(batch)
+            batch = []
+            if progress:
+                progress(stats)
+    if batch:
+        stats.written += _write_batch(batch)
+        if progress:
+            progress(stats)
+    stats.categories_created = categories.created
+    if stats.written:
+        # bulk_create bypasses save() and its signals.
+        bump_catalogue_version()
+        search.catalogue_changed()
+    return stats
+
+
+def export_rows(chunk_size=2000):
+    """Yield every product as a dict of :data:`FIELDS`, streamed from the database."""
+    rows = (
+        Product.objects.order_by('id')
+        .values_list('title', 'slug', 'description', 'price', 'inventory',
+                     'category__name', 'image')
+        .iterator(chunk_size=chunk_size)
+    )
+    for title, slug, description, price, inventory, category, image in rows:
+        yield {
+            'title': title,
+            'slug': slug,
+            'description': description,
+            'price': str(price),
+            'inventory': inventory,
+            'category': category or '',
+            'image': image,
+        }
+
+
+def write_rows(fh, rows, fmt):
+    """Write ``rows`` to ``fh`` in ``fmt``; returns the number written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(fh, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == 'jsonl':
+        for row in rows:
+            fh.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return count
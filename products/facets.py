@@ -0,0 +1,184 @@
+"""Faceted filtering for the product grid.
+
+Shoppers can combine several categories, price bands and "in stock only"
+(``?category=a&category=b&price=25-50&in_stock=1``). In stock means some
+units are still available once other shoppers' holds are taken off (see
+:mod:`orders.reservations`). Each option shows how
+many products it would leave, given the selections in the *other* facets.
+
+The counts come from one grouped query per catalogue version, which counts
+products per (category, price band, in stock) cell. There are only
+categories x bands x 2 cells, so counts for any combination of selections
+are summed from the cached cells in Python, with no COUNT per option.
+
+The cached cells only know whether a product has inventory; checkout bumps
+the catalogue version when it sells the last unit. Holds come and go (and
+expire) without anything being saved, so the products that holds have made
+unavailable are counted by :func:`held_cells`, a small query over the
+products with active holds, and moved out of stock by :func:`net_of_holds`.
+The result is cached under the holds version
+(:func:`orders.reservations.holds_version`), as are "in stock" pages.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Q, Value, When
+from orders.reservations import active, available_units
+
+
+@dataclass(frozen=True)
+class PriceBand:
+    key: str
+    low: Decimal = None
+    high: Decimal = None
+
+    @property
+    def label(self):
+        if self.low is None:
+            return f"Under £{self.high}"
+        if self.high is None:
+            return f"£{self.low} and over"
+        return f"£{self.low} – £{self.high}"
+
+    def q(self):
+        q = Q()
+        if self.low is not None:
+            q &= Q(price__gte=self.low)
+        if self.high is not None:
+            q &= Q(price__lt=self.high)
+        return q
+
+
+def price_bands():
+    """Bands split at ``CATALOGUE_PRICE_BANDS``, e.g. (25, 50) gives
+    ``0-25``, ``25-50`` and ``50-``."""
+    edges = [Decimal(edge) for edge in settings.CATALOGUE_PRICE_BANDS]
+    bands = []
+    for low, high in zip([None] + edges, edges + [None]):
+        bands.append(PriceBand(key=f"{low or 0}-{'' if high is None else high}", low=low, high=high))
+    return bands
+
+
+@dataclass(frozen=True)
+class Filters:
+    categories: tuple = ()
+    prices: tuple = ()
+    in_stock: bool = False
+
+    @classmethod
+    def from_query(cls, query):
+        """Read the filters from a request's ``QueryDict``; unknown price bands are ignored."""
+        bands = {band.key for band in price_bands()}
+        return cls(
+            categories=tuple(sorted({slug for slug in query.getlist('category') if slug})),
+            prices=tuple(sorted({key for key in query.getlist('price') if key in bands})),
+            in_stock=query.get('in_stock') in ('1', 'on', 'true'),
+        )
+
+    def __bool__(self):
+        return bool(self.categories or self.prices or self.in_stock)
+
+    def apply(self, queryset):
+        if self.categories:
+            queryset = queryset.filter(category__slug__in=self.categories)
+        if self.prices:
+            q = Q()
+            for band in price_bands():
+                if band.key in self.prices:
+                    q |= band.q()
+            queryset = queryset.filter(q)
+        if self.in_stock:
+            queryset = queryset.alias(available=available_units()).filter(available__gt=0)
+        return queryset
+
+
+def count_cells(queryset):
+    """The grouped query: ``[(category id, band key, in stock, count), ...]``.
+
+    "In stock" here means having inventory, ignoring holds.
+    """
+    band = Case(*[When(band.q(), then=Value(band.key)) for band in price_bands()],
+                output_field=CharField())
+    in_stock = Case(When(inventory__gt=0, then=Value(True)), default=Value(False))
+    return (queryset.order_by()
+            .annotate(band=band, in_stock=in_stock)
+            .values_list('category', 'band', 'in_stock')
+            .annotate(count=Count('*')))
+
+
+def held_cells(queryset, now=None):
+    """Cells of the products that have inventory but no units left once
+    other shoppers' holds are taken off. Only products with an active hold
+    are looked at."""
+    held = (queryset.filter(inventory__gt=0, pk__in=active(now).values('product'))
+            .alias(available=available_units(now=now)).filter(available__lte=0))
+    return count_cells(held)
+
+
+def net_of_holds(cells, held):
+    """``cells`` with the products counted in ``held`` moved out of stock."""
+    counts = {}
+    for category_id, band, in_stock, count in cells:
+        counts[category_id, band, in_stock] = counts.get((category_id, band, in_stock), 0) + count
+    for category_id, band, _in_stock, count in held:
+        # The cached cells may predate a restock, so never go below zero.
+        moved = min(count, counts.get((category_id, band, True), 0))
+        counts[category_id, band, True] = counts.get((category_id, band, True), 0) - moved
+        counts[category_id, band, False] = counts.get((category_id, band, False), 0) + moved
+    return [(*key, count) for key, count in counts.items() if count]
+
+
+@dataclass
+class Option:
+    value: str
+    label: str
+    count: int
+    selected: bool
+
+
+@dataclass
+class Facets:
+    categories: list
+    prices: list
+    in_stock: Option
+    total: int
+
+
+def facet_counts(cells, categories, filters):
+    """Counts for every option from the grouped ``cells``.
+
+    ``categories`` are the Category objects to offer. An option's count
+    applies every facet except its own, so ticking one category still
+    shows what the others would add.
+    """
+    slugs = {category.pk: category.slug for category in categories}
+    selected_ids = {pk for pk, slug in slugs.items() if slug in filters.categories}
+
+    def matches(cell, skip):
+        category_id, band, in_stock, _count = cell
+        return ((skip == 'category' or not filters.categories or category_id in selected_ids)
+                and (skip == 'price' or not filters.prices or band in filters.prices)
+                and (skip == 'in_stock' or not filters.in_stock or in_stock))
+
+    by_category, by_band, in_stock_count, total = {}, {}, 0, 0
+    for cell in cells:
+        category_id, band, in_stock, count = cell
+        if matches(cell, 'category'):
+            by_category[category_id] = by_category.get(category_id, 0) + count
+        if matches(cell, 'price'):
+            by_band[band] = by_band.get(band, 0) + count
+        if in_stock and matches(cell, 'in_stock'):
+            in_stock_count += count
+        if matches(cell, None):
+            total += count
+
+    return Facets(
+        categories=[Option(category.slug, category.name, by_category.get(category.pk, 0),
+                           category.slug in filters.categories)
+                    for category in categories],
+        prices=[Option(band.key, band.label, by_band.get(band.key, 0), band.key in filters.prices)
+                for band in price_bands()],
+        in_stock=Option('1', "In stock only", in_stock_count, filters.in_stock),
+        total=total,
+    )
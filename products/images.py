@@ -0,0 +1,219 @@
+"""Local product image pipeline.
+
+``Product.image`` is a URL we do not control. ``manage.py
+ingest_product_images`` downloads each image once, stores the original
+under its SHA-256 digest and renders a thumbnail per width in
+``PRODUCT_IMAGE_WIDTHS`` as WebP and JPEG. Because files are named by
+content, their URLs never change meaning and are served with an immutable
+``Cache-Control``; pages reference them through ``srcset`` so the browser
+fetches the width it needs.
+
+Resizing needs Pillow. Without it (or before a product is ingested) pages
+fall back to the original URL, and products without an image use a local
+placeholder instead of an external placeholder service.
+"""
+import hashlib
+import io
+import os
+import urllib.request
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.templatetags.static import static
+from django.urls import reverse
+
+from .models import DEFAULT_IMAGE_URL
+
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpg': ('JPEG', 'image/jpeg')}
+PLACEHOLDER = 'img/placeholder.svg'
+
+
+class ImageError(Exception):
+    """An image could not be downloaded or decoded."""
+
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _shard(digest):
+    return os.path.join(settings.PRODUCT_IMAGE_ROOT, digest[:2], digest)
+
+
+def original_path(digest):
+    return os.path.join(_shard(digest), 'original')
+
+
+def thumbnail_path(digest, width, fmt):
+    return os.path.join(_shard(digest), f'{width}.{fmt}')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def fetch(url):
+    """Download ``url`` (http/https only), refusing anything too large."""
+    if not url.startswith(('http://', 'https://')):
+        raise ImageError(f"Unsupported image URL {url!r}")
+    limit = settings.PRODUCT_IMAGE_MAX_BYTES
+    request = urllib.request.Request(url, headers={'User-Agent': 'ipswich-retail-images'})
+    try:
+        with urllib.request.urlopen(request, timeout=settings.PRODUCT_IMAGE_FETCH_TIMEOUT) as response:
+            data = response.read(limit + 1)
+    except OSError as exc:
+        raise ImageError(f"Could not download {url}: {exc}") from exc
+    if len(data) > limit:
+        raise ImageError(f"{url} is larger than {limit} bytes")
+    return data
+
+
+def _decode_errors():
+    """What Pillow raises for data it cannot decode or re-encode.
+
+    Truncated or corrupt files surface as OSError or ValueError from
+    ``load()``/``save()``, and oversized ones as DecompressionBombError,
+    which is neither.
+    """
+    from PIL import Image
+
+    return (Image.DecompressionBombError, OSError, ValueError)
+
+
+def _open(data):
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except _decode_errors() as exc:
+        raise ImageError(f"Not a usable image: {exc}") from exc
+    return image
+
+
+def render_thumbnail(image, width, fmt):
+    """Encode ``image`` scaled down to ``width`` pixels wide (never up).
+
+    Raises :class:`ImageError` if Pillow cannot convert or encode it.
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, _content_type = FORMATS[fmt]
+    try:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        out = io.BytesIO()
+        image.save(out, pil_format, quality=settings.PRODUCT_IMAGE_QUALITY)
+    except _decode_errors() as exc:
+        raise ImageError(f"Could not render a {width}px {fmt} thumbnail: {exc}") from exc
+    return out.getvalue()
+
+
+def ensure_thumbnail(digest, width, fmt):
+    """Return the path of a thumbnail, rendering it from the original if needed.
+
+    Returns None when the original is unknown or unusable, or Pillow is
+    not installed.
+    """
+    path = thumbnail_path(digest, width, fmt)
+    if os.path.exists(path):
+        return path
+    if not pillow_available() or not os.path.exists(original_path(digest)):
+        return None
+    with open(original_path(digest), 'rb') as fh:
+        data = fh.read()
+    try:
+        thumbnail = render_thumbnail(_open(data), width, fmt)
+    except ImageError:
+        return None
+    _write_atomic(path, thumbnail)
+    return path
+
+
+@dataclass
+class Ingested:
+    digest: str
+    width: int
+
+
+def ingest(data):
+    """Store ``data`` under its digest and render every thumbnail.
+
+    Returns :class:`Ingested`; raises :class:`ImageError` if ``data`` is
+    not an image.
+    """
+    image = _open(data)
+    digest = hashlib.sha256(data).hexdigest()
+    if not os.path.exists(original_path(digest)):
+        _write_atomic(original_path(digest), data)
+    for width in settings.PRODUCT_IMAGE_WIDTHS:
+        for fmt in FORMATS:
+            path = thumbnail_path(digest, width, fmt)
+            if not os.path.exists(path):
+                _write_atomic(path, render_thumbnail(image, width, fmt))
+    return Ingested(digest=digest, width=image.width)
+
+
+def has_image(product):
+    return bool(product.image) and product.image != DEFAULT_IMAGE_URL
+
+
+def is_ingested(product):
+    # A digest only describes the URL it was taken from; after the URL is
+    # edited the product shows the new URL until it is ingested again.
+    return bool(product.image_digest) and product.image_source == product.image
+
+
+@dataclass
+class ImageSources:
+    src: str
+    srcsets: dict = field(default_factory=dict)
+
+
+def srcset_widths(original_width):
+    """``(file width, actual width)`` pairs for an original this wide.
+
+    Thumbnails are never scaled up, so widths beyond the original collapse
+    into one entry at its real size.
+    """
+    pairs = []
+    for width in sorted(settings.PRODUCT_IMAGE_WIDTHS):
+        if original_width and width >= original_width:
+            pairs.append((width, original_width))
+            break
+        pairs.append((width, width))
+    return pairs
+
+
+def image_sources(product, default_width=None):
+    """What to put in ``src``/``srcset`` for ``product``'s image."""
+    if not has_image(product):
+        return ImageSources(src=static(PLACEHOLDER))
+    if not is_ingested(product):
+        return ImageSources(src=product.image)
+    pairs = srcset_widths(product.image_width)
+    srcsets = {
+        fmt: ', '.join(
+            f"{reverse('products:image', args=[product.image_digest, width, fmt])} {actual}w"
+            for width, actual in pairs)
+        for fmt in FORMATS
+    }
+    default_width = default_width or settings.PRODUCT_IMAGE_DEFAULT_WIDTH
+    fallback = min((w for w, _ in pairs if w >= default_width), default=pairs[-1][0])
+    return ImageSources(src=reverse('products:image', args=[product.image_digest, fallback, 'jpg']),
+                        srcsets=srcsets)
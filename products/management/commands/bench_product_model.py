@@ -0,0 +1,66 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import models
+from products.models import Product
+
+
+def _plain_model():
+    """An unmanaged Model over the same table with none of Product's compatibility layer."""
+    fields = {}
+    for f in Product._meta.concrete_fields:
+        if f.primary_key:
+            continue
+        name, path, args, kwargs = f.deconstruct()
+        if f.is_relation:
+            kwargs['related_name'] = '+'
+        fields[name] = f.__class__(*args, **kwargs)
+    meta = type('Meta', (), {
+        'app_label': 'products', 'managed': False,
+        'db_table': Product._meta.db_table,
+    })
+    return type('PlainProduct', (models.Model,), {
+        '__module__': __name__, 'Meta': meta, **fields,
+    })
+
+
+class Command(BaseCommand):
+    help = ("Micro-benchmark Product instantiation and filter construction against "
+            "a plain Model to confirm the legacy name/stock aliases cost nothing")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        plain = _plain_model()
+        field_names = [f.attname for f in Product._meta.concrete_fields]
+        plain_names = [f.attname for f in plain._meta.concrete_fields]
+        values = {'id': 1, 'title': 'Rose', 'slug': 'rose', 'description': 'Petals', 'price': 75,
+                  'inventory': 3, 'category_id': None, 'image': 'https://example.com/r.png',
+                  'created_at': None}
+        row = [values.get(name) for name in field_names]
+        plain_row = [values.get(name) for name in plain_names]
+
+        cases = [
+            ("from_db (ORM row load)",
+             lambda: Product.from_db('default', field_names, row),
+             lambda: plain.from_db('default', plain_names, plain_row)),
+            ("Model(**kwargs)",
+             lambda: Product(title='Rose', price=75, inventory=3),
+             lambda: plain(title='Rose', price=75, inventory=3)),
+            ("filter(title=...)",
+             lambda: Product.objects.filter(title='Rose', inventory__gte=1),
+             lambda: plain.objects.filter(title='Rose', inventory__gte=1)),
+            ("filter(name=...) legacy",
+             lambda: Product.objects.filter(name='Rose', stock__gte=1),
+             lambda: plain.objects.filter(title='Rose', inventory__gte=1)),
+        ]
+
+        number, repeat = options['number'], options['repeat']
+        self.stdout.write(f"{'case':<26}{'Product':>12}{'plain':>12}{'ratio':>8}")
+        for label, product_fn, plain_fn in cases:
+            product_ns = min(timeit.repeat(product_fn, number=number, repeat=repeat)) / number * 1e9
+            plain_ns = min(timeit.repeat(plain_fn, number=number, repeat=repeat)) / number * 1e9
+            self.stdout.write(
+                f"{label:<26}{product_ns:>10.0f}ns{plain_ns:>10.0f}ns{product_ns / plain_ns:>8.2f}")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.utils import timezone
+from products import images
+from products.cache import bump_catalogue_version
+from products.models import DEFAULT_IMAGE_URL, Product
+
+
+class Command(BaseCommand):
+    help = ("Download product images into the local content-addressed cache and render "
+            "WebP/JPEG thumbnails for srcset")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Re-ingest every product, not only new or changed images.")
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not images.pillow_available():
+            raise CommandError("Pillow is required to resize images: pip install Pillow")
+
+        products = Product.objects.exclude(image='').exclude(image=DEFAULT_IMAGE_URL)
+        if not options['all']:
+            products = products.filter(Q(image_digest='') | ~Q(image_source=F('image')))
+        products = products.order_by('id').values_list('id', 'image')
+        if options['limit']:
+            products = products[:options['limit']]
+
+        # Products often share an image; fetch each URL once per run.
+        seen = {}
+        updated = failed = 0
+        try:
+            for product_id, url in products.iterator(chunk_size=500):
+                if url not in seen:
+                    try:
+                        seen[url] = images.ingest(images.fetch(url))
+                    except images.ImageError as exc:
+                        seen[url] = None
+                        self.stderr.write(f"  product {product_id}: {exc}")
+                result = seen[url]
+                if result is None:
+                    failed += 1
+                    continue
+                # Guarded on the URL so a concurrent edit is not overwritten.
+                updated += Product.objects.filter(pk=product_id, image=url).update(
+                    image_digest=result.digest, image_source=url, image_width=result.width,
+                    updated_at=timezone.now())
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  product {product_id}: {result.digest[:12]}")
+        finally:
+            if updated:
+                # update() sends no post_save, so invalidate cached pages here,
+                # even if the run is interrupted part-way.
+                bump_catalogue_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Ingested images for {updated} product(s), {failed} failed"))
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = 'product_search_gin'
+
+
+def _index():
+    from django.contrib.postgres.indexes import GinIndex
+    from products.search import search_vector
+
+    return GinIndex(search_vector(), name=INDEX_NAME)
+
+
+def add_search_index(apps, schema_editor):
+    # The tsvector GIN index only exists on Postgres; other databases use
+    # the in-process search index instead.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('products', 'Product'), _index())
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('products', 'Product'), _index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
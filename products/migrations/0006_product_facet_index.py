@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_image_cache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'inventory'], name='product_facet_idx'),
+        ),
+    ]
@@ -1,7 +1,12 @@
+from functools import lru_cache
+
 from django.db import models
 from django.utils.text import slugify
 from django.db.models.query import QuerySet
 
+# Shown when a product has no image of its own.
+DEFAULT_IMAGE_URL = 'https://placehold.co/400x400/F9F5F2/332C2C?text=No+Image'
+
 
 class Category(models.Model):
     name = models.CharField(max_length=120, unique=True)
@@ -16,6 +21,58 @@ class Category(models.Model):
         return self.name
 
 
+# Legacy lookup roots and the fields they stand for.
+LEGACY_LOOKUP_ALIASES = {'name': 'title', 'stock': 'inventory'}
+
+
+@lru_cache(maxsize=512)
+def _translate_lookups(keys):
+    """Map a tuple of lookup keys to their current-schema spelling.
+
+    Returns ``keys`` itself when nothing needs translating so callers can
+    skip rebuilding kwargs. Memoised because the same handful of lookup
+    shapes are used over and over.
+    """
+    translated = []
+    changed = False
+    for key in keys:
+        root, sep, rest = key.partition('__')
+        alias = LEGACY_LOOKUP_ALIASES.get(root)
+        if alias is not None:
+            key = alias + sep + rest
+            changed = True
+        translated.append(key)
+    return tuple(translated) if changed else keys
+
+
+class ProductQuerySet(QuerySet):
+    """QuerySet that understands legacy lookup names ('name' -> 'title', 'stock' -> 'inventory')."""
+
+    def _translate_kwargs(self, kwargs):
+        if not kwargs:
+            return kwargs
+        keys = tuple(kwargs)
+        new_keys = _translate_lookups(keys)
+        if new_keys is keys:
+            return kwargs
+        return dict(zip(new_keys, kwargs.values()))
+
+    def filter(self, *args, **kwargs):
+        kwargs = self._translate_kwargs(kwargs)
+        return super().filter(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        kwargs = self._translate_kwargs(kwargs)
+        return super().get(*args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        kwargs = self._translate_kwargs(kwargs)
+        return super().exclude(*args, **kwargs)
+
+
+ProductManager = models.Manager.from_queryset(ProductQuerySet, 'ProductManager')
+
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(unique=True, blank=True)
@@ -28,23 +85,28 @@ class Product(models.Model):
     # a broken image icon. We set the default at save-time so this change does
     # not require a database migration.
     image = models.URLField(blank=True)
+    # Set by `manage.py ingest_product_images` (see products.images): the
+    # SHA-256 of the downloaded image, the URL it came from and its width.
+    image_digest = models.CharField(max_length=64, blank=True, editable=False)
+    image_source = models.URLField(blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-
-    def __init__(self, *args, **kwargs):
-        """Compatibility shim: accept legacy kwargs 'name' and 'stock'.
-
-        Some tests and earlier code create Product with keywords named
-        'name' and 'stock'. The database/migration uses 'title' and
-        'inventory'. Map the legacy names to the current field names so
-        that both calling styles work without changing the DB schema.
-        """
-        # map legacy keys to current field names before Model __init__ runs
-        if 'name' in kwargs:
-            # only set title if it's not already provided
-            kwargs.setdefault('title', kwargs.pop('name'))
-        if 'stock' in kwargs:
-            kwargs.setdefault('inventory', kwargs.pop('stock'))
-        super().__init__(*args, **kwargs)
+    # Drives HTTP validators (ETag/Last-Modified) and fragment cache keys.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Default manager; its querysets accept the legacy 'name'/'stock' lookups.
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            # The catalogue grid's keyset ordering, with and without a
+            # category filter.
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+            # Covers the facet count query (see products.facets), which then
+            # reads this narrow index instead of every full row.
+            models.Index(fields=['category', 'price', 'inventory'], name='product_facet_idx'),
+        ]
 
     def clean(self):
         if self.price is not None and self.price < 0:
@@ -57,7 +119,7 @@ class Product(models.Model):
         # change) and ensures both admin-created and programmatically-created
         # products get a valid image URL.
         if not self.image:
-            self.image = 'https://placehold.co/400x400/F9F5F2/332C2C?text=No+Image'
+            self.image = DEFAULT_IMAGE_URL
         if not self.slug:
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
@@ -65,7 +127,20 @@ class Product(models.Model):
     def __str__(self):
         return self.title
 
-    # Backwards-compatible attribute accessors
+    # Backwards-compatible attribute accessors. Some tests and earlier code
+    # use 'name' and 'stock' where the schema has 'title' and 'inventory'.
+    # Because these are properties, Model.__init__ already accepts them as
+    # keyword arguments (Product(name=..., stock=...)), so no __init__
+    # override is needed and rows loaded by the ORM (Model.from_db) pay
+    # nothing for the compatibility.
+    @property
+    def name(self):
+        return self.title
+
+    @name.setter
+    def name(self, value):
+        self.title = value
+
     @property
     def stock(self):
         return self.inventory
@@ -75,47 +150,16 @@ class Product(models.Model):
         self.inventory = value
 
 
-class ProductQuerySet(QuerySet):
-    """QuerySet that understands legacy lookup names ('name' -> 'title', 'stock' -> 'inventory')."""
-
-    def _translate_kwargs(self, kwargs):
-        new = {}
-        for key, val in kwargs.items():
-            parts = key.split('__', 1)
-            root = parts[0]
-            rest = parts[1] if len(parts) > 1 else ''
-            if root == 'name':
-                root = 'title'
-            elif root == 'stock':
-                root = 'inventory'
-            new_key = root + ('__' + rest if rest else '')
-            new[new_key] = val
-        return new
-
-    def filter(self, *args, **kwargs):
-        kwargs = self._translate_kwargs(kwargs)
-        return super().filter(*args, **kwargs)
-
-    def get(self, *args, **kwargs):
-        kwargs = self._translate_kwargs(kwargs)
-        return super().get(*args, **kwargs)
-
-    def exclude(self, *args, **kwargs):
-        kwargs = self._translate_kwargs(kwargs)
-        return super().exclude(*args, **kwargs)
-
-
-class ProductManager(models.Manager):
-    def get_queryset(self):
-        return ProductQuerySet(self.model, using=self._db)
-
-    def filter(self, *args, **kwargs):
-        return self.get_queryset().filter(*args, **kwargs)
-
-    def get(self, *args, **kwargs):
-        return self.get_queryset().get(*args, **kwargs)
+class SearchIndexChange(models.Model):
+    """One entry in the search index's change journal (see ``products.search``).
 
+    ``product_id`` names a product to re-read into each worker's index; a
+    null one means too much changed for that, and workers wait for the
+    rebuilt snapshot instead. Not a foreign key: deleted products need
+    entries too.
+    """
+    product_id = models.PositiveIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
-# Make the custom manager the default so tests that filter by 'name' or
-# 'stock' work
-Product.add_to_class('objects', ProductManager())
+    def __str__(self):
+        return f"#{self.pk}: {self.product_id or 'everything'}"
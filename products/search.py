@@ -0,0 +1,360 @@
+"""Storefront product search.
+
+Two backends sit behind :func:`search_products`:
+
+* An in-process inverted index (token -> {product id: score}) over product
+  titles, descriptions and category names. Lookups touch only the posting
+  lists for the query terms, and prefix matches are found by bisecting a
+  sorted vocabulary, so latency depends on the number of matches rather
+  than the size of the catalogue. A snapshot is written to disk by the
+  ``build_search_index`` command (or the ``rebuild_search_index`` job) and
+  loaded lazily by each web process. The Product/Category signals in
+  ``products.signals`` append the changed product ids to a journal table
+  (:class:`~products.models.SearchIndexChange`); before each search a
+  process applies the entries it has not seen as per-product deltas, so a
+  save costs every process a re-read of one row, never a rebuild. Changes
+  too broad for deltas (imports) journal a marker and queue a rebuilt
+  snapshot, which processes load once it is written.
+* On Postgres, a weighted ``tsvector`` query answered by the GIN index added
+  in migration 0002, with category names matched through the (small)
+  category table.
+
+``SEARCH_BACKEND`` selects ``'index'``, ``'postgres'`` or ``'auto'`` (Postgres
+when the default database is Postgres, otherwise the in-process index).
+"""
+import bisect
+import json
+import os
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative importance of a term appearing in each field.
+FIELD_WEIGHTS = {'title': 3.0, 'category': 2.0, 'description': 1.0}
+# A prefix match ("ros" -> "rose") counts for less than the whole word.
+PREFIX_FACTOR = 0.5
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self._vocabulary = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def vocabulary(self):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def add(self, product_id, title='', description='', category=''):
+        """(Re)index one product."""
+        self.remove(product_id)
+        scores = {}
+        for field, text in (('title', title), ('description', description),
+                            ('category', category)):
+            for token in tokenize(text):
+                scores[token] = scores.get(token, 0.0) + FIELD_WEIGHTS[field]
+        for token, score in scores.items():
+            if token not in self.postings:
+                self._vocabulary = None
+                self.postings[token] = {}
+            self.postings[token][product_id] = score
+        self.documents[product_id] = list(scores)
+
+    def remove(self, product_id):
+        for token in self.documents.pop(product_id, ()):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(product_id, None)
+            if not posting:
+                del self.postings[token]
+                self._vocabulary = None
+
+    def _expand(self, term):
+        """Yield (token, factor) for ``term`` and every token it prefixes."""
+        vocabulary = self.vocabulary
+        position = bisect.bisect_left(vocabulary, term)
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            token = vocabulary[position]
+            yield token, 1.0 if token == term else PREFIX_FACTOR
+            position += 1
+
+    def search(self, query, limit=20):
+        """Return product ids matching every query term, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        scores = None
+        for term in dict.fromkeys(terms):
+            term_scores = {}
+            for token, factor in self._expand(term):
+                for product_id, score in self.postings[token].items():
+                    best = term_scores.get(product_id, 0.0)
+                    term_scores[product_id] = max(best, score * factor)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pid: scores[pid] + s
+                          for pid, s in term_scores.items() if pid in scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _score in ranked[:limit]]
+
+    def to_dict(self):
+        return {'postings': self.postings}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        for token, posting in data['postings'].items():
+            index.postings[token] = {int(pid): score for pid, score in posting.items()}
+            for pid in index.postings[token]:
+                index.documents.setdefault(pid, []).append(token)
+        return index
+
+
+def build_index():
+    """Build a fresh index from the database."""
+    from .models import Product
+
+    index = InvertedIndex()
+    rows = Product.objects.values_list(
+        'id', 'title', 'description', 'category__name')
+    for product_id, title, description, category in rows.iterator(chunk_size=2000):
+        index.add(product_id, title, description, category)
+    return index
+
+
+def save_index(index, path=None, change_id=None):
+    """Write ``index`` to ``path``; ``change_id`` is the last journal entry it includes."""
+    path = path or settings.SEARCH_INDEX_PATH
+    data = index.to_dict()
+    if change_id is not None:
+        data['change_id'] = change_id
+    tmp = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def latest_change_id():
+    from .models import SearchIndexChange
+
+    return SearchIndexChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def rebuild_snapshot(path=None):
+    """Build the index from the database and save it as the snapshot every
+    worker loads; returns it. Journal entries it covers are pruned once
+    they are older than ``JOURNAL_RETENTION``."""
+    from .models import SearchIndexChange
+
+    # Read first: changes saved during the build are replayed as deltas.
+    change_id = latest_change_id()
+    index = build_index()
+    save_index(index, path, change_id)
+    SearchIndexChange.objects.filter(
+        id__lte=change_id, created_at__lt=timezone.now() - JOURNAL_RETENTION).delete()
+    return index
+
+
+# How long a gap in the journal may be an uncommitted transaction's entry
+# rather than a rolled-back one.
+COMMIT_GRACE = timedelta(seconds=60)
+JOURNAL_RETENTION = timedelta(days=1)
+
+_lock = threading.Lock()
+_index = None
+_index_mtime = None
+# The last journal entry applied to _index.
+_index_change = 0
+# A change too broad for deltas was seen; wait for the rebuilt snapshot.
+_awaiting_snapshot = False
+
+
+def _index_file_mtime():
+    try:
+        return os.stat(settings.SEARCH_INDEX_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def _load_snapshot():
+    with open(settings.SEARCH_INDEX_PATH, encoding='utf-8') as fh:
+        data = json.load(fh)
+    change_id = data.get('change_id')
+    return InvertedIndex.from_dict(data), latest_change_id() if change_id is None else change_id
+
+
+def _catch_up():
+    """Apply the journal entries written since this copy was loaded.
+
+    Costs one indexed query when nothing changed, and re-reads only the
+    changed products otherwise.
+    """
+    global _index_change, _awaiting_snapshot
+    from .models import Product, SearchIndexChange
+
+    limit = settings.SEARCH_DELTA_LIMIT
+    rows = list(SearchIndexChange.objects.filter(id__gt=_index_change).order_by('id')
+                .values_list('id', 'product_id', 'created_at')[:limit + 1])
+    if not rows:
+        return
+    if len(rows) > limit or any(product_id is None for _id, product_id, _at in rows):
+        # Too much to re-read on a request: keep serving this copy until
+        # the rebuilt snapshot (queued with the change) is written.
+        _awaiting_snapshot = True
+        return
+
+    ids = {product_id for _id, product_id, _at in rows}
+    found = Product.objects.filter(pk__in=ids).values_list('id', 'title', 'description', 'category__name')
+    for product_id, title, description, category in found:
+        _index.add(product_id, title, description, category)
+        ids.discard(product_id)
+    for product_id in ids:
+        _index.remove(product_id)
+
+    # A gap is usually a transaction that has not committed yet: stop
+    # before it (re-reading what follows next time) until it is too old.
+    cutoff = timezone.now() - COMMIT_GRACE
+    for change_id, _product_id, created_at in rows:
+        if change_id != _index_change + 1 and created_at > cutoff:
+            break
+        _index_change = change_id
+
+
+def get_index():
+    """Return this process's index, brought up to date.
+
+    A newer snapshot file is loaded whole; otherwise the journal entries
+    other processes wrote since are applied as per-product deltas. Nothing
+    on this path rebuilds the index from the database, except the very
+    first load when there is no snapshot yet.
+    """
+    global _index, _index_mtime, _index_change, _awaiting_snapshot
+    mtime = _index_file_mtime()
+    with _lock:
+        if mtime is not None and (_index is None or mtime != _index_mtime):
+            _index, _index_change = _load_snapshot()
+            _index_mtime = mtime
+            _awaiting_snapshot = False
+        elif _index is None:
+            # No snapshot yet: build one once and share it.
+            _index_change = latest_change_id()
+            _index = build_index()
+            save_index(_index, change_id=_index_change)
+            _index_mtime = _index_file_mtime()
+            _awaiting_snapshot = False
+        if not _awaiting_snapshot:
+            _catch_up()
+    return _index
+
+
+def reset_index():
+    """Forget the loaded index so the next search reloads/rebuilds it."""
+    global _index, _index_mtime, _index_change, _awaiting_snapshot
+    with _lock:
+        _index = None
+        _index_mtime = None
+        _index_change = 0
+        _awaiting_snapshot = False
+
+
+def products_changed(product_ids):
+    """Journal that ``product_ids`` were saved or deleted, for every process's index."""
+    from .models import SearchIndexChange
+
+    if use_postgres():
+        return
+    product_ids = list(product_ids)
+    if len(product_ids) > settings.SEARCH_DELTA_LIMIT:
+        catalogue_changed()
+        return
+    SearchIndexChange.objects.bulk_create([SearchIndexChange(product_id=pk) for pk in product_ids])
+
+
+def catalogue_changed():
+    """Journal a change too broad for deltas (such as an import) and queue
+    a rebuilt snapshot; processes keep their copy until it is written."""
+    from jobs.queue import enqueue
+    from .models import SearchIndexChange
+
+    if use_postgres():
+        return
+    SearchIndexChange.objects.create(product_id=None)
+    enqueue('products.tasks.rebuild_search_index')
+
+
+def use_postgres():
+    backend = settings.SEARCH_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+def search_vector():
+    """The weighted document vector; must match the GIN index in 0002."""
+    from django.contrib.postgres.search import SearchVector
+
+    return (SearchVector('title', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english'))
+
+
+def _postgres_search(queryset, query, limit):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+    from django.db.models import Q
+    from .models import Category
+
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    def term_query(term):
+        # Each term may be a word prefix.
+        return SearchQuery("'%s':*" % term, search_type='raw', config='english')
+
+    # Every term must match the title, description or category name, as in
+    # the in-process index. The category name cannot be in the indexed
+    # vector (it lives in another table), so each term is matched against
+    # the category table separately; both halves can use an index.
+    category_vector = SearchVector('name', config='english')
+    condition = Q()
+    for term in dict.fromkeys(terms):
+        categories = Category.objects.alias(document=category_vector).filter(document=term_query(term))
+        condition &= Q(document=term_query(term)) | Q(category__in=categories.values('pk'))
+
+    any_term = SearchQuery(' | '.join("'%s':*" % term for term in terms),
+                           search_type='raw', config='english')
+    rank = (SearchRank(search_vector(), any_term)
+            + SearchRank(SearchVector('category__name', weight='B', config='english'), any_term))
+    return list(
+        queryset.alias(document=search_vector())
+        .filter(condition)
+        .annotate(rank=rank)
+        .order_by('-rank', 'id')[:limit]
+    )
+
+
+def search_products(queryset, query, limit=20):
+    """Return up to ``limit`` products from ``queryset`` matching ``query``, best first."""
+    if use_postgres():
+        return _postgres_search(queryset, query, limit)
+    ids = get_index().search(query, limit=limit)
+    found = queryset.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
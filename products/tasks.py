@@ -0,0 +1,9 @@
+"""Background work for the catalogue (see ``jobs.queue``)."""
+from jobs.queue import task
+from . import search
+
+
+@task
+def rebuild_search_index():
+    """Write a fresh search snapshot for every web process to load."""
+    search.rebuild_snapshot()
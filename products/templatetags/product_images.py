@@ -0,0 +1,20 @@
+from django import template
+
+from ..images import image_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag('products/_product_image.html')
+def product_image(product, sizes='100vw', css_class='', default_width=None):
+    """``<picture>`` for ``product`` with WebP and JPEG ``srcset``s.
+
+    ``sizes`` should describe how wide the image is laid out so the browser
+    can pick the smallest adequate thumbnail.
+    """
+    return {
+        'image': image_sources(product, default_width),
+        'alt': product.title,
+        'sizes': sizes,
+        'css_class': css_class,
+    }
@@ -1,9 +1,33 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, models
+from django.http import QueryDict
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 from decimal import Decimal
-from .models import Category, Product
+from . import facets, images, search
+from .cache import catalogue_version
+from .models import Category, Product, _translate_lookups
+from .search import InvertedIndex
+from jobs import worker
+from jobs.models import Job
+from orders.services import place_order
 from django.db.utils import IntegrityError
 
+User = get_user_model()
+
 
 class CategoryModelTest(TestCase):
     def setUp(self):
@@ -105,3 +129,533 @@ class ProductViewsTest(TestCase):
                 'products:detail', kwargs={
                     'slug': 'fake-product'}))
         self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CATALOGUE_PAGE_SIZE=2)
+class ProductPaginationTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Woody")
+        self.products = [
+            Product.objects.create(
+                title=f"Scent {i}",
+                description="Long description " * 50,
+                price=Decimal("10.00") + i,
+                inventory=5,
+                category=self.category if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+
+    def test_first_page_is_newest_first_and_trimmed(self):
+        """The grid shows the newest page_size products without loading descriptions."""
+        response = self.client.get(reverse('products:list'))
+        page = response.context['page']
+        self.assertEqual([p.title for p in page], ["Scent 4", "Scent 3"])
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+        self.assertIn('description', page.items[0].get_deferred_fields())
+
+    def test_cursor_walks_forward_and_back(self):
+        """Following next/previous links visits every product exactly once."""
+        url = reverse('products:list')
+        seen = []
+        response = self.client.get(url)
+        while True:
+            page = response.context['page']
+            seen.extend(p.title for p in page)
+            if not page.has_next:
+                break
+            response = self.client.get(url + '?' + response.context['next_query'])
+        self.assertEqual(seen, [f"Scent {i}" for i in range(4, -1, -1)])
+
+        response = self.client.get(url + '?' + response.context['previous_query'])
+        self.assertEqual([p.title for p in response.context['page']], ["Scent 2", "Scent 1"])
+
+    def test_page_size_and_category_filter(self):
+        """per_page is honoured and the category filter survives pagination."""
+        response = self.client.get(reverse('products:list'), {'category': 'woody', 'per_page': 1})
+        page = response.context['page']
+        self.assertEqual([p.title for p in page], ["Scent 3"])
+        self.assertIn('category=woody', response.context['next_query'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('products:list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.title for p in response.context['page']], ["Scent 4", "Scent 3"])
+
+
+class FacetedFilteringTest(TestCase):
+    def setUp(self):
+        self.woody = Category.objects.create(name="Woody")
+        self.fresh = Category.objects.create(name="Fresh")
+        for title, price, inventory, category in [
+            ("Cedar", "20.00", 3, self.woody),
+            ("Oud", "120.00", 0, self.woody),
+            ("Vetiver", "45.00", 1, self.woody),
+            ("Citrus", "30.00", 5, self.fresh),
+            ("Neroli", "60.00", 0, self.fresh),
+        ]:
+            Product.objects.create(title=title, price=Decimal(price), inventory=inventory, category=category)
+
+    def get(self, **params):
+        return self.client.get(reverse('products:list'), params)
+
+    def counts(self, options):
+        return {option.value: option.count for option in options}
+
+    def test_filters_combine_across_facets(self):
+        response = self.get(category=['woody', 'fresh'], price=['25-50', '50-100'], in_stock='1')
+        self.assertEqual(sorted(p.title for p in response.context['page']), ["Citrus", "Vetiver"])
+        self.assertEqual(response.context['facets'].total, 2)
+
+    def test_each_facet_counts_with_the_other_facets_applied(self):
+        found = self.get(category='woody', in_stock='1').context['facets']
+        # Categories ignore the category selection but honour "in stock".
+        self.assertEqual(self.counts(found.categories), {'fresh': 1, 'woody': 2})
+        self.assertEqual(self.counts(found.prices), {'0-25': 1, '25-50': 1, '50-100': 0, '100-': 0})
+        self.assertEqual(found.in_stock.count, 2)
+        self.assertTrue(found.categories[1].selected)
+
+    def test_counts_are_one_cached_grouped_query(self):
+        self.get()
+        # A new combination only loads its page of products; the counts
+        # come from the cached cells, less any products held at checkout.
+        with self.assertNumQueries(1):
+            self.get(category='fresh', price='0-25')
+        with self.assertNumQueries(0):
+            self.get(category='fresh', price='0-25')
+        Product.objects.create(title="Amber", price=Decimal("10.00"), inventory=1, category=self.fresh)
+        self.assertEqual(self.counts(self.get().context['facets'].categories), {'fresh': 3, 'woody': 3})
+
+    def test_selling_the_last_unit_updates_the_in_stock_facet(self):
+        vetiver = Product.objects.get(title="Vetiver")
+        self.assertEqual(self.get().context['facets'].in_stock.count, 3)
+        self.assertContains(self.get(in_stock='1'), "Vetiver")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(None, "buyer@example.com", [{'product_id': vetiver.pk, 'quantity': 1}])
+        found = self.get(in_stock='1')
+        self.assertEqual(found.context['facets'].in_stock.count, 2)
+        self.assertEqual(self.counts(found.context['facets'].categories), {'fresh': 1, 'woody': 1})
+        self.assertNotContains(found, "Vetiver")
+
+    def test_unknown_price_bands_are_ignored(self):
+        self.assertEqual(facets.Filters.from_query(QueryDict('price=1-2&price=25-50')).prices, ('25-50',))
+        self.assertEqual(self.get(price='1-2').context['facets'].total, 5)
+
+
+class CatalogueCacheTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Fresh")
+        self.product = Product.objects.create(
+            title="Citrus Bloom", price=Decimal("65.00"), inventory=3, category=self.category)
+
+    def test_repeat_requests_are_served_from_cache(self):
+        """Once warm, no page queries the database: what depends on holds is
+        cached under the holds version."""
+        urls = [
+            reverse('products:list'),
+            reverse('products:list') + '?category=fresh',
+            reverse('products:list') + '?in_stock=1',
+            reverse('products:detail', kwargs={'slug': self.product.slug}),
+        ]
+        for url in urls:
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertContains(response, "Citrus Bloom")
+
+    def test_missing_product_is_cached_as_404(self):
+        url = reverse('products:detail', kwargs={'slug': 'nope'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_saving_product_or_category_invalidates(self):
+        """Product and Category saves/deletes bump the catalogue version."""
+        url = reverse('products:list')
+        self.client.get(url)
+
+        self.product.title = "Citrus Bloom Intense"
+        self.product.save()
+        self.assertContains(self.client.get(url), "Citrus Bloom Intense")
+
+        self.category.name = "Fresh & Zesty"
+        self.category.save()
+        self.assertContains(self.client.get(url), "Fresh &amp; Zesty")
+
+        self.product.delete()
+        self.assertNotContains(self.client.get(url), "Citrus Bloom Intense")
+
+    def test_product_cards_are_cached_fragments(self):
+        from django.core.cache import caches
+        from django.core.cache.utils import make_template_fragment_key
+        self.client.get(reverse('products:list'))
+        key = make_template_fragment_key(
+            'product_card', [self.product.pk, self.product.updated_at.timestamp()])
+        self.assertIn("Citrus Bloom", caches['catalogue'].get(key))
+
+    def test_hits_and_misses_are_counted(self):
+        from products.cache import cache_requests
+
+        def count(result):
+            return cache_requests.labels(kind='detail', result=result)._value.get()
+
+        url = reverse('products:detail', kwargs={'slug': self.product.slug})
+        hits, misses = count('hit'), count('miss')
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(count('miss') - misses, 1)
+        self.assertEqual(count('hit') - hits, 1)
+
+
+class ProductDetailConditionalGetTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title="Oud Nights", price=Decimal("90.00"), inventory=2)
+        self.url = reverse('products:detail', kwargs={'slug': self.product.slug})
+
+    def test_validators_and_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=%d' % settings.PRODUCT_DETAIL_S_MAXAGE, response['Cache-Control'])
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+    def test_page_is_the_same_for_every_visitor(self):
+        """No CSRF cookie, no session read: a CDN can share the page."""
+        self.client.post(reverse('cart_add', args=[self.product.pk]))
+        response = self.client.get(self.url)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertNotIn('csrftoken', response.cookies)
+        anonymous = Client().get(self.url)
+        self.assertEqual(anonymous['ETag'], response['ETag'])
+        self.assertEqual(anonymous.content, response.content)
+
+        state = self.client.get(reverse('cart_state'))
+        self.assertEqual(state.json()['count'], 1)
+        self.assertTrue(state.json()['csrf_token'])
+        self.assertIn('private', state['Cache-Control'])
+
+    def test_if_none_match_returns_304(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_if_modified_since_alone_is_not_enough_for_a_304(self):
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(response.status_code, 200)
+
+    def test_editing_the_product_changes_the_etag(self):
+        first = self.client.get(self.url)
+        self.product.price = Decimal("95.00")
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "95.00")
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class InvertedIndexTest(TestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, "Rose Serenity", "Rose petals and white musk", "Floral")
+        self.index.add(2, "Sandalwood Dusk", "Warm amber with a hint of rose", "Woody")
+        self.index.add(3, "Rosemary Fresh", "Herbal and green", "Fresh")
+
+    def test_title_matches_outrank_description_matches(self):
+        self.assertEqual(self.index.search("rose"), [1, 3, 2])
+
+    def test_prefix_and_multi_term_queries(self):
+        """Terms may be word prefixes and all of them must match."""
+        self.assertEqual(self.index.search("sand"), [2])
+        self.assertEqual(self.index.search("ros musk"), [1])
+        self.assertEqual(self.index.search("woody amber"), [2])
+        self.assertEqual(self.index.search("rose oud"), [])
+
+    def test_reindex_and_remove(self):
+        self.index.add(2, "Sandalwood Dusk", "Warm amber", "Woody")
+        self.assertEqual(self.index.search("rose"), [1, 3])
+        self.index.remove(1)
+        self.assertEqual(self.index.search("rose"), [3])
+        self.assertNotIn("serenity", self.index.postings)
+
+    def test_round_trips_through_dict(self):
+        restored = InvertedIndex.from_dict(json.loads(json.dumps(self.index.to_dict())))
+        self.assertEqual(restored.search("ros"), self.index.search("ros"))
+        restored.remove(3)
+        self.assertEqual(restored.search("ros"), [1, 2])
+
+
+class ProductSearchViewTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index_path = os.path.join(tmp.name, 'index.json')
+        overrides = override_settings(SEARCH_BACKEND='index', SEARCH_INDEX_PATH=self.index_path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        search.reset_index()
+        self.addCleanup(search.reset_index)
+
+        self.category = Category.objects.create(name="Oriental")
+        Product.objects.create(title="Midnight Oud", description="Smoky vetiver", price=Decimal("95.00"),
+                               category=self.category)
+        Product.objects.create(title="Vanilla Dream", description="Soft vanilla", price=Decimal("70.00"))
+
+    def test_search_page_lists_matches(self):
+        response = self.client.get(reverse('products:search'), {'q': 'oud'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Midnight Oud")
+        self.assertNotContains(response, "Vanilla Dream")
+        self.assertTemplateUsed(response, "products/search_results.html")
+
+    def test_saves_update_the_loaded_index(self):
+        """Once loaded, the index follows Product saves and Category renames without a rebuild."""
+        self.client.get(reverse('products:search'), {'q': 'oud'})
+        Product.objects.create(title="Amber Oud", price=Decimal("80.00"))
+        self.category.name = "Smoky"
+        self.category.save()
+        response = self.client.get(reverse('products:search'), {'q': 'smok oud'})
+        self.assertContains(response, "Midnight Oud")
+        self.assertContains(self.client.get(reverse('products:search'), {'q': 'amber'}), "Amber Oud")
+
+    def test_saves_reach_the_index_as_deltas_without_a_rebuild(self):
+        """Saves from any process are journalled and applied per product."""
+        self.client.get(reverse('products:search'), {'q': 'oud'})
+        loaded = search._index
+        amber = Product.objects.create(title="Amber Oud", price=Decimal("80.00"))
+        with mock.patch.object(search, 'build_index') as build:
+            self.assertContains(self.client.get(reverse('products:search'), {'q': 'amber'}), "Amber Oud")
+            amber.delete()
+            self.assertNotContains(self.client.get(reverse('products:search'), {'q': 'amber'}), "Amber Oud")
+        build.assert_not_called()
+        self.assertIs(search._index, loaded)
+
+    def test_broad_changes_wait_for_the_rebuilt_snapshot(self):
+        self.client.get(reverse('products:search'), {'q': 'oud'})
+        Product.objects.filter(title="Vanilla Dream").update(title="Vanilla Oud")
+        with self.captureOnCommitCallbacks(execute=True):
+            search.catalogue_changed()
+        # Served from the loaded copy until the snapshot is written.
+        self.assertNotContains(self.client.get(reverse('products:search'), {'q': 'oud'}), "Vanilla Oud")
+        self.assertEqual(Job.objects.get().name, 'products.tasks.rebuild_search_index')
+        worker.work(once=True)
+        self.assertContains(self.client.get(reverse('products:search'), {'q': 'oud'}), "Vanilla Oud")
+
+    def test_build_command_writes_index_that_is_loaded(self):
+        call_command('build_search_index', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(self.index_path))
+        search.reset_index()
+        self.assertEqual(len(search.get_index()), 2)
+
+    def test_empty_query_renders_form(self):
+        response = self.client.get(reverse('products:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['products'], [])
+
+
+class LegacyAliasTest(TestCase):
+    def setUp(self):
+        Product.objects.create(name="Legacy Scent", price=Decimal("5.00"), stock=4)
+
+    def test_legacy_kwargs_and_lookups(self):
+        """'name'/'stock' work as constructor kwargs, attributes and lookups."""
+        product = Product.objects.get(name="Legacy Scent")
+        self.assertEqual(product.title, "Legacy Scent")
+        self.assertEqual(product.stock, 4)
+        self.assertTrue(Product.objects.filter(stock__gte=4).exists())
+        self.assertFalse(Product.objects.exclude(name__startswith="Legacy").exists())
+        self.assertTrue(Product.objects.filter(category__isnull=True).filter(name="Legacy Scent").exists())
+
+    def test_no_per_instance_overhead(self):
+        """Instances are built by Model.__init__ directly, including rows loaded by the ORM."""
+        self.assertIs(Product.__init__, models.Model.__init__)
+        self.assertNotIn('from_db', vars(Product))
+
+    def test_translation_is_memoised_and_skipped_when_unneeded(self):
+        qs = Product.objects.all()
+        plain = {'title': 'x', 'price__gt': 1}
+        self.assertIs(qs._translate_kwargs(plain), plain)
+        self.assertEqual(qs._translate_kwargs({'name__iexact': 'x', 'stock': 1}),
+                         {'title__iexact': 'x', 'inventory': 1})
+        hits = _translate_lookups.cache_info().hits
+        qs._translate_kwargs({'name__iexact': 'y', 'stock': 2})
+        self.assertEqual(_translate_lookups.cache_info().hits, hits + 1)
+
+    def test_benchmark_command_runs(self):
+        out = io.StringIO()
+        call_command('bench_product_model', '--number', '10', '--repeat', '1', stdout=out)
+        self.assertIn("from_db (ORM row load)", out.getvalue())
+
+
+class ProductAdminTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(SEARCH_BACKEND='index',
+                                      SEARCH_INDEX_PATH=os.path.join(tmp.name, 'index.json'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        search.reset_index()
+        self.addCleanup(search.reset_index)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.oud = Product.objects.create(title="Midnight Oud", price=Decimal("95.00"), inventory=3)
+        self.vanilla = Product.objects.create(title="Vanilla Dream", price=Decimal("70.00"), inventory=1)
+        self.url = reverse('admin:products_product_changelist')
+
+    def test_search_uses_the_search_backend(self):
+        response = self.client.get(self.url, {'q': 'oud'})
+        self.assertContains(response, "Midnight Oud")
+        self.assertNotContains(response, "Vanilla Dream")
+
+    def test_adjust_inventory_is_one_update_and_floors_at_zero(self):
+        version = catalogue_version()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                'action': 'adjust_inventory', 'amount': '-2',
+                '_selected_action': [self.oud.pk, self.vanilla.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "products_product"')]), 1)
+        self.oud.refresh_from_db()
+        self.vanilla.refresh_from_db()
+        self.assertEqual((self.oud.inventory, self.vanilla.inventory), (1, 0))
+        self.assertGreater(catalogue_version(), version)
+
+    def test_adjust_inventory_requires_an_amount(self):
+        self.client.post(self.url, {'action': 'adjust_inventory', 'amount': '',
+                                    '_selected_action': [self.oud.pk]})
+        self.oud.refresh_from_db()
+        self.assertEqual(self.oud.inventory, 3)
+
+
+def _png(width=800, height=600):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new('RGBA', (width, height), (200, 30, 30, 128)).save(out, 'PNG')
+    return out.getvalue()
+
+
+@unittest.skipUnless(images.pillow_available(), "Pillow is not installed")
+class ProductImageTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(PRODUCT_IMAGE_ROOT=tmp.name, PRODUCT_IMAGE_WIDTHS=(160, 320, 640, 960))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.product = Product.objects.create(title="Amber Candle", price=Decimal("12.00"), inventory=5,
+                                              image="https://images.example.com/amber.png")
+        fetch = mock.patch('products.images.fetch', return_value=_png())
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+
+    def ingest(self):
+        call_command('ingest_product_images', stdout=io.StringIO(), stderr=io.StringIO())
+        self.product.refresh_from_db()
+
+    def test_original_url_is_used_until_ingested(self):
+        response = self.client.get(reverse('products:list'))
+        self.assertContains(response, 'src="https://images.example.com/amber.png"')
+        self.assertNotContains(response, 'srcset=')
+
+    def test_products_without_an_image_use_the_local_placeholder(self):
+        Product.objects.create(title="Plain Tin", price=Decimal("3.00"), image="")
+        response = self.client.get(reverse('products:list'))
+        self.assertContains(response, images.PLACEHOLDER)
+        self.assertNotContains(response, 'placeholder.com')
+
+    def test_ingest_renders_thumbnails_and_stops_at_the_original_width(self):
+        self.ingest()
+        self.assertEqual(len(self.product.image_digest), 64)
+        self.assertEqual(self.product.image_width, 800)
+        self.assertEqual(self.product.image_source, self.product.image)
+        self.assertTrue(os.path.exists(images.thumbnail_path(self.product.image_digest, 320, 'webp')))
+
+        response = self.client.get(reverse('products:list'))
+        digest = self.product.image_digest
+        self.assertContains(response, f'/shop/images/{digest}/320.webp 320w')
+        self.assertContains(response, f'/shop/images/{digest}/960.jpg 800w')
+        self.assertNotContains(response, 'images.example.com')
+
+    def test_ingest_skips_products_already_ingested_and_fetches_each_url_once(self):
+        Product.objects.create(title="Amber Candle Large", price=Decimal("20.00"), image=self.product.image)
+        self.ingest()
+        self.assertEqual(self.fetch.call_count, 1)
+        self.ingest()
+        self.assertEqual(self.fetch.call_count, 1)
+
+        Product.objects.filter(pk=self.product.pk).update(image="https://images.example.com/amber2.png")
+        self.ingest()
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(self.product.image_source, "https://images.example.com/amber2.png")
+
+    def test_ingest_records_undecodable_images_and_continues(self):
+        self.fetch.return_value = b'not an image'
+        stderr = io.StringIO()
+        call_command('ingest_product_images', stdout=io.StringIO(), stderr=stderr)
+        self.assertIn(f"product {self.product.pk}", stderr.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_digest, '')
+
+    def test_ingest_survives_truncated_and_oversized_images(self):
+        self.fetch.return_value = _png()[:200]
+        self.ingest()
+        self.assertEqual(self.product.image_digest, '')
+        self.fetch.return_value = _png()
+        with mock.patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+            self.ingest()
+        self.assertEqual(self.product.image_digest, '')
+
+    def test_unencodable_thumbnails_are_image_errors(self):
+        from PIL import Image
+
+        image = images._open(_png())
+        with mock.patch.object(Image.Image, 'save', side_effect=ValueError("bad mode")):
+            with self.assertRaises(images.ImageError):
+                images.render_thumbnail(image, 160, 'webp')
+
+    def test_interrupted_ingest_still_invalidates_the_catalogue_cache(self):
+        Product.objects.create(title="Cedar Candle", price=Decimal("12.00"),
+                               image="https://images.example.com/cedar.png")
+        self.fetch.side_effect = [_png(), KeyboardInterrupt]
+        version = catalogue_version()
+        with self.assertRaises(KeyboardInterrupt):
+            self.ingest()
+        self.assertNotEqual(catalogue_version(), version)
+
+    async def test_image_view_streams_under_asgi(self):
+        await sync_to_async(self.ingest)()
+        url = reverse('products:image', args=[self.product.image_digest, 160, 'webp'])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response])
+        with open(images.thumbnail_path(self.product.image_digest, 160, 'webp'), 'rb') as fh:
+            self.assertEqual(body, fh.read())
+        response.close()
+
+    def test_image_view_is_immutable_and_conditional(self):
+        self.ingest()
+        url = reverse('products:image', args=[self.product.image_digest, 160, 'webp'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_image_view_renders_missing_thumbnails_and_rejects_other_widths(self):
+        self.ingest()
+        digest = self.product.image_digest
+        os.remove(images.thumbnail_path(digest, 640, 'jpg'))
+        self.assertEqual(self.client.get(reverse('products:image', args=[digest, 640, 'jpg'])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('products:image', args=[digest, 500, 'jpg'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('products:image', args=['0' * 64, 160, 'jpg'])).status_code, 404)
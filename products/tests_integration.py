@@ -1,5 +1,15 @@
-from django.test import TestCase
-from products.models import Product
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from jobs.models import Job
+from products.cache import catalogue_version
+from products.catalogue_io import MAX_REPORTED_ERRORS, read_rows
+from products.models import Category, Product, SearchIndexChange
 
 
 class ProductIntegrationTest(TestCase):
@@ -23,3 +33,110 @@ class ProductIntegrationTest(TestCase):
         self.product.save()
         updated = Product.objects.get(pk=self.product.pk)
         self.assertEqual(updated.inventory, 15)
+
+
+class CatalogueImportExportTest(TestCase):
+    def setUp(self):
+        self.floral = Category.objects.create(name="Floral")
+        Product.objects.create(title="Rose Serenity", price=75, inventory=3, category=self.floral)
+
+    def run_import(self, content, *args):
+        tmp = tempfile.NamedTemporaryFile('w', suffix=args[0] if args else '.csv', delete=False)
+        self.addCleanup(os.unlink, tmp.name)
+        tmp.write(content)
+        tmp.close()
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_catalogue', tmp.name, *args[1:], stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_upserts_and_resolves_categories(self):
+        """Existing slugs are updated, new ones created, and unknown categories added once."""
+        out, err = self.run_import(
+            "title,price,inventory,category,description\n"
+            "Rose Serenity,80.00,10,Floral,Updated\n"
+            "Cedar Night,55,4,Woody,\n"
+            "Pine Walk,45,2,Woody,\n"
+            ",10,1,Woody,\n"
+            "Bad Price,abc,1,Woody,\n"
+        )
+        self.assertIn("Imported 3 products from 5 rows (2 skipped, 1 new categories)", out)
+        self.assertIn("row 4: Missing title", err)
+        rose = Product.objects.get(slug='rose-serenity')
+        self.assertEqual(rose.price, Decimal("80.00"))
+        self.assertEqual(rose.inventory, 10)
+        self.assertEqual(rose.description, "Updated")
+        self.assertEqual(Product.objects.filter(category__name="Woody").count(), 2)
+        self.assertEqual(Category.objects.filter(name="Woody").count(), 1)
+        self.assertTrue(Product.objects.get(slug='cedar-night').image)
+
+    def test_jsonl_import_in_small_batches(self):
+        lines = "\n".join(
+            json.dumps({'title': f"Scent {i}", 'price': "10.00", 'stock': i, 'category': 'Floral'})
+            for i in range(7)
+        )
+        out, _ = self.run_import(lines, '.jsonl', '--batch-size', '3')
+        self.assertIn("Imported 7 products", out)
+        self.assertEqual(Product.objects.get(slug='scent-6').inventory, 6)
+
+    def test_malformed_rows_are_skipped_not_fatal(self):
+        """Rows the database would reject are reported and the rest of the feed still imports."""
+        long_title = "Amber " * 20
+        lines = "\n".join([
+            json.dumps({'title': "Good One", 'price': "12.50", 'category': 'Floral'}),
+            '{"title": "Broken',
+            json.dumps(["not", "an", "object"]),
+            json.dumps({'title': "Numeric Category", 'price': "5", 'category': 7}),
+            json.dumps({'title': "Listed Category", 'price': "5", 'category': ['Floral']}),
+            json.dumps({'title': "Not A Number", 'price': "NaN"}),
+            json.dumps({'title': "Too Dear", 'price': "100000000"}),
+            json.dumps({'title': "Too Precise", 'price': "1.005"}),
+            json.dumps({'title': "Bad Slug", 'slug': "x" * 51, 'price': "5"}),
+            json.dumps({'title': long_title, 'price': "9"}),
+        ])
+        out, err = self.run_import(lines, '.jsonl')
+        self.assertIn("Imported 3 products from 10 rows (7 skipped", out)
+        self.assertIn("row 2: Invalid JSON", err)
+        self.assertIn("row 3: Expected a JSON object", err)
+        self.assertIn("row 5: Invalid category", err)
+        self.assertIn("row 6: Invalid price 'NaN'", err)
+        self.assertIn("row 7: Price 100000000 is too large", err)
+        self.assertIn("row 9: slug is longer than 50 characters", err)
+        self.assertEqual(Category.objects.get(name="7").product_set.count(), 1)
+        amber = Product.objects.get(title=long_title.strip())
+        self.assertEqual(len(amber.slug), 50)
+        self.assertFalse(amber.slug.endswith('-'))
+
+    def test_category_names_differing_in_case_share_a_category(self):
+        out, err = self.run_import("title,price,category\nCedar,10,Woody\nPine,12,woody\nFir,9,WOODY!\n")
+        self.assertIn("Imported 3 products from 3 rows (0 skipped, 1 new categories)", out)
+        woody = Category.objects.get(slug='woody')
+        self.assertEqual(woody.name, "Woody")
+        self.assertEqual(woody.product_set.count(), 3)
+        out, err = self.run_import("title,price,category\nRose,10,floral\n")
+        self.assertEqual(Product.objects.get(slug='rose').category, self.floral)
+
+    def test_import_queues_a_search_index_rebuild(self):
+        with override_settings(SEARCH_BACKEND='index'), self.captureOnCommitCallbacks(execute=True):
+            self.run_import("title,price\nFresh Linen,20\n")
+        self.assertTrue(SearchIndexChange.objects.filter(product_id=None).exists())
+        self.assertTrue(Job.objects.filter(name='products.tasks.rebuild_search_index').exists())
+
+    def test_reported_errors_are_capped(self):
+        out, err = self.run_import("title,price\n" + "Bad,abc\n" * (MAX_REPORTED_ERRORS + 30))
+        self.assertIn(f"({MAX_REPORTED_ERRORS + 30} skipped", out)
+        self.assertIn(f"... and {MAX_REPORTED_ERRORS + 10} more invalid rows", err)
+
+    def test_export_round_trips(self):
+        for fmt in ('csv', 'jsonl'):
+            exported = io.StringIO()
+            call_command('export_catalogue', '--format', fmt, stdout=exported, stderr=io.StringIO())
+            rows = list(read_rows(io.StringIO(exported.getvalue()), fmt))
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0]['slug'], 'rose-serenity')
+            self.assertEqual(rows[0]['category'], 'Floral')
+            self.assertEqual(str(rows[0]['price']), '75.00')
+
+    def test_import_invalidates_catalogue_cache(self):
+        version = catalogue_version()
+        self.run_import("title,price\nFresh Linen,20\n")
+        self.assertNotEqual(catalogue_version(), version)
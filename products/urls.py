@@ -1,9 +1,13 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'products'
 
 urlpatterns = [
     path('', views.product_list, name='list'),
+    # Must come before the detail route, which would otherwise match 'search'.
+    path('search/', views.product_search, name='search'),
+    re_path(r'^images/(?P<digest>[0-9a-f]{64})/(?P<width>[0-9]+)\.(?P<fmt>webp|jpg)$',
+            views.product_image, name='image'),
     path('<slug:slug>/', views.product_detail, name='detail'),
 ]
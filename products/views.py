@@ -1,25 +1,168 @@
-from django.shortcuts import render, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from ipswich_retail.conditional import make_etag, template_last_modified
+from ipswich_retail.pagination import (
+    InvalidCursor, apaginate_keyset, cursor_query, page_size_from_request)
+from ipswich_retail.staticfiles import stream_file_async
+from orders.reservations import aholds_version, available_stock, holds_version
+from . import cache as catalogue_cache
+from . import facets, images
+from .search import search_products
 from .models import Product, Category
 
+# Columns the product grid actually renders; ``description`` in particular can
+# be large and is only needed on the detail page.
+LIST_FIELDS = ('id', 'title', 'slug', 'price', 'image', 'image_digest', 'image_source', 'image_width',
+               'created_at', 'updated_at')
+# Content-addressed thumbnails never change.
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+DETAIL_TEMPLATES = ('products/product_detail.html', 'products/_product_image.html', 'base.html')
 
-def product_list(request):
-    """Display all products and allow filtering by category."""
-    products = Product.objects.all()
-    categories = Category.objects.all()
 
-    category_slug = request.GET.get('category')
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
+async def _load_page(filters, cursor, page_size):
+    products = filters.apply(Product.objects.only(*LIST_FIELDS))
+    try:
+        return await apaginate_keyset(products, cursor, page_size)
+    except InvalidCursor:
+        # Stale or hand-edited link: start again from the first page.
+        return await apaginate_keyset(products, None, page_size)
+
+
+async def _load_categories():
+    return [category async for category in Category.objects.order_by('name')]
+
+
+async def _load_facet_cells():
+    return [cell async for cell in facets.count_cells(Product.objects.all())]
+
+
+async def _load_cells_net_of_holds():
+    return facets.net_of_holds(
+        await catalogue_cache.aget_or_load('facets', (), _load_facet_cells),
+        [cell async for cell in facets.held_cells(Product.objects.all())])
+
+
+def _card_context():
+    """Context for the cached ``_product_card.html`` fragments.
+
+    Cards are keyed on the product's ``updated_at``, so editing one product
+    retires only its own card.
+    """
+    return {'fragment_cache_ttl': settings.FRAGMENT_CACHE_TTL}
+
+
+async def product_list(request):
+    """Display products a page at a time, filtered by any combination of facets.
+
+    Async: cache and database waits don't hold a worker thread. Rendering
+    (which reads the session for the cart badge) runs in a thread. Counts
+    and in-stock pages depend on holds too, so they are also keyed on the
+    holds version (see :mod:`.facets`).
+    """
+    holds = await aholds_version()
+    categories = await catalogue_cache.aget_or_load('categories', (), _load_categories)
+    cells = await catalogue_cache.aget_or_load('net_facets', (holds,), _load_cells_net_of_holds)
+
+    filters = facets.Filters.from_query(request.GET)
+    cursor = request.GET.get('cursor') or None
+    page_size = page_size_from_request(
+        request, settings.CATALOGUE_PAGE_SIZE, settings.CATALOGUE_MAX_PAGE_SIZE)
+    parts = (filters, cursor, page_size)
+    if filters.in_stock:
+        parts += (holds,)
+    page = await catalogue_cache.aget_or_load(
+        'list', parts, lambda: _load_page(filters, cursor, page_size))
 
     context = {
-        'products': products,
+        'products': page.items,
+        'page': page,
         'categories': categories,
+        'facets': facets.facet_counts(cells, categories, filters),
+        'filters': filters,
+        'next_query': cursor_query(request, page.next_cursor),
+        'previous_query': cursor_query(request, page.previous_cursor),
+        **_card_context(),
     }
-    return render(request, 'products/product_list.html', context)
+    return await sync_to_async(render)(request, 'products/product_list.html', context)
 
 
-def product_detail(request, slug):
+async def product_detail(request, slug):
     """Display a single product."""
-    product = get_object_or_404(Product, slug=slug)
-    return render(request, 'products/product_detail.html',
-                  {'product': product})
+    product = await catalogue_cache.aget_or_load(
+        'detail', (slug,), lambda: Product.objects.filter(slug=slug).afirst())
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    return await sync_to_async(_detail_response)(request, product)
+
+
+def _detail_response(request, product):
+    """Conditional response for ``product``'s page.
+
+    The page is the same for every visitor: the cart badge and the add-to-cart
+    form's CSRF token are filled in by the browser from ``cart_state``, and
+    availability counts every shopper's holds. So CDNs may share it for
+    PRODUCT_DETAIL_S_MAXAGE seconds, and repeat views are answered with a
+    bodyless 304 while the product, its availability and the templates are
+    unchanged. Availability is cached under the holds version, so a warm
+    304 costs no queries.
+    """
+    available = catalogue_cache.get_or_load(
+        'available', (product.pk, holds_version()),
+        lambda: available_stock([product.pk]).get(product.pk, 0))
+    etag = quote_etag(make_etag(
+        product.pk, product.updated_at.timestamp(),
+        template_last_modified(*DETAIL_TEMPLATES).timestamp(), available))
+    # No Last-Modified: a date cannot tell that availability has changed.
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, 'products/product_detail.html', {
+            'product': product,
+            'available': available,
+            'low_stock': available <= settings.LOW_STOCK_THRESHOLD,
+        })
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True,
+                        s_maxage=settings.PRODUCT_DETAIL_S_MAXAGE)
+    return response
+
+
+def product_search(request):
+    """Full-text search over product titles, descriptions and categories."""
+    query = request.GET.get('q', '').strip()
+    products = []
+    if query:
+        products = search_products(
+            Product.objects.only(*LIST_FIELDS), query,
+            limit=settings.SEARCH_RESULTS_LIMIT)
+    return render(request, 'products/search_results.html',
+                  {'query': query, 'products': products, **_card_context()})
+
+
+def product_image(request, digest, width, fmt):
+    """A product thumbnail from the content-addressed image cache.
+
+    The URL names the image's content, so the response never changes and
+    may be cached anywhere for a year.
+    """
+    width = int(width)
+    if width not in settings.PRODUCT_IMAGE_WIDTHS:
+        raise Http404("Unsupported image width.")
+    etag = quote_etag(f'{digest}-{width}.{fmt}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        path = images.ensure_thumbnail(digest, width, fmt)
+        if path is None:
+            raise Http404("No such image.")
+        response = FileResponse(open(path, 'rb'), content_type=images.FORMATS[fmt][1])
+        response['ETag'] = etag
+        if isinstance(request, ASGIRequest):
+            # As WhiteNoiseMiddleware does for static files; under WSGI the
+            # file goes to the server's file_wrapper instead.
+            stream_file_async(response)
+    patch_cache_control(response, public=True, max_age=IMAGE_MAX_AGE, immutable=True)
+    return response
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from reports import rollup
+
+
+class Command(BaseCommand):
+    help = "Fold new order items into the daily sales rollup used by reports and metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Discard the rollup and rebuild it from every order item.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--lag', type=int, default=None,
+                            help="Only roll up orders at least this many seconds old "
+                                 "(default: REPORTS_ROLLUP_LAG).")
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help="Keep running, rolling up every SECONDS.")
+
+    def handle(self, *args, **options):
+        def progress(count):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {count} items rolled up")
+
+        run = rollup.rebuild if options['rebuild'] else rollup.roll_up
+        while True:
+            count = run(options['batch_size'], options['lag'], progress)
+            self.stdout.write(self.style.SUCCESS(f"✅ Rolled up {count} order item(s)"))
+            if options['every'] is None:
+                break
+            run = rollup.roll_up
+            time.sleep(options['every'])
@@ -0,0 +1,85 @@
+"""Prometheus gauges over the sales rollup.
+
+Exported on ``/metrics`` alongside the request metrics, labelled by
+category and window (``today``, ``7d``, ``30d``):
+
+* ``ipswich_sales_revenue``: revenue in pounds
+* ``ipswich_sales_units``: units sold
+
+Values come from :class:`~reports.models.DailySales`, so they are as fresh
+as the last ``rollup_sales`` run. The query result is cached for
+``REPORTS_METRICS_TTL`` seconds so frequent scrapes stay cheap.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import DailySales
+
+WINDOWS = (('today', 1), ('7d', 7), ('30d', 30))
+CACHE_KEY = 'reports:sales_gauges'
+UNCATEGORISED = 'uncategorised'
+
+
+def window_totals():
+    """Return ``[(category, window, units, revenue), ...]`` for :data:`WINDOWS`."""
+    today = timezone.localdate()
+    sums = {}
+    for window, days in WINDOWS:
+        in_window = Q(day__gt=today - timedelta(days=days))
+        sums[f'units_{window}'] = Sum('units', filter=in_window)
+        sums[f'revenue_{window}'] = Sum('revenue', filter=in_window)
+    longest = max(days for _, days in WINDOWS)
+    rows = (
+        DailySales.objects.filter(day__gt=today - timedelta(days=longest))
+        .values('category__name')
+        .annotate(**sums)
+        .order_by('category__name')
+    )
+    return [
+        (row['category__name'] or UNCATEGORISED, window,
+         row[f'units_{window}'] or 0, float(row[f'revenue_{window}'] or 0))
+        for row in rows
+        for window, _ in WINDOWS
+    ]
+
+
+class SalesCollector:
+    def describe(self):
+        # Lets the registry learn the metric names without a query at startup.
+        return self._families([])
+
+    def collect(self):
+        totals = cache.get(CACHE_KEY)
+        if totals is None:
+            totals = window_totals()
+            cache.set(CACHE_KEY, totals, settings.REPORTS_METRICS_TTL)
+        return self._families(totals)
+
+    def _families(self, totals):
+        revenue = GaugeMetricFamily(
+            'ipswich_sales_revenue', 'Revenue in pounds from the sales rollup, by category and window.',
+            labels=['category', 'window'])
+        units = GaugeMetricFamily(
+            'ipswich_sales_units', 'Units sold from the sales rollup, by category and window.',
+            labels=['category', 'window'])
+        for category, window, unit_count, amount in totals:
+            revenue.add_metric([category, window], amount)
+            units.add_metric([category, window], unit_count)
+        return [revenue, units]
+
+
+collector = SalesCollector()
+
+
+def register(registry=REGISTRY):
+    try:
+        registry.register(collector)
+    except ValueError:
+        # Already registered (ready() can run more than once, e.g. in tests).
+        pass
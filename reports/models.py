@@ -0,0 +1,32 @@
+from django.db import models
+from products.models import Category, Product
+
+
+class DailySales(models.Model):
+    """Units and revenue per product per day, rolled up from order items.
+
+    Written only by ``reports.rollup``; reports and metrics read this table
+    instead of scanning orders.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    # The product's category when the sales were rolled up.
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'product'], name='dailysales_day_product_idx')]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.units} units"
+
+
+class RollupState(models.Model):
+    """How far the rollup has got: the last OrderItem id included."""
+    name = models.CharField(max_length=50, unique=True)
+    last_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_item_id}"
@@ -0,0 +1,139 @@
+import io
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from orders.models import Order, OrderItem
+from prometheus_client import CollectorRegistry
+from products.models import Category, Product
+
+from . import metrics, rollup
+from .models import DailySales
+
+User = get_user_model()
+
+
+class SalesRollupTestCase(TestCase):
+    def setUp(self):
+        self.roses = Category.objects.create(name="Roses")
+        self.rose = Product.objects.create(title="Rose", price=Decimal("10.00"), inventory=50, category=self.roses)
+        self.musk = Product.objects.create(title="Musk", price=Decimal("4.50"), inventory=50)
+
+    def order(self, when, *lines):
+        order = Order.objects.create(email='sales@example.com')
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        return order
+
+    def sales(self):
+        return {
+            (row.day.isoformat(), row.product_id): (row.units, row.revenue)
+            for row in DailySales.objects.all()
+        }
+
+
+class RollupTest(SalesRollupTestCase):
+    def test_incremental_runs_only_add_new_items(self):
+        monday = datetime(2024, 3, 4, 9, tzinfo=timezone.utc)
+        self.order(monday, (self.rose, 2), (self.musk, 1))
+        self.order(monday + timedelta(hours=3), (self.rose, 1))
+        self.assertEqual(rollup.roll_up(lag=0), 3)
+
+        self.order(monday + timedelta(days=1), (self.musk, 4))
+        self.order(monday + timedelta(hours=5), (self.rose, 3))
+        self.assertEqual(rollup.roll_up(batch_size=1, lag=0), 2)
+        self.assertEqual(rollup.roll_up(lag=0), 0)
+
+        self.assertEqual(self.sales(), {
+            ('2024-03-04', self.rose.pk): (6, Decimal("60.00")),
+            ('2024-03-04', self.musk.pk): (1, Decimal("4.50")),
+            ('2024-03-05', self.musk.pk): (4, Decimal("18.00")),
+        })
+        self.assertEqual(DailySales.objects.get(day='2024-03-04', product=self.rose).category, self.roses)
+
+    def test_recent_orders_wait_for_the_lag(self):
+        self.order(datetime.now(timezone.utc) - timedelta(hours=1), (self.rose, 1))
+        self.order(datetime.now(timezone.utc), (self.musk, 1))
+        self.assertEqual(rollup.roll_up(lag=600), 1)
+        self.assertEqual(rollup.roll_up(lag=0), 1)
+
+    def test_rebuild_picks_up_edits(self):
+        order = self.order(datetime(2024, 3, 4, tzinfo=timezone.utc), (self.rose, 2))
+        rollup.roll_up(lag=0)
+        order.items.update(quantity=5)
+
+        out = io.StringIO()
+        call_command('rollup_sales', '--rebuild', '--lag', '0', stdout=out)
+        self.assertIn("Rolled up 1 order item(s)", out.getvalue())
+        self.assertEqual(self.sales(), {('2024-03-04', self.rose.pk): (5, Decimal("50.00"))})
+
+
+class SalesReportViewTest(SalesRollupTestCase):
+    def setUp(self):
+        super().setUp()
+        monday = datetime(2024, 3, 4, 12, tzinfo=timezone.utc)
+        self.order(monday, (self.rose, 2), (self.musk, 2))
+        self.order(monday + timedelta(days=2), (self.rose, 1))
+        self.order(monday + timedelta(days=7), (self.musk, 1))
+        rollup.roll_up(lag=0)
+        self.url = reverse('reports:sales')
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def get(self, **params):
+        return self.client.get(self.url, {'start': '2024-03-01', 'end': '2024-03-31', **params})
+
+    def test_requires_staff(self):
+        self.assertEqual(self.get().status_code, 401)
+        User.objects.create_user('shopper', password='pw')
+        self.client.login(username='shopper', password='pw')
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_daily_totals(self):
+        self.client.login(username='staff', password='pw')
+        rows = self.get().json()['rows']
+        self.assertEqual(rows, [
+            {'period': '2024-03-04', 'units': 4, 'revenue': '29.00'},
+            {'period': '2024-03-06', 'units': 1, 'revenue': '10.00'},
+            {'period': '2024-03-11', 'units': 1, 'revenue': '4.50'},
+        ])
+
+    def test_weekly_by_category(self):
+        self.client.login(username='staff', password='pw')
+        rows = self.get(period='week', by='category').json()['rows']
+        self.assertEqual(rows, [
+            {'period': '2024-03-04', 'category_id': None, 'category_name': None, 'units': 2, 'revenue': '9.00'},
+            {'period': '2024-03-04', 'category_id': self.roses.pk, 'category_name': 'Roses',
+             'units': 3, 'revenue': '30.00'},
+            {'period': '2024-03-11', 'category_id': None, 'category_name': None, 'units': 1, 'revenue': '4.50'},
+        ])
+
+    def test_rejects_bad_parameters(self):
+        self.client.login(username='staff', password='pw')
+        self.assertEqual(self.get(period='month').status_code, 400)
+        self.assertEqual(self.get(by='colour').status_code, 400)
+        self.assertEqual(self.get(start='yesterday').status_code, 400)
+        self.assertEqual(self.get(start='2024-04-01').status_code, 400)
+        self.assertEqual(self.get(start='2020-01-01').status_code, 400)
+
+
+class SalesMetricsTest(SalesRollupTestCase):
+    def test_collector_exports_windows_by_category(self):
+        now = datetime.now(timezone.utc)
+        self.order(now - timedelta(hours=1), (self.rose, 2))
+        self.order(now - timedelta(days=3), (self.rose, 1), (self.musk, 4))
+        rollup.roll_up(lag=0)
+        cache.delete(metrics.CACHE_KEY)
+
+        registry = CollectorRegistry()
+        metrics.register(registry)
+        self.assertEqual(registry.get_sample_value(
+            'ipswich_sales_units', {'category': 'Roses', 'window': '7d'}), 3)
+        self.assertEqual(registry.get_sample_value(
+            'ipswich_sales_revenue', {'category': 'uncategorised', 'window': '30d'}), 18.0)
+        self.assertEqual(registry.get_sample_value(
+            'ipswich_sales_units', {'category': 'uncategorised', 'window': 'today'}), 0)
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import TruncWeek
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from .models import DailySales
+from .rollup import CENTS, last_rolled_up
+
+PERIODS = ('day', 'week')
+GROUPINGS = {
+    'total': (),
+    'product': ('product_id', 'product__title'),
+    'category': ('category_id', 'category__name'),
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _date_param(request, name, default):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a YYYY-MM-DD date.")
+
+
+def _parse(request):
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        raise BadRequest(f"period must be one of {', '.join(PERIODS)}.")
+    by = request.GET.get('by', 'total')
+    if by not in GROUPINGS:
+        raise BadRequest(f"by must be one of {', '.join(GROUPINGS)}.")
+    end = _date_param(request, 'end', timezone.localdate())
+    start = _date_param(request, 'start', end - timedelta(days=settings.REPORTS_DEFAULT_DAYS - 1))
+    if start > end:
+        raise BadRequest("start must not be after end.")
+    if (end - start).days >= settings.REPORTS_MAX_DAYS:
+        raise BadRequest(f"The range may span at most {settings.REPORTS_MAX_DAYS} days.")
+    return period, by, start, end
+
+
+def sales_report(start, end, period='day', by='total'):
+    """Units and revenue per ``period``, optionally split by product or category.
+
+    Reads only the rollup table, so the cost depends on the number of days
+    and products in range, never on the number of orders.
+    """
+    bucket = TruncWeek('day') if period == 'week' else F('day')
+    fields = GROUPINGS[by]
+    return (
+        DailySales.objects.filter(day__range=(start, end))
+        .annotate(period_start=bucket)
+        .values('period_start', *fields)
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('period_start', *fields)
+    )
+
+
+@require_GET
+def sales(request):
+    """Staff-only JSON sales report, e.g. ``?period=week&by=category&start=2024-01-01``."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only.'}, status=403)
+    try:
+        period, by, start, end = _parse(request)
+    except BadRequest as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    rows = []
+    for row in sales_report(start, end, period, by):
+        entry = {'period': row['period_start'].isoformat()}
+        for field in GROUPINGS[by]:
+            entry[field.replace('__', '_')] = row[field]
+        entry.update(units=row['units'], revenue=str(row['revenue'].quantize(CENTS)))
+        rows.append(entry)
+    rolled_up = last_rolled_up()
+    return JsonResponse({
+        'period': period,
+        'by': by,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rolled_up_at': rolled_up.isoformat() if rolled_up else None,
+        'rows': rows,
+    })
@@ -0,0 +1,50 @@
+// Initialize Lucide icons
+lucide.createIcons();
+
+// Simple single-page app navigation
+const pages = document.querySelectorAll('.page');
+
+function showPage(pageId) {
+    // Prevent default link behavior
+    if(event) event.preventDefault();
+
+    pages.forEach(page => {
+        if (page.id === pageId) {
+            page.classList.remove('hidden');
+        } else {
+            page.classList.add('hidden');
+        }
+    });
+    // Scroll to top on page change
+    window.scrollTo(0, 0);
+}
+
+// Shop dropdown menu logic
+const shopMenu = document.getElementById('shop-menu');
+const shopDropdown = document.getElementById('shop-dropdown');
+
+shopMenu.addEventListener('mouseenter', () => {
+    shopDropdown.classList.remove('hidden');
+});
+
+shopMenu.addEventListener('mouseleave', () => {
+    shopDropdown.classList.add('hidden');
+});
+
+// Pages shared through caches (product detail) leave out the visitor's cart
+// badge and CSRF token; fill them in from the cart state endpoint.
+const visitorState = document.body.dataset.visitorState;
+
+if (visitorState) {
+    fetch(visitorState, {credentials: 'same-origin'})
+        .then(response => response.json())
+        .then(state => {
+            document.querySelectorAll('[data-cart-count]').forEach(badge => {
+                badge.textContent = state.count;
+                badge.classList.toggle('hidden', !state.count);
+            });
+            document.querySelectorAll('[data-csrf-token]').forEach(input => {
+                input.value = state.csrf_token;
+            });
+        });
+}